@@ -12,6 +12,86 @@ class OntologyConfig(AppConfig):
             from .services.ontology_service import OntologyService
             from django.conf import settings
             owl_path = getattr(settings, "O3PO_OWL_PATH", "D:\Área de Trabalho\OntologyManager\backend\data\o3po_merged.owl")
-            # Criar o singleton e rodar reasoner ao iniciar
-            svc = OntologyService(owl_path=owl_path, run_reasoner_on_init=True)
-            # opcional: guardar em local acessível, ex.: from . import loader; loader.ONT_SERVICE = svc
+            store_cfg = getattr(settings, "ONTOLOGY_STORE_SETTINGS", {})
+            store_dir = store_cfg.get("DIR") if store_cfg.get("ENABLED", True) else None
+            dl_cfg = getattr(settings, "DL_QUERY_SETTINGS", {})
+            prefork_cfg = getattr(settings, "PREFORK_SETTINGS", {})
+            if prefork_cfg.get("ENABLED") and store_dir is None:
+                print("[OntologyConfig] Warning: pre-fork mode requires the quadstore; loading per worker.")
+            if prefork_cfg.get("ENABLED") and store_dir is not None:
+                # gunicorn --preload: o mestre prepara tudo uma vez e os workers herdam por fork
+                svc = self._preload_for_fork(settings, owl_path, store_dir, dl_cfg, prefork_cfg)
+            elif store_dir is None:
+                # sem quadstore não há onde o processo de reasoning publicar o resultado: o HermiT
+                # roda neste processo, numa thread, e o boot não espera por ele
+                svc = OntologyService(owl_path=owl_path)
+                if svc.onto is not None and dl_cfg.get("ENABLE_REASONING", True):
+                    self._reason_in_thread(svc)
+            else:
+                # carrega só a versão asserida; o HermiT roda em segundo plano
+                svc = OntologyService(owl_path=owl_path, store_dir=store_dir)
+                if svc.onto is not None and dl_cfg.get("ENABLE_REASONING", True):
+                    hermit_cfg = getattr(settings, "HERMIT_SETTINGS", {})
+                    try:
+                        svc.start_background_reasoning(
+                            max_workers=dl_cfg.get("REASONER_WORKERS", 1),
+                            java_memory=hermit_cfg.get("java_heap_size"),
+                        )
+                    except Exception as e:
+                        print(f"[OntologyConfig] Warning: could not schedule background reasoning: {e}")
+            from . import loader
+            loader.ONT_SERVICE = svc
+
+    def _reason_in_thread(self, svc):
+        """Reasoning em processo, numa seção de escrita da sessão: as edições esperam por ele, o ready() não."""
+        import threading
+        from .services.ontology_session import get_ontology_session
+
+        def run():
+            try:
+                with get_ontology_session().write():
+                    print("[OntologyConfig] Running reasoner (HermiT) in background. This may take a while...")
+                    svc.run_reasoner()
+                print("[OntologyConfig] Reasoner finished.")
+            except Exception as e:
+                print(f"[OntologyConfig] Warning: reasoner failed: {e}")
+
+        threading.Thread(target=run, name="ontology-reasoner", daemon=True).start()
+
+    def _preload_for_fork(self, settings, owl_path, store_dir, dl_cfg, prefork_cfg):
+        """Modo pre-fork (ver services/prefork.py); retorna o OntologyService do mestre."""
+        import hashlib
+        from .services import prefork
+        from .services.ontology_service import OntologyService
+        from .services.ontology_session import get_ontology_session
+        from .services.reasoning_jobs import get_jobs
+        # imports adiados no boot comum (NumPy, pandas): aqui, uma vez no mestre, para todos os workers
+        import pandas  # noqa: F401
+        from .services import timeseries_analytics, timeseries_stream, well_dashboard  # noqa: F401
+
+        authkey = hashlib.sha256(f"prefork:{settings.SECRET_KEY}".encode()).digest()
+        coordinator = prefork.configure(store_dir, authkey, prefork_cfg.get("RELEASE_GRACE", 120))
+        jobs = None
+        if dl_cfg.get("ENABLE_REASONING", True) and prefork_cfg.get("REASON", True):
+            hermit_cfg = getattr(settings, "HERMIT_SETTINGS", {})
+            jobs = get_jobs(store_dir, max_workers=dl_cfg.get("REASONER_WORKERS", 1),
+                            java_memory=hermit_cfg.get("java_heap_size"))
+        timeout = prefork_cfg.get("REASON_TIMEOUT")
+
+        svc = OntologyService(owl_path=owl_path, store_dir=store_dir)
+        if svc.onto is not None:
+            svc.onto = coordinator.preload(svc.onto, lambda onto: setattr(svc, "onto", onto), jobs, timeout)
+
+        if prefork_cfg.get("PRELOAD_SESSION", True):
+            from .views import _ensure_predefined_ontology
+            session = get_ontology_session()
+            try:
+                _ensure_predefined_ontology()
+            except RuntimeError as e:
+                print(f"[OntologyConfig] Warning: predefined ontology not preloaded: {e}")
+            else:
+                path = session.current().path
+                onto = coordinator.preload(session.current().onto,
+                                           lambda onto: session.replace(onto, path), jobs, timeout)
+                session.replace(onto, path)
+        return svc
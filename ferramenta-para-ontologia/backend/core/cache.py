@@ -0,0 +1,121 @@
+# core/cache.py
+"""
+Backend de cache: Redis quando disponível, memória local (LocMem) quando não.
+
+A escolha é feita no primeiro uso do cache, não no import dos settings: o
+manage.py e o boot dos workers não esperam pelo Redis. A conexão tem timeout
+curto e nenhuma nova tentativa (o cliente do redis-py, por padrão, insiste
+por alguns segundos), então um Redis fora do ar custa milissegundos.
+Enquanto ele está fora (ou se cair no meio de uma operação), o processo usa
+a memória local e só testa o Redis de novo após RETRY_INTERVAL segundos.
+
+    'BACKEND': 'core.cache.FailoverCache',
+    'LOCATION': 'redis://127.0.0.1:6379/1',
+    'RETRY_INTERVAL': 30,
+    'OPTIONS': {...},  # repassadas ao RedisCache (socket_connect_timeout, ...)
+
+O que foi gravado na memória local não migra para o Redis quando ele volta;
+os resultados da ontologia são versionados (services/result_cache.py), então
+isso só custa recálculos.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+# o Django cria uma instância do backend por thread: o estado do Redis é do processo
+_down_until = {}   # LOCATION -> None (não testado), 0 (disponível) ou instante do próximo teste
+_state_lock = threading.Lock()
+
+
+def _connection_error(e):
+    try:
+        from redis.exceptions import ConnectionError, TimeoutError
+    except ImportError:
+        return False
+    return isinstance(e, (ConnectionError, TimeoutError))
+
+
+class FailoverCache(BaseCache):
+    """RedisCache com fail-over para LocMemCache; ver o docstring do módulo."""
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._server = server
+        self._params = params
+        self.retry_interval = params.get('RETRY_INTERVAL', 30)
+        self._local = LocMemCache(f'failover:{server}', params)
+        self._redis = None
+
+    def _primary(self):
+        if self._redis is None:
+            from django.core.cache.backends.redis import RedisCache
+            from redis.backoff import NoBackoff
+            from redis.retry import Retry
+            options = {'socket_connect_timeout': 0.25, 'socket_timeout': 0.5, 'retry': Retry(NoBackoff(), 0),
+                       **self._params.get('OPTIONS', {})}
+            self._redis = RedisCache(self._server, {**self._params, 'OPTIONS': options})
+        return self._redis
+
+    def _mark_down(self, error):
+        with _state_lock:
+            was_up = not _down_until.get(self._server)
+            _down_until[self._server] = time.monotonic() + self.retry_interval
+        if was_up:
+            logger.warning("[FailoverCache] Redis %s indisponível (%s); usando memória local", self._server, error)
+
+    def _probe(self):
+        try:
+            redis = self._primary()
+            redis._cache.get_client(write=True).ping()
+        except Exception as e:
+            self._mark_down(e)
+            return self._local
+        with _state_lock:
+            was_down = _down_until.get(self._server)
+            _down_until[self._server] = 0
+        if was_down:
+            logger.info("[FailoverCache] Redis %s disponível de novo", self._server)
+        return redis
+
+    @property
+    def backend(self):
+        """Cache em uso agora: o RedisCache ou, com o Redis fora do ar, o LocMemCache."""
+        with _state_lock:
+            down_until = _down_until.get(self._server)
+        if down_until == 0:
+            return self._primary()
+        if down_until is None or time.monotonic() >= down_until:
+            return self._probe()
+        return self._local
+
+    def _call(self, name, *args, **kwargs):
+        backend = self.backend
+        try:
+            return getattr(backend, name)(*args, **kwargs)
+        except Exception as e:
+            if backend is self._local or not _connection_error(e):
+                raise
+            self._mark_down(e)
+            return getattr(self._local, name)(*args, **kwargs)
+
+    def close(self, **kwargs):
+        if self._redis is not None:
+            self._redis.close(**kwargs)
+
+
+def _delegate(name):
+    def method(self, *args, **kwargs):
+        return self._call(name, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+# operações básicas: as demais (get_or_set, decr, versões assíncronas...) do BaseCache usam estas
+for _name in ('add', 'get', 'set', 'touch', 'delete', 'get_many', 'has_key', 'incr', 'set_many', 'delete_many',
+              'clear'):
+    setattr(FailoverCache, _name, _delegate(_name))
@@ -0,0 +1,3 @@
+# core/loader.py
+# Singletons criados em OntologyConfig.ready() e compartilhados com as views.
+ONT_SERVICE = None
@@ -0,0 +1,77 @@
+# core/management/commands/generate_timeseries.py
+"""
+Gera CSVs sintéticos determinísticos (services/synthetic_timeseries.py) para
+todas as tags de uma ontologia, no formato do historiador, para medir o
+caminho das séries temporais em escala de produção sem os dados reais.
+
+    python manage.py generate_timeseries --out /tmp/ts --start 2023-01-01 --end 2024-01-01 --step 10
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loader
+from core.services.ontology_store import load_ontology
+from core.services.synthetic_timeseries import ontology_tags, write_csv
+from core.services.timeseries_store import get_timeseries_store, to_epoch_ns
+
+
+class Command(BaseCommand):
+    help = "Gera CSVs sintéticos (timestamp,value) para as tags da ontologia em TIMESERIES_CSV_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owl', default=getattr(settings, 'O3PO_OWL_PATH', None),
+                            help='Ontologia de onde vêm as tags (padrão: O3PO_OWL_PATH)')
+        parser.add_argument('--out', default=os.environ.get('TIMESERIES_CSV_DIR'),
+                            help='Diretório dos CSVs (padrão: $TIMESERIES_CSV_DIR)')
+        parser.add_argument('--tags', nargs='*', help='Tags explícitas (ignora a ontologia)')
+        parser.add_argument('--start', default='2023-01-01', help='Início (ISO 8601, UTC)')
+        parser.add_argument('--end', default='2023-12-31T23:59:59', help='Fim (ISO 8601, UTC)')
+        parser.add_argument('--step', type=float, default=60, help='Intervalo entre pontos, em segundos')
+        parser.add_argument('--overwrite', action='store_true', help='Regrava CSVs que já existem')
+        parser.add_argument('--convert', action='store_true',
+                            help='Converte também para o armazenamento colunar (com rollups)')
+
+    def handle(self, *args, **opts):
+        out = opts['out']
+        if not out:
+            raise CommandError('Informe --out ou defina TIMESERIES_CSV_DIR.')
+        if opts['step'] <= 0:
+            raise CommandError('--step deve ser positivo.')
+        start, end = to_epoch_ns(opts['start']), to_epoch_ns(opts['end'])
+        if end < start:
+            raise CommandError('--end anterior a --start.')
+
+        tags = opts['tags']
+        if not tags:
+            owl = opts['owl']
+            if not owl or not os.path.exists(owl):
+                raise CommandError(f'Ontologia não encontrada: {owl} (use --owl ou --tags).')
+            svc = loader.ONT_SERVICE
+            if svc is not None and svc.onto is not None and getattr(svc, 'owl_path', None) == owl:
+                onto = svc.onto  # já carregada em OntologyConfig.ready()
+            else:
+                cfg = getattr(settings, 'ONTOLOGY_STORE_SETTINGS', {})
+                onto = load_ontology(owl, store_dir=cfg.get('DIR') if cfg.get('ENABLED', True) else None)
+            tags = ontology_tags(onto)
+            if not tags:
+                raise CommandError(f'Nenhuma tag (core:isAbout) encontrada em {owl}.')
+
+        os.makedirs(out, exist_ok=True)
+        store = get_timeseries_store(out) if opts['convert'] else None
+        total_rows, started = 0, time.perf_counter()
+        for tag in tags:
+            path = os.path.join(out, f'{tag}.csv')
+            if os.path.exists(path) and not opts['overwrite']:
+                self.stdout.write(f'  {tag}: já existe (use --overwrite)')
+                continue
+            t0 = time.perf_counter()
+            rows = write_csv(path, tag, start, end, opts['step'])
+            if store is not None:
+                store.series(tag)
+            total_rows += rows
+            self.stdout.write(f'  {tag}: {rows} pontos ({time.perf_counter() - t0:.2f}s)')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(tags)} tags, {total_rows} pontos em {out} ({time.perf_counter() - started:.1f}s)'))
@@ -0,0 +1,110 @@
+# core/management/commands/startup_profile.py
+"""
+Mede o custo de inicialização de um processo (worker, comando do manage.py):
+tempo de cada fase e, pelo `python -X importtime`, quanto cada pacote custa
+para importar. Roda num processo novo, com os módulos ainda não carregados.
+
+    python manage.py startup_profile --top 20
+
+A carga da ontologia em OntologyConfig.ready() não é medida (é dado, não
+import; ver os logs do OntologyService), só o import do serviço.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# executado no processo filho; cada fase é medida depois da anterior
+_PROBE = r"""
+import json, time
+phases = []
+def phase(name, started):
+    phases.append((name, round((time.perf_counter() - started) * 1000, 1)))
+    return time.perf_counter()
+t = time.perf_counter()
+import django
+t = phase("django", t)
+from django.conf import settings
+settings.INSTALLED_APPS
+t = phase("settings", t)
+django.setup()
+t = phase("apps (django.setup)", t)
+import core.services.ontology_service
+t = phase("serviço da ontologia", t)
+from django.urls import get_resolver
+get_resolver().url_patterns
+t = phase("urls e views", t)
+from django.core.cache import cache
+cache.get("startup-profile")
+t = phase("primeiro acesso ao cache", t)
+print("PHASES " + json.dumps(phases))
+"""
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| *(\S+)")
+
+
+def parse_importtime(stderr):
+    """[(módulo, self µs, cumulativo µs)] da saída do -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(3), int(m.group(1)), int(m.group(2))))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Tempo de inicialização por fase e por pacote importado (python -X importtime)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Quantos pacotes/módulos listar')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **opts):
+        env = {**os.environ, 'RUN_MAIN': 'false',  # OntologyConfig.ready() não carrega a ontologia
+               'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'setup.settings')}
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE], cwd=str(settings.BASE_DIR),
+                              env=env, capture_output=True, text=True)
+        phases = next((json.loads(line[7:]) for line in proc.stdout.splitlines() if line.startswith('PHASES ')),
+                      None)
+        if proc.returncode != 0 or phases is None:
+            tail = [line for line in proc.stderr.splitlines() if not line.startswith('import time:')][-10:]
+            raise CommandError('O processo de medição falhou:\n' + '\n'.join(tail))
+
+        rows = parse_importtime(proc.stderr)
+        packages = defaultdict(lambda: [0, 0])  # pacote -> [self µs somado, módulos]
+        for name, own, _ in rows:
+            package = packages[name.split('.')[0]]
+            package[0] += own
+            package[1] += 1
+        top = opts['top']
+        report = {
+            'phases_ms': dict(phases),
+            'total_ms': round(sum(ms for _, ms in phases), 1),
+            'imports_ms': round(sum(own for _, own, _ in rows) / 1000, 1),
+            'modules': len(rows),
+            'packages': [{'package': name, 'ms': round(own / 1000, 1), 'modules': count}
+                         for name, (own, count) in sorted(packages.items(), key=lambda p: -p[1][0])[:top]],
+            'slowest': [{'module': name, 'cumulative_ms': round(cum / 1000, 1), 'self_ms': round(own / 1000, 1)}
+                        for name, own, cum in sorted(rows, key=lambda r: -r[2])[:top]],
+        }
+        if opts['json']:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write('Fases:')
+        for name, ms in phases:
+            self.stdout.write(f'  {name:<28}{ms:>9.1f} ms')
+        self.stdout.write(f'Imports: {report["modules"]} módulos, {report["imports_ms"]:.1f} ms (self somado)')
+        self.stdout.write('Por pacote (self):')
+        for p in report['packages']:
+            self.stdout.write(f'  {p["package"]:<28}{p["ms"]:>9.1f} ms  {p["modules"]:>4} módulos')
+        self.stdout.write('Imports mais caros (cumulativo):')
+        for m in report['slowest']:
+            self.stdout.write(f'  {m["module"]:<48}{m["cumulative_ms"]:>9.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Total: {report["total_ms"]:.1f} ms'))
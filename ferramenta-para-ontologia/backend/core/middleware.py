@@ -0,0 +1,44 @@
+# core/middleware.py
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from .services.prefork import FORWARDED, get_prefork
+
+
+class PreforkMiddleware:
+    """
+    Modo pre-fork (ver services/prefork.py): aplica a versão publicada pelo
+    escritor no início de cada requisição e encaminha as views de escrita
+    (@_writes) ao worker escritor. Fora do modo pre-fork não é instalado.
+    """
+
+    def __init__(self, get_response):
+        if get_prefork() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        prefork = get_prefork()
+        prefork.sync()
+        response = self.get_response(request)
+        if getattr(request, "_ontology_write", False):
+            prefork.publish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(view_func, "ontology_write", False):
+            return None
+        prefork = get_prefork()
+        if request.META.get(FORWARDED) or prefork.is_owner():
+            request._ontology_write = True
+            return None
+        response = prefork.forward(request)
+        if response is None:
+            # escritor fora do ar: o lock fica livre quando o processo morre
+            if prefork.is_owner():
+                request._ontology_write = True
+                return None
+            return JsonResponse({'status': 'error', 'message': 'Escritor da ontologia indisponível; tente novamente'},
+                                status=503)
+        prefork.sync()  # a próxima leitura deste worker já vê a escrita
+        return response
@@ -0,0 +1,481 @@
+# core/services/change_journal.py
+"""
+Journal de alterações (write-behind) das ontologias abertas pelo quadstore.
+
+Em vez de reserializar o RDF/XML inteiro a cada edição, cada mutação grava
+apenas as triplas inseridas/removidas, numa linha JSON acrescentada ao
+journal do snapshot (<store>/journal/<sha256>.jsonl), com fsync. O RDF/XML
+completo é escrito depois, pela compactação: com debounce (alguns segundos
+sem novas edições) ou sob demanda (exportação, /api/compact-ontology/).
+
+A captura é feita por triggers TEMP do SQLite nas tabelas objs/datas da
+cópia de trabalho, então qualquer escrita do Owlready2 entra no journal sem
+que as views precisem descrever o que mudou. Os nós são gravados como IRIs
+(nós em branco como "_:<id>"), de modo que o journal pode ser reaplicado
+sobre o snapshot em outro processo (ver OntologyStore.open_compiled).
+
+Cada mutação também recebe uma versão monotônica (`seq`, persistida no meta
+do snapshot na compactação) e registra as IRIs das entidades que alterou
+(sujeitos das triplas; nós em branco são atribuídos à entidade que os
+referencia). As views respondem só com essas entidades, e
+`changes_since(versão)` alimenta o /api/changes. No mesmo flush, os índices
+derivados já montados (graph_index, entity_index, class_hierarchy) recebem
+as triplas e entidades alteradas e são atualizados sem reconstrução (o
+graph_index em cópia, ver ontology_session.py).
+
+Uso nas views (dentro da seção de escrita da sessão, ver ontology_session.py):
+
+    with journaled(onto, onto_path), onto:
+        ... edições Owlready2 ...
+"""
+import collections
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from .class_hierarchy import apply_changes as apply_hierarchy_changes
+from .entity_index import refresh_entities
+from .graph_index import apply_changes as apply_graph_changes
+from .ontology_session import editing
+from .ontology_store import ReadView, _lock as _store_lock, file_sha256, store_info
+
+logger = logging.getLogger(__name__)
+
+_CAPTURE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS journal_pending (id INTEGER PRIMARY KEY, op TEXT, tbl TEXT, c INTEGER, s INTEGER, p INTEGER, o, d);
+CREATE TEMP TRIGGER IF NOT EXISTS journal_objs_ins AFTER INSERT ON main.objs BEGIN
+    INSERT INTO journal_pending (op, tbl, c, s, p, o, d) VALUES ('+', 'o', NEW.c, NEW.s, NEW.p, NEW.o, NULL); END;
+CREATE TEMP TRIGGER IF NOT EXISTS journal_objs_del AFTER DELETE ON main.objs BEGIN
+    INSERT INTO journal_pending (op, tbl, c, s, p, o, d) VALUES ('-', 'o', OLD.c, OLD.s, OLD.p, OLD.o, NULL); END;
+CREATE TEMP TRIGGER IF NOT EXISTS journal_datas_ins AFTER INSERT ON main.datas BEGIN
+    INSERT INTO journal_pending (op, tbl, c, s, p, o, d) VALUES ('+', 'd', NEW.c, NEW.s, NEW.p, NEW.o, NEW.d); END;
+CREATE TEMP TRIGGER IF NOT EXISTS journal_datas_del AFTER DELETE ON main.datas BEGIN
+    INSERT INTO journal_pending (op, tbl, c, s, p, o, d) VALUES ('-', 'd', OLD.c, OLD.s, OLD.p, OLD.o, OLD.d); END;
+CREATE TEMP TABLE IF NOT EXISTS journal_iris (storid INTEGER PRIMARY KEY, iri TEXT);
+CREATE TEMP TRIGGER IF NOT EXISTS journal_resources_del AFTER DELETE ON main.resources BEGIN
+    INSERT OR REPLACE INTO journal_iris (storid, iri) VALUES (OLD.storid, OLD.iri); END;
+"""
+
+
+def _read_entries(path):
+    """Linhas válidas do journal (uma linha truncada no fim, de um crash, é ignorada)."""
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+    except OSError:
+        pass
+    return entries
+
+
+def _append_entries(path, entries, fsync=True):
+    """Acrescenta mutações (dicts lidos de outro journal) ao journal `path`."""
+    if not entries:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def replay_journal(world, path):
+    """
+    Reaplica o journal `path` sobre `world` (recém-aberto, antes de carregar a ontologia).
+    Retorna o número de mutações reaplicadas.
+    """
+    entries = _read_entries(path)
+    if not entries:
+        return 0
+    db = world.graph.db
+    contexts = {iri: c for c, iri in db.execute("SELECT c, iri FROM ontologies")}
+    blanks = {}
+
+    def context(iri):
+        if iri not in contexts:
+            world.get_ontology(iri)
+            contexts.update({i: c for c, i in db.execute("SELECT c, iri FROM ontologies")})
+        return contexts[iri]
+
+    def node(x):
+        if isinstance(x, str) and x.startswith("_:"):
+            if x not in blanks:
+                old = int(x[2:])
+                # nó em branco do snapshot mantém o id; os criados depois recebem um novo
+                exists = db.execute("SELECT 1 FROM objs WHERE s=? OR o=? UNION ALL SELECT 1 FROM datas WHERE s=? LIMIT 1",
+                                    (old, old, old)).fetchone()
+                blanks[x] = old if exists else world.new_blank_node()
+            return blanks[x]
+        return world._abbreviate(x)
+
+    def datatype(d):
+        if isinstance(d, str) and not d.startswith("@"):
+            return world._abbreviate(d)
+        return d
+
+    for entry in entries:
+        for op, tbl, c, s, p, o, d in entry["ops"]:
+            c, s, p = context(c), node(s), node(p)
+            if tbl == "o":
+                o = node(o)
+                if op == "+":
+                    db.execute("INSERT OR IGNORE INTO objs VALUES (?,?,?,?)", (c, s, p, o))
+                else:
+                    db.execute("DELETE FROM objs WHERE c=? AND s=? AND p=? AND o=?", (c, s, p, o))
+            else:
+                d = datatype(d)
+                if op == "+":
+                    db.execute("INSERT OR IGNORE INTO datas VALUES (?,?,?,?,?)", (c, s, p, o, d))
+                else:
+                    db.execute("DELETE FROM datas WHERE c=? AND s=? AND p=? AND o=? AND d=?", (c, s, p, o, d))
+    world.save()
+    logger.info("[ChangeJournal] %d mutações reaplicadas de %s", len(entries), os.path.basename(path))
+    return len(entries)
+
+
+class ChangeJournal:
+    """
+    Journal de uma ontologia (uma instância por mundo). Sem quadstore, não há
+    arquivo de journal: cada mutação salva o RDF/XML inteiro, como antes, mas
+    as versões e o log de alterações funcionam igual.
+    """
+
+    def __init__(self, onto, fallback_path=None, compact_delay=10.0, fsync=True, log_size=1000):
+        info = store_info(onto)
+        self.onto = onto
+        self.world = onto.world
+        self.info = info or {}
+        self.store = self.info.get("store")
+        self.owl_path = fallback_path or self.info.get("meta", {}).get("source")
+        self.compact_delay = compact_delay
+        self.fsync = fsync
+        if self.store is not None:
+            self.path = self.store.journal_path(info["digest"])
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            entries = _read_entries(self.path)
+            base = info["meta"].get("version", 0)
+        else:
+            self.path, entries, base = None, [], 0
+        self.seq = max([base] + [e.get("seq", 0) for e in entries])
+        # instante da última mutação: com `seq`, distingue edições diferentes que
+        # reusaram a mesma versão depois de um discard_journal
+        self.head = entries[-1].get("t") if entries else None
+        self.entries = len(entries)
+        # log de alterações: (versão, IRIs alteradas); `floor` é a versão a partir
+        # da qual o log está completo (anterior a ela, o cliente precisa recarregar)
+        self.log = collections.deque(((e.get("seq", 0), e.get("entities", [])) for e in entries),
+                                     maxlen=log_size)
+        self.floor = base
+        if any("entities" not in e for e in entries):
+            self.log.clear()
+            self.floor = self.seq
+        self._lock = threading.RLock()
+        self._compacting = threading.Lock()   # uma compactação por vez; não bloqueia as mutações
+        self._timer = None
+        self._closed = False
+        self.world.graph.db.executescript(_CAPTURE_SQL)
+        # total_changes do SQLite ao fim do último flush (versão dos índices derivados)
+        self._stamp = self.world.graph.db.total_changes
+
+    # ---------- estado ----------
+    def pending(self):
+        return self.world.graph.db.execute("SELECT COUNT(*) FROM temp.journal_pending").fetchone()[0]
+
+    def dirty(self):
+        """True se há edições ainda não compactadas no RDF/XML."""
+        return self.entries > 0 or self.pending() > 0
+
+    @property
+    def version(self):
+        return self.seq
+
+    def last_change(self):
+        """IRIs alteradas pela última mutação."""
+        with self._lock:
+            return list(self.log[-1][1]) if self.log else []
+
+    def changes_since(self, since):
+        """
+        IRIs alteradas depois da versão `since` (sem repetição, na ordem da
+        última alteração), ou None se o log não cobre `since` e o cliente
+        precisa recarregar a ontologia inteira.
+        """
+        with self._lock:
+            if since < self.floor or since > self.seq:
+                return None
+            changed = {}
+            for seq, iris in self.log:
+                if seq > since:
+                    for iri in iris:
+                        changed.pop(iri, None)
+                        changed[iri] = True
+            return list(changed)
+
+    # ---------- gravação ----------
+    @contextlib.contextmanager
+    def mutation(self):
+        """
+        Serializa a mutação e grava no journal as triplas alteradas ao final.
+        Se o bloco levantar uma exceção, o que ele já escreveu no mundo é
+        desfeito (SAVEPOINT do SQLite) e nada vai para o journal. Depois do
+        flush a cópia de trabalho é confirmada (WAL, sem fsync): as próximas
+        ReadViews já veem a mutação, as anteriores não.
+        """
+        with self._lock, editing(self.world):
+            db = self.world.graph.db
+            if not db.in_transaction:
+                db.execute("BEGIN")
+            db.execute("SAVEPOINT journal_mutation")
+            try:
+                yield self
+            except BaseException:
+                self._rollback()
+                raise
+            db.execute("RELEASE journal_mutation")
+            flushed = self.flush()
+            self.world.graph.commit()
+            if flushed:
+                if self.store is None:
+                    self.compact()
+                else:
+                    self.schedule_compaction()
+
+    def _rollback(self):
+        """Desfaz a mutação que falhou: triplas, captura pendente e entidades já carregadas."""
+        db = self.world.graph.db
+        try:
+            db.execute("ROLLBACK TO journal_mutation")
+            db.execute("RELEASE journal_mutation")
+        except sqlite3.Error as e:
+            # o SQLite já desfez a transação inteira (ex.: disco cheio): o mundo voltou ao último commit
+            logger.warning("[ChangeJournal] mutação desfeita pelo SQLite: %s", e)
+        db.execute("DELETE FROM temp.journal_pending")
+        db.execute("DELETE FROM temp.journal_iris")
+        # objetos Python criados/alterados pela mutação não correspondem mais ao quadstore
+        self.world._destroy_cached_entities()
+        self._update_indexes([], [])
+        logger.info("[ChangeJournal] mutação com erro desfeita; journal inalterado")
+
+    def flush(self):
+        """Grava no journal as triplas capturadas desde o último flush; retorna quantas."""
+        with self._lock:
+            db = self.world.graph.db
+            rows = db.execute("SELECT op, tbl, c, s, p, o, d FROM temp.journal_pending ORDER BY id").fetchall()
+            if not rows:
+                # nenhuma tripla mudou: os índices continuam válidos na versão atual
+                self._update_indexes([], [])
+                return 0
+            db.execute("DELETE FROM temp.journal_pending")
+            # IRIs de entidades destruídas na mutação (destroy_entity apaga a linha de resources)
+            iris = dict(db.execute("SELECT storid, iri FROM temp.journal_iris"))
+            db.execute("DELETE FROM temp.journal_iris")
+            contexts = dict(db.execute("SELECT c, iri FROM ontologies"))
+
+            def iri(x):
+                if x < 0:
+                    return f"_:{x}"
+                if x not in iris:
+                    iris[x] = self.world._unabbreviate(x)
+                return iris[x]
+
+            def owner(x):
+                # nó em branco (restrição, lista...): sobe até a entidade que o referencia
+                for _ in range(32):
+                    if x > 0:
+                        return x
+                    row = db.execute("SELECT s FROM objs WHERE o=? LIMIT 1", (x,)).fetchone()
+                    if row is None:
+                        return None
+                    x = row[0]
+                return None
+
+            ops = []
+            entities = {}
+            for op, tbl, c, s, p, o, d in rows:
+                subject = owner(s)
+                if subject is not None:
+                    entities.setdefault(iri(subject), True)
+                if tbl == "o":
+                    o = iri(o)
+                elif isinstance(d, int) and d > 0:
+                    d = iri(d)
+                ops.append([op, tbl, contexts.get(c), iri(s), iri(p), o, d])
+
+            self.seq += 1
+            self.head = time.time()
+            entities = list(entities)
+            if self.path is not None:
+                line = json.dumps({"seq": self.seq, "t": self.head, "entities": entities, "ops": ops},
+                                  ensure_ascii=False)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+            if len(self.log) == self.log.maxlen:
+                self.floor = self.log[0][0]
+            self.log.append((self.seq, entities))
+            self.entries += 1
+            self._update_indexes(rows, entities)
+            return len(ops)
+
+    def _update_indexes(self, rows, entities):
+        apply_graph_changes(self.world, rows, self._stamp)
+        apply_hierarchy_changes(self.world, rows, self._stamp)
+        refresh_entities(self.world, entities)
+        self._stamp = self.world.graph.db.total_changes
+
+    # ---------- compactação ----------
+    def schedule_compaction(self):
+        """(Re)inicia o debounce da compactação."""
+        if self.compact_delay is None or self.compact_delay < 0:
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.compact_delay, self._compact_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.warning("[ChangeJournal] compactação falhou: %s", e)
+
+    def compact(self):
+        """
+        Escreve o RDF/XML completo em `owl_path`, publica esse conteúdo como o
+        quadstore compilado do novo arquivo e zera o journal. Retorna o novo
+        digest (ou None se não havia nada a compactar).
+
+        Com quadstore, o RDF/XML é serializado de uma ReadView fixada na última
+        mutação, sem o lock do journal: as mutações feitas enquanto isso seguem
+        para o journal e, no fim, passam para o journal do novo snapshot. Sem
+        quadstore, o RDF/XML é salvo direto, dentro da mutação que o chamou.
+        """
+        with self._compacting:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                self.flush()
+                if self._closed or not self.entries or not self.owl_path:
+                    return None
+                if self.store is None:
+                    self.onto.save(file=self.owl_path, format="rdfxml")
+                    self.entries = 0
+                    return None
+                self.world.graph.commit()
+                view = ReadView(self.onto)
+                seq = self.seq
+
+            started = time.perf_counter()
+            tmp = f"{self.owl_path}.{os.getpid()}.tmp"
+            try:
+                view.ontology().save(file=tmp, format="rdfxml")
+                digest = file_sha256(tmp)
+                meta = dict(self.info["meta"], digest=digest, axiom_digest=None, compiled_at=time.time(),
+                            source=os.path.abspath(self.owl_path), version=seq)
+                self.store.register_view(view, digest, meta)
+            except BaseException:
+                _remove_file(tmp)
+                raise
+            finally:
+                view.close()
+
+            with self._lock:
+                if self._closed:
+                    _remove_file(tmp)  # ontologia liberada no meio: o journal antigo continua valendo
+                    return None
+                os.replace(tmp, self.owl_path)
+                old_path, compacted = self.path, self.entries
+                later = [e for e in _read_entries(old_path) if e.get("seq", 0) > seq]
+                self.path = self.store.journal_path(digest)
+                if self.path == old_path:
+                    _remove_file(old_path)
+                _append_entries(self.path, later, self.fsync)
+                if self.path != old_path:
+                    _remove_file(old_path)
+                with _store_lock:
+                    self.info.update(digest=digest, meta=meta, replayed=0,
+                                     changes_at_open=self.world.graph.db.total_changes)
+                    self.info.pop("reasoner_keys", None)  # chave do reasoning do conteúdo anterior
+                self.entries = len(_read_entries(self.path))
+            logger.info("[ChangeJournal] %d mutações compactadas em %s (%.2fs; %d feitas durante a compactação)",
+                        compacted - len(later), self.owl_path, time.perf_counter() - started, len(later))
+            return digest
+
+    def close(self, compact=True):
+        """Encerra o journal (ex.: ao trocar de ontologia), compactando antes se pedido."""
+        if compact:
+            self.compact()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._closed = True
+
+
+_journals_lock = threading.Lock()
+# journals de ontologias que não vieram do quadstore
+_unstored = weakref.WeakKeyDictionary()
+
+
+def existing_journal(onto):
+    """Journal já criado para `onto`, ou None."""
+    info = store_info(onto)
+    if info:
+        return info.get("journal")
+    return _unstored.get(onto)
+
+
+def get_journal(onto, fallback_path=None, compact_delay=10.0, fsync=True):
+    """Journal de `onto`, criado na primeira chamada."""
+    info = store_info(onto)
+    with _journals_lock:
+        journal = info.get("journal") if info else _unstored.get(onto)
+        if journal is None:
+            journal = ChangeJournal(onto, fallback_path, compact_delay, fsync)
+            if info:
+                info["journal"] = journal
+            else:
+                _unstored[onto] = journal
+        return journal
+
+
+@contextlib.contextmanager
+def journaled(onto, fallback_path=None, **options):
+    """
+    Contexto de mutação: com quadstore, grava as alterações no journal; sem ele,
+    mantém o comportamento antigo de salvar o RDF/XML inteiro em `fallback_path`.
+    Em ambos os casos a mutação recebe uma nova versão (journal.version).
+    """
+    journal = get_journal(onto, fallback_path, **options)
+    with journal.mutation():
+        yield journal
+
+
+def discard_journal(store, digest):
+    """Descarta as edições pendentes de um snapshot (ex.: o mesmo arquivo foi reenviado)."""
+    try:
+        os.remove(store.journal_path(digest))
+    except OSError:
+        pass
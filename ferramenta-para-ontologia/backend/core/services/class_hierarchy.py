@@ -0,0 +1,207 @@
+# core/services/class_hierarchy.py
+"""
+Hierarquia de classes pré-computada, servida um nível por vez.
+
+A árvore completa (build_entity_hierarchy) recursava em `subclasses()` e
+ordenava cada nível a cada upload, duplicando subárvores de classes com
+mais de um pai. Aqui a tabela pai/filhos é montada uma vez por versão da
+ontologia a partir das triplas rdfs:subClassOf entre classes nomeadas,
+junto com a contagem de descendentes (fecho transitivo, sem repetição,
+calculado sobre os componentes fortemente conexos para tolerar ciclos de
+subClassOf). A API devolve só os filhos diretos de um nó, paginados, com
+as contagens para o frontend expandir sob demanda.
+
+Como o graph_index, o journal de alterações avisa a hierarquia a cada
+mutação (apply_changes): se nenhuma tripla de classe mudou (o caso comum,
+edições de indivíduos), a tabela só avança de versão; senão é descartada e
+remontada na próxima consulta.
+"""
+import threading
+import time
+import weakref
+
+from .graph_index import local_name
+from .ontology_session import is_editing
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+RDFS_SUBCLASSOF = "http://www.w3.org/2000/01/rdf-schema#subClassOf"
+OWL_CLASS = "http://www.w3.org/2002/07/owl#Class"
+
+
+def _storid(db, iri):
+    row = db.execute("SELECT storid FROM resources WHERE iri=?", (iri,)).fetchone()
+    return row[0] if row else None
+
+
+class ClassHierarchy:
+    """Tabela pai/filhos das classes nomeadas de um mundo Owlready2."""
+
+    def __init__(self, world):
+        started = time.perf_counter()
+        db = world.graph.db
+        self.version = db.total_changes
+        self.rdf_type = _storid(db, RDF_TYPE)
+        self.rdfs_label = _storid(db, RDFS_LABEL)
+        self.subclass_of = _storid(db, RDFS_SUBCLASSOF)
+        self.owl_class = _storid(db, OWL_CLASS)
+
+        classes = {s for s, in db.execute("SELECT s FROM objs WHERE p=? AND o=? AND s > 0",
+                                          (self.rdf_type, self.owl_class))}
+        self.iri = {s: iri for s, iri in db.execute("SELECT storid, iri FROM resources") if s in classes}
+        self.by_iri = {iri: s for s, iri in self.iri.items()}
+        self.name = {s: local_name(iri) for s, iri in self.iri.items()}
+        self.label = {}
+        for s, o in db.execute("SELECT s, o FROM datas WHERE p=?", (self.rdfs_label,)):
+            if s in classes:
+                self.label.setdefault(s, str(o))
+
+        self.parents = {c: set() for c in classes}
+        self.children = {c: set() for c in classes}
+        for s, o in db.execute("SELECT s, o FROM objs WHERE p=? AND s > 0 AND o > 0", (self.subclass_of,)):
+            if s in classes and o in classes and s != o:
+                self.parents[s].add(o)
+                self.children[o].add(s)
+
+        order = lambda c: (self.name[c].lower(), self.name[c])
+        self.children = {c: sorted(kids, key=order) for c, kids in self.children.items()}
+        self.roots = sorted((c for c in classes if not self.parents[c]), key=order)
+        self.by_name = {}
+        for c in sorted(classes, key=order):
+            self.by_name.setdefault(self.name[c], []).append(c)
+        self.descendants = self._count_descendants()
+        self.build_time = time.perf_counter() - started
+
+    def _count_descendants(self):
+        """Número de descendentes distintos de cada classe (Tarjan + bitsets por componente)."""
+        index, low, comp = {}, {}, {}
+        stack, on_stack, comps = [], set(), []
+        counter = 0
+        for start in self.children:
+            if start in index:
+                continue
+            work = [(start, iter(self.children[start]))]
+            index[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                node, kids = work[-1]
+                advanced = False
+                for kid in kids:
+                    if kid not in index:
+                        index[kid] = low[kid] = counter
+                        counter += 1
+                        stack.append(kid)
+                        on_stack.add(kid)
+                        work.append((kid, iter(self.children[kid])))
+                        advanced = True
+                        break
+                    if kid in on_stack:
+                        low[node] = min(low[node], index[kid])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] == index[node]:
+                    members = []
+                    while True:
+                        x = stack.pop()
+                        on_stack.discard(x)
+                        comp[x] = len(comps)
+                        members.append(x)
+                        if x == node:
+                            break
+                    comps.append(members)
+
+        # Tarjan emite cada componente depois de todos os que ele alcança
+        bit = {c: 1 << i for i, c in enumerate(self.children)}
+        reach = []
+        for members in comps:
+            mask = 0
+            for c in members:
+                mask |= bit[c]
+                for kid in self.children[c]:
+                    if comp[kid] != len(reach):
+                        mask |= reach[comp[kid]]
+            reach.append(mask)
+        return {c: reach[comp[c]].bit_count() - 1 for c in self.children}
+
+    # ---------- consulta ----------
+    def resolve(self, identifier):
+        """storid de uma classe por IRI ou nome local (None se não existir)."""
+        if not identifier:
+            return None
+        if identifier in self.by_iri:
+            return self.by_iri[identifier]
+        ids = self.by_name.get(local_name(identifier))
+        return ids[0] if ids else None
+
+    def node(self, c):
+        return {
+            'name': self.name[c],
+            'iri': self.iri[c],
+            'label': self.label.get(c),
+            'children_count': len(self.children[c]),
+            'descendants_count': self.descendants[c],
+        }
+
+    def level(self, parent=None, offset=0, limit=100):
+        """(total, nós) dos filhos diretos de `parent` (storid) ou das raízes."""
+        ids = self.roots if parent is None else self.children.get(parent, [])
+        return len(ids), [self.node(c) for c in ids[offset:offset + limit]]
+
+    def names(self):
+        """Nomes de todas as classes, ordenados (para os seletores do frontend)."""
+        return list(self.by_name)
+
+    # ---------- atualização ----------
+    def touches(self, rows):
+        """True se alguma das triplas do journal altera a hierarquia (classes, subClassOf, rótulos)."""
+        for op, tbl, c, s, p, o, d in rows:
+            if p == self.subclass_of or (p == self.rdf_type and o == self.owl_class):
+                return True
+            if tbl == "d" and p == self.rdfs_label and s in self.iri:
+                return True
+        return False
+
+
+_hierarchies = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def apply_changes(world, rows, base_version):
+    """
+    Chamado pelo journal a cada flush: mantém a hierarquia se as triplas não a
+    afetam (só avança a versão), senão a descarta para remontar sob demanda.
+    """
+    with _lock:
+        hierarchy = _hierarchies.get(world)
+        if hierarchy is None:
+            return
+        if hierarchy.version == base_version and not hierarchy.touches(rows):
+            hierarchy.version = world.graph.db.total_changes
+        else:
+            del _hierarchies[world]
+
+
+def adopt(world, hierarchy):
+    """Instala em `world` uma hierarquia montada em outro mundo com o mesmo conteúdo (ver prefork.py)."""
+    with _lock:
+        hierarchy.version = world.graph.db.total_changes
+        _hierarchies[world] = hierarchy
+
+
+def get_class_hierarchy(onto):
+    """Hierarquia do mundo de `onto`, remontada só quando as classes mudam."""
+    world = onto.world
+    version = world.graph.db.total_changes
+    with _lock:
+        hierarchy = _hierarchies.get(world)
+        if hierarchy is not None and (hierarchy.version == version or is_editing(world)):
+            return hierarchy  # durante uma mutação do journal vale a versão anterior
+        hierarchy = ClassHierarchy(world)
+        if not is_editing(world):
+            _hierarchies[world] = hierarchy
+        return hierarchy
@@ -0,0 +1,165 @@
+# core/services/downsampling.py
+"""
+Redução de séries temporais para um número fixo de pontos, preservando a forma.
+
+Em vez de manter só os últimos `max_points` (o que transformava uma janela
+de 30 dias nas últimas horas), os pontos são escolhidos ao longo de toda a
+janela pedida:
+
+    lttb    Largest-Triangle-Three-Buckets: em cada bucket, o ponto que forma
+            o maior triângulo com o ponto escolhido no bucket anterior e a
+            média do próximo. Mantém picos e tendências com poucos pontos.
+    minmax  mínimo e máximo de cada bucket (na ordem temporal); bom para
+            não perder extremos de sinais ruidosos.
+    tail    comportamento antigo: os últimos `max_points`.
+
+Todas as funções recebem x (int64/float) e y (float64, NaN = ausente) já
+recortados e devolvem os índices escolhidos, em ordem crescente; quando a
+série tem mais que `n` pontos, são exatamente `n` índices.
+"""
+import numpy as np
+
+MODES = ("lttb", "minmax", "tail")
+# LTTB em lote só compensa com muitos buckets estreitos
+_BATCH = 64
+_WIDE = 256
+
+
+def _edges(length, buckets, start=0):
+    """Limites [edges[k], edges[k+1]) de `buckets` intervalos contíguos sobre `length` pontos."""
+    return start + np.linspace(0, length, buckets + 1).astype(np.int64)
+
+
+def lttb(x, y, n):
+    if n >= len(x):
+        return np.arange(len(x))
+    if n < 3:
+        return np.array([0, len(x) - 1][:n], dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x[0]
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(y)
+    y0 = np.where(valid, y, 0.0)
+
+    # pontos internos (1 .. len-2) divididos em n-2 buckets
+    edges = _edges(len(x) - 2, n - 2, start=1)
+    starts = edges[:-1]
+    counts = np.add.reduceat(valid.astype(np.int64)[1:-1], starts - 1)
+    sum_x = np.add.reduceat(x[1:-1], starts - 1)
+    sum_y = np.add.reduceat(y0[1:-1], starts - 1)
+    sizes = np.diff(edges)
+    avg_x = sum_x / sizes
+    avg_y = np.where(counts > 0, sum_y / np.maximum(counts, 1), np.nan)
+    # média do "próximo bucket": o último bucket usa o ponto final
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1] if valid[-1] else np.nan)
+
+    x_first = x[0]
+    y_first = y[0] if valid[0] else (y[valid][0] if valid.any() else 0.0)
+
+    def area(ax, ay, cx, cy, bx, by):
+        """Área (x2) dos triângulos entre a âncora (ax, ay), os pontos (bx, by) e (cx, cy)."""
+        return np.abs((ax - cx) * by + (cy - ay) * bx + (cx * ay - ax * cy))
+
+    def step(k, a):
+        """Ponto de maior área no bucket k com a âncora no índice `a` (-1 = primeiro ponto)."""
+        lo, hi = edges[k], edges[k + 1]
+        ax, ay = (x_first, y_first) if a < 0 else (x[a], y0[a])
+        cy = next_y[k]
+        best = area(ax, ay, next_x[k], ay if np.isnan(cy) else cy, x[lo:hi], y[lo:hi])
+        best[np.isnan(best)] = -1.0
+        return lo + int(best.argmax())
+
+    # LTTB é sequencial só pela âncora: o ponto escolhido no último bucket anterior com
+    # valores (buckets só com ausentes ficam no primeiro índice e não a mudam).
+    chosen = starts.copy()
+    live = np.flatnonzero(counts)
+    used = np.full(len(live), -2)  # âncora com que cada bucket foi escolhido (-2: nenhuma)
+    pick, todo = chosen[live], np.arange(len(live))
+    width = int(sizes.max())
+    if len(live) > _BATCH and width <= _WIDE:
+        # buckets estreitos: o custo está no laço, então a escolha é feita em lote sobre
+        # janelas de `width` pontos a partir do início de cada bucket (sem cópia). Primeiro
+        # com a média do bucket anterior como âncora; depois refaz os buckets cuja âncora
+        # mudou, até sobrarem poucos.
+        wx = np.lib.stride_tricks.sliding_window_view(np.append(x, np.zeros(width)), width)
+        wy = np.lib.stride_tricks.sliding_window_view(np.append(y, np.full(width, np.nan)), width)
+        inside = np.arange(width)
+
+        def batch(ks, ax, ay):
+            lo, cy = starts[ks], next_y[ks]
+            cy = np.where(np.isnan(cy), ay, cy)
+            best = area(ax[:, None], ay[:, None], next_x[ks][:, None], cy[:, None], wx[lo], wy[lo])
+            best[np.isnan(best) | (inside >= sizes[ks][:, None])] = -1.0
+            return lo + best.argmax(axis=1)
+
+        pick = batch(live, np.append(x_first, avg_x[live][:-1]), np.append(y_first, avg_y[live][:-1]))
+        used[:] = -3  # escolhidos com a média como âncora
+        while len(todo) > _BATCH:
+            anchor = np.append(-1, pick[:-1])
+            todo = np.flatnonzero(anchor != used)
+            a = anchor[todo]
+            pick[todo] = batch(live[todo], np.where(a < 0, x_first, x[a]), np.where(a < 0, y_first, y0[a]))
+            used[todo] = a
+            todo = np.flatnonzero(np.append(-1, pick[:-1]) != used)
+    # o que falta vai bucket a bucket, em ordem, seguindo cada cadeia de âncoras que
+    # mudaram: o resultado é exatamente o da versão sequencial
+    done = -1
+    for i in todo.tolist():
+        while done < i < len(live) and used[i] != (a := pick[i - 1] if i else -1):
+            used[i] = a
+            pick[i] = step(live[i], a)
+            i += 1
+        done = max(done, i)
+    chosen[live] = pick
+
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, len(x) - 1
+    out[1:-1] = chosen
+    return out
+
+
+def minmax(x, y, n):
+    if n >= len(x):
+        return np.arange(len(x))
+    if n == 1:
+        return np.array([len(x) - 1], dtype=np.int64)
+    if n % 2:
+        # n ímpar: buckets sobre os pontos anteriores e o último ponto da série completa a conta
+        return np.append(minmax(x[:-1], y[:-1], n - 1), len(x) - 1)
+    y = np.asarray(y, dtype=np.float64)
+    buckets = n // 2
+    edges = _edges(len(y), buckets)
+    sizes = np.diff(edges)
+    width = int(sizes.max())
+    # buckets de tamanhos diferentes viram linhas de uma matriz preenchida com ±inf
+    rows = np.repeat(np.arange(buckets), sizes)
+    cols = np.arange(len(y)) - np.repeat(edges[:-1], sizes)
+    missing = np.isnan(y)
+    low = np.full((buckets, width), np.inf)
+    low[rows, cols] = np.where(missing, np.inf, y)
+    high = np.full((buckets, width), -np.inf)
+    high[rows, cols] = np.where(missing, -np.inf, y)
+    imin = np.argmin(low, axis=1)
+    imax = np.argmax(high, axis=1)
+    # bucket constante (ou só com ausentes): min e max no mesmo ponto; completa com outro ponto do bucket
+    same = imin == imax
+    imax = np.where(same, np.where(imin == sizes - 1, 0, sizes - 1), imax)
+    out = np.empty(n, dtype=np.int64)
+    out[0::2] = edges[:-1] + np.minimum(imin, imax)
+    out[1::2] = edges[:-1] + np.maximum(imin, imax)
+    return out
+
+
+def tail(x, y, n):
+    return np.arange(max(len(x) - n, 0), len(x))
+
+
+def downsample(x, y, n, mode="lttb"):
+    """Índices dos pontos a devolver para a série (x, y) com no máximo `n` pontos."""
+    if mode not in MODES:
+        raise ValueError(f"modo de downsampling desconhecido: {mode!r} (use {', '.join(MODES)})")
+    if n is None or n <= 0 or len(x) <= n:
+        return np.arange(len(x))
+    return {"lttb": lttb, "minmax": minmax, "tail": tail}[mode](x, y, n)
@@ -0,0 +1,216 @@
+# core/services/entity_index.py
+"""
+Índice de entidades da ontologia por IRI, nome local, nome sanitizado e rdfs:label.
+
+Substitui `onto.search_one(iri=f"*{nome}") or onto.search_one(label=nome)`:
+a busca com curinga no início da IRI não usa índice do SQLite e varre a
+tabela inteira a cada chamada. Aqui o índice é montado uma vez por mundo
+(uma varredura) e mantido incrementalmente: pelas views ao criar ou remover
+entidades (add()/remove()) e pelo journal de alterações, que chama refresh()
+com as entidades tocadas por cada mutação. Resolver um nome é uma busca em
+dicionário.
+
+As entradas guardam storids; a entidade Owlready2 é obtida na hora da
+consulta e entradas de entidades já destruídas são descartadas.
+"""
+import re
+import threading
+import unicodedata
+import weakref
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+
+
+def sanitize_local_name(name: str) -> str:
+    """
+    Gera um identificador RDF/Python-safe a partir de uma string.
+    Ex.: "Poço Produção #1" -> "Poco_Producao_1"
+    Mantém só ASCII, letras/dígitos/underscore, e garante não começar com dígito.
+    """
+    if name is None:
+        return None
+    # normalize: remove acentos
+    s = unicodedata.normalize("NFKD", name).encode("ASCII", "ignore").decode("ASCII")
+    # keep letters/numbers/underscore
+    s = re.sub(r'[^0-9A-Za-z_]+', '_', s).strip('_')
+    # ensure it does not begin with digit
+    if re.match(r'^[0-9]', s):
+        s = f"n_{s}"
+    if not s:
+        s = "entity"
+    return s
+
+
+def _local_name(iri):
+    return iri.split('#')[-1].split('/')[-1]
+
+
+class EntityIndex:
+    """Entidades nomeadas (com rdf:type) de um mundo Owlready2."""
+
+    def __init__(self, world):
+        self.world = world
+        self.by_iri = {}
+        self.by_local = {}
+        self.by_sanitized = {}
+        self.by_label = {}
+        self.labels_of = {}    # storid -> rótulos indexados (para remover sem varrer by_label)
+        self._lock = threading.RLock()
+
+        db = world.graph.db
+        type_id = db.execute("SELECT storid FROM resources WHERE iri=?", (RDF_TYPE,)).fetchone()
+        label_id = db.execute("SELECT storid FROM resources WHERE iri=?", (RDFS_LABEL,)).fetchone()
+        rows = db.execute(
+            "SELECT DISTINCT r.storid, r.iri FROM objs o JOIN resources r ON r.storid = o.s "
+            "WHERE o.p = ? AND o.s > 0 ORDER BY r.storid", (type_id[0] if type_id else 0,)
+        )
+        for storid, iri in rows:
+            self._add(storid, iri, ())
+        if label_id:
+            known = set(self.by_iri.values())
+            for storid, label in db.execute("SELECT s, o FROM datas WHERE p = ? AND s > 0", (label_id[0],)):
+                if storid in known:
+                    self._put(self.by_label, str(label), storid)
+                    self._put(self.labels_of, storid, str(label))
+
+    # ---------- manutenção ----------
+    @staticmethod
+    def _put(table, key, storid):
+        ids = table.setdefault(key, [])
+        if storid not in ids:
+            ids.append(storid)
+
+    @staticmethod
+    def _drop(table, key, storid):
+        ids = table.get(key)
+        if ids and storid in ids:
+            ids.remove(storid)
+            if not ids:
+                del table[key]
+
+    def _add(self, storid, iri, labels):
+        local = _local_name(iri)
+        self.by_iri[iri] = storid
+        self._put(self.by_local, local, storid)
+        self._put(self.by_sanitized, sanitize_local_name(local), storid)
+        for label in labels:
+            self._put(self.by_label, str(label), storid)
+            self._put(self.labels_of, storid, str(label))
+
+    def _remove(self, storid, iri):
+        self.by_iri.pop(iri, None)
+        local = _local_name(iri)
+        self._drop(self.by_local, local, storid)
+        self._drop(self.by_sanitized, sanitize_local_name(local), storid)
+        for label in self.labels_of.pop(storid, ()):
+            self._drop(self.by_label, label, storid)
+
+    def add(self, entity):
+        """Registra (ou atualiza os rótulos de) uma entidade recém-criada."""
+        with self._lock:
+            labels = [str(l) for l in (getattr(entity, "label", []) or [])]
+            for label in self.labels_of.get(entity.storid, ()):
+                if label not in labels:
+                    self._drop(self.by_label, label, entity.storid)
+            self.labels_of.pop(entity.storid, None)
+            self._add(entity.storid, entity.iri, labels)
+
+    def remove(self, entity):
+        """Remove uma entidade do índice (chamar antes de destroy_entity)."""
+        with self._lock:
+            self._remove(entity.storid, entity.iri)
+
+    def refresh(self, iris):
+        """Reindexa as entidades em `iris` com o estado atual do mundo (ex.: após uma mutação)."""
+        with self._lock:
+            for iri in iris:
+                entity = self.world[iri]
+                if entity is not None and hasattr(entity, "storid") and hasattr(entity, "iri"):
+                    self.add(entity)
+                elif iri in self.by_iri:
+                    self._remove(self.by_iri[iri], iri)
+
+    # ---------- consulta ----------
+    def _entity(self, storid, kind=None):
+        try:
+            entity = self.world._get_by_storid(storid)
+        except Exception:
+            entity = None
+        if entity is None:
+            # entidade destruída por fora do índice: descartar a entrada
+            for iri in [i for i, s in self.by_iri.items() if s == storid]:
+                self._remove(storid, iri)
+            return None
+        if kind is not None and not isinstance(entity, kind):
+            return None
+        return entity
+
+    def _first(self, storids, kind=None):
+        for storid in list(storids or ()):
+            entity = self._entity(storid, kind)
+            if entity is not None:
+                return entity
+        return None
+
+    def find(self, name, kind=None):
+        """
+        Equivalente a `search_one(iri=f"*{name}") or search_one(label=name)`:
+        IRI completa, nome local ou rdfs:label. `kind` filtra por tipo
+        (ex.: ObjectPropertyClass).
+        """
+        if not name:
+            return None
+        name = str(name)
+        with self._lock:
+            if name in self.by_iri:
+                entity = self._first([self.by_iri[name]], kind)
+                if entity is not None:
+                    return entity
+            return (self._first(self.by_local.get(name), kind)
+                    or self._first(self.by_label.get(name), kind))
+
+    def resolve(self, identifier, kind=None):
+        """find() e, se nada for encontrado, tenta o nome sanitizado (como foi salvo ao criar)."""
+        entity = self.find(identifier, kind)
+        if entity is not None or not identifier:
+            return entity
+        sanitized = sanitize_local_name(str(identifier))
+        with self._lock:
+            return (self._first(self.by_local.get(sanitized), kind)
+                    or self._first(self.by_label.get(sanitized), kind)
+                    or self._first(self.by_sanitized.get(sanitized), kind))
+
+    def has_local(self, local):
+        """True se já existe entidade com esse nome local (para evitar colisões ao criar)."""
+        with self._lock:
+            return self._first(self.by_local.get(local)) is not None
+
+
+_indexes = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def refresh_entities(world, iris):
+    """Reindexa `iris` no índice de `world`, se ele já foi montado."""
+    with _lock:
+        index = _indexes.get(world)
+    if index is not None:
+        index.refresh(iris)
+
+
+def adopt(world, index):
+    """Instala em `world` um índice montado em outro mundo com o mesmo conteúdo (ver prefork.py)."""
+    with _lock:
+        index.world = world
+        _indexes[world] = index
+
+
+def get_entity_index(onto):
+    """Índice de entidades do mundo de `onto` (montado na primeira chamada)."""
+    world = onto.world
+    with _lock:
+        index = _indexes.get(world)
+        if index is None:
+            index = _indexes[world] = EntityIndex(world)
+        return index
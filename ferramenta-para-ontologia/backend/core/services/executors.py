@@ -0,0 +1,122 @@
+# core/services/executors.py
+"""
+Pools limitados para o trabalho bloqueante das views assíncronas (ASGI).
+
+Sob ASGI (ex.: uvicorn setup.asgi:application) o Django executa as views
+síncronas com sync_to_async(thread_sensitive=True): todas na mesma thread,
+uma de cada vez, então um gráfico lento segura todas as outras requisições.
+As views de leitura são assíncronas: o loop só recebe a requisição e envia a
+resposta, e o trabalho bloqueante vai para um pool dedicado por tipo:
+
+- "ontology": casos de uso predefinidos, SPARQL, listagens, hierarquia
+  (SQLite do Owlready2 e índices em memória);
+- "timeseries": leitura e reamostragem das séries, analytics, painel do poço
+  (numpy sobre mmap).
+
+O reasoning (HermiT) já roda fora do processo do servidor, no pool de
+processos do reasoning_jobs.
+
+Cada pool tem `max_workers` threads e aceita no máximo `max_queue` tarefas
+esperando. Além disso `run()` levanta `Saturated` na hora, sem enfileirar,
+e a view responde 503 com Retry-After: a fila não cresce sem limite na
+memória quando os clientes chegam mais rápido do que o pool atende. A vaga
+só é liberada quando a tarefa termina, mesmo que o cliente tenha desistido.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Saturated(Exception):
+    """O pool está com todas as threads ocupadas e a fila cheia."""
+
+    def __init__(self, name):
+        super().__init__(f"pool '{name}' saturado")
+        self.name = name
+
+
+class BoundedPool:
+    """ThreadPoolExecutor com admissão limitada a `max_workers + max_queue` tarefas."""
+
+    def __init__(self, name, max_workers=8, max_queue=64):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """concurrent.futures.Future de `fn`; Saturated se não há vaga."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise Saturated(self.name)
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Executa `fn` no pool e espera o resultado sem bloquear o loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def iterate(self, iterator):
+        """
+        Consome um iterador síncrono (ex.: streaming de uma view síncrona) no
+        pool, um item por vez. A requisição já foi admitida: os passos não
+        passam pelo limite de vagas.
+        """
+        done = object()
+        try:
+            while True:
+                item = await self.call(next, iterator, done)
+                if item is done:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                await self.call(close)
+
+    async def call(self, fn, *args, **kwargs):
+        """Como `run`, sem passar pelo limite: passos de uma requisição já admitida."""
+        return await asyncio.wrap_future(self._executor.submit(fn, *args, **kwargs))
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.max_workers, "queue": self.max_queue, "pending": self._pending,
+                    "completed": self._completed, "rejected": self._rejected}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, max_workers=8, max_queue=64):
+    """Pool compartilhado do processo por nome (criado com os limites da primeira chamada)."""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = BoundedPool(name, max_workers, max_queue)
+        return pool
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
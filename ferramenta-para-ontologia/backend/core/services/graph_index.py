@@ -0,0 +1,268 @@
+# core/services/graph_index.py
+"""
+Índices de adjacência do grafo da ontologia para as consultas predefinidas.
+
+Em vez de materializar o grafo rdflib a cada requisição e testar pontos do
+produto cartesiano de candidatos, o índice é montado uma vez por versão da
+ontologia (uma varredura das tabelas do quadstore) e as consultas viram
+junções de dicionários:
+
+    out[p][s] -> objetos       (s p ?o)
+    inn[p][o] -> sujeitos      (?s p o)
+    referrers[o] -> sujeitos   (?s ?p o, qualquer predicado)
+    types[s] / instances[c]    (rdf:type)
+    labels[texto] / by_local[nome local]
+
+Nós e predicados são IDs inteiros de IRIs canônicas (ver namespaces.py):
+os aliases o3po/o3po_merged/o3po_inferred e core/core1 caem no mesmo ID,
+então cada termo da consulta custa uma única busca. `iri(id)` devolve a
+IRI original para as respostas; nós em branco aparecem como "_:<storid>".
+A versão é o contador de alterações da conexão SQLite do mundo, então
+qualquer edição feita pelo Owlready2 invalida o índice automaticamente. As
+edições que passam pelo journal (change_journal.py) geram um índice novo a
+partir do existente (apply_changes/with_changes, copy-on-write), sem
+reconstruí-lo e sem alterar o objeto que uma consulta em andamento está usando.
+"""
+import threading
+import time
+import weakref
+
+from .namespaces import TermTable
+from .ontology_session import is_editing
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+
+
+def local_name(iri):
+    """Parte final de uma IRI (após '#' ou '/')."""
+    if not iri:
+        return iri
+    return str(iri).split('#')[-1].split('/')[-1]
+
+
+class GraphIndex:
+    """Adjacências de um mundo Owlready2 numa versão específica."""
+
+    def __init__(self, world):
+        started = time.perf_counter()
+        db = world.graph.db
+        self.version = db.total_changes
+        self.terms = terms = TermTable()
+        iris = dict(db.execute("SELECT storid, iri FROM resources"))
+        self._ids = ids = {}   # storid -> id
+
+        # internado na ordem em que aparece nas triplas: a IRI original devolvida
+        # por iri() é a efetivamente usada nas triplas, não a primeira declarada
+        def node(x):
+            tid = ids.get(x)
+            if tid is None:
+                tid = ids[x] = terms.intern(f"_:{x}" if x < 0 else iris.get(x, str(x)))
+            return tid
+
+        self.out = {}
+        self.inn = {}
+        self.referrers = {}
+        self.types = {}
+        self.instances = {}
+        self.subjects = set()
+
+        # predicados primeiro, do mais usado ao menos usado: para um predicado com
+        # aliases, a IRI devolvida é a que de fato liga as triplas
+        for p, in db.execute("SELECT p FROM objs GROUP BY p ORDER BY COUNT(*) DESC"):
+            node(p)
+        self.rdf_type = rdf_type = terms.intern(RDF_TYPE)
+        for s, p, o in db.execute("SELECT s, p, o FROM objs"):
+            s, p, o = node(s), node(p), node(o)
+            self.subjects.add(s)
+            self.out.setdefault(p, {}).setdefault(s, []).append(o)
+            self.inn.setdefault(p, {}).setdefault(o, []).append(s)
+            self.referrers.setdefault(o, []).append(s)
+            if p == rdf_type:
+                self.types.setdefault(s, set()).add(o)
+                self.instances.setdefault(o, []).append(s)
+
+        self.labels = {}
+        self.label_of = {}
+        self.rdfs_label = rdfs_label = terms.intern(RDFS_LABEL)
+        for s, p, o in db.execute("SELECT s, p, o FROM datas"):
+            s = node(s)
+            self.subjects.add(s)
+            if node(p) == rdfs_label:
+                self.labels.setdefault(str(o), s)
+                self.label_of.setdefault(s, str(o))
+
+        self.by_local = {}
+        for s in self.subjects:
+            self.by_local.setdefault(local_name(terms.iri(s)), s)
+
+        self.build_time = time.perf_counter() - started
+
+    # ---------- atualização incremental ----------
+    def _node(self, world, x):
+        tid = self._ids.get(x)
+        if tid is None:
+            tid = self._ids[x] = self.terms.intern(f"_:{x}" if x < 0 else world._unabbreviate(x))
+        return tid
+
+    def _own(self, owned, table, key, factory):
+        """table[key] próprio desta cópia: copiado na primeira alteração, criado se não existe."""
+        values = table.get(key)
+        if values is None:
+            values = table[key] = factory()
+        elif id(values) not in owned:
+            values = table[key] = values.copy()
+        owned.add(id(values))
+        return values
+
+    def _unlink(self, owned, table, key, value):
+        values = table.get(key)
+        if values is not None and value in values:
+            values = self._own(owned, table, key, list)
+            values.remove(value)
+            if not values:
+                del table[key]
+
+    def with_changes(self, world, rows):
+        """
+        Novo índice com as triplas inseridas/removidas (linhas op, tbl, c, s,
+        p, o, d do journal, em storids), na versão atual do mundo. O índice
+        original não é alterado (copy-on-write): as tabelas de primeiro nível
+        são copiadas e, abaixo delas, só as listas/dicionários tocados, então
+        uma consulta que ainda usa o índice anterior não vê uma edição pela
+        metade. A tabela de termos e os storids só crescem e são compartilhados.
+        """
+        new = object.__new__(GraphIndex)
+        new.__dict__.update(self.__dict__)
+        for name in ("out", "inn", "referrers", "types", "instances", "labels", "label_of", "by_local"):
+            setattr(new, name, dict(getattr(self, name)))
+        new.subjects = set(self.subjects)
+        owned = set()
+        own = new._own
+        for op, tbl, c, s, p, o, d in rows:
+            s, p = new._node(world, s), new._node(world, p)
+            if tbl == "d":
+                if p != new.rdfs_label:
+                    if op == "+":
+                        new.subjects.add(s)
+                    continue
+                text = str(o)
+                if op == "+":
+                    new.subjects.add(s)
+                    new.labels.setdefault(text, s)
+                    new.label_of.setdefault(s, text)
+                else:
+                    if new.labels.get(text) == s:
+                        del new.labels[text]
+                    if new.label_of.get(s) == text:
+                        del new.label_of[s]
+                continue
+            o = new._node(world, o)
+            if op == "+":
+                if s not in new.subjects:
+                    new.subjects.add(s)
+                    new.by_local.setdefault(local_name(new.terms.iri(s)), s)
+                own(owned, own(owned, new.out, p, dict), s, list).append(o)
+                own(owned, own(owned, new.inn, p, dict), o, list).append(s)
+                own(owned, new.referrers, o, list).append(s)
+                if p == new.rdf_type:
+                    own(owned, new.types, s, set).add(o)
+                    own(owned, new.instances, o, list).append(s)
+            else:
+                if p in new.out:
+                    new._unlink(owned, own(owned, new.out, p, dict), s, o)
+                if p in new.inn:
+                    new._unlink(owned, own(owned, new.inn, p, dict), o, s)
+                new._unlink(owned, new.referrers, o, s)
+                if p == new.rdf_type and o not in new.out.get(p, {}).get(s, ()):
+                    if s in new.types:
+                        own(owned, new.types, s, set).discard(o)
+                    new._unlink(owned, new.instances, o, s)
+        new.version = world.graph.db.total_changes
+        return new
+
+    # ---------- termos ----------
+    def id(self, term):
+        """ID de um termo ('o3po:ICV', IRI de qualquer alias), ou None se não está na ontologia."""
+        return self.terms.lookup(term)
+
+    def ids(self, terms):
+        """IDs dos termos presentes na ontologia, sem repetição (aliases colapsam)."""
+        out = []
+        for t in terms:
+            tid = self.id(t)
+            if tid is not None and tid not in out:
+                out.append(tid)
+        return out
+
+    def iri(self, tid):
+        """IRI original (como está na ontologia) de um ID."""
+        return self.terms.iri(tid)
+
+    # ---------- consultas ----------
+    def objects(self, s, p):
+        return self.out.get(p, {}).get(s, ())
+
+    def subjects_of(self, p, o):
+        return self.inn.get(p, {}).get(o, ())
+
+    def has(self, s, p, o):
+        return o in self.out.get(p, {}).get(s, ())
+
+    def has_type(self, s, cls):
+        return cls in self.types.get(s, ())
+
+    def neighbours(self, node, predicates):
+        """Nós ligados a `node` por algum de `predicates`, em qualquer direção: {vizinho: predicado}."""
+        found = {}
+        for p in predicates:
+            for x in self.objects(node, p):
+                found.setdefault(x, p)
+            for x in self.subjects_of(p, node):
+                found.setdefault(x, p)
+        return found
+
+
+_indexes = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def apply_changes(world, rows, base_version):
+    """
+    Atualiza o índice já montado de `world` com as triplas do journal. Só
+    vale se o índice estava na versão `base_version` (a do flush anterior);
+    senão ele é descartado e remontado na próxima consulta.
+    """
+    with _lock:
+        index = _indexes.get(world)
+        if index is None:
+            return
+        if index.version == base_version:
+            _indexes[world] = index.with_changes(world, rows)
+        else:
+            del _indexes[world]
+
+
+def adopt(world, index):
+    """
+    Instala em `world` um índice montado em outro mundo com o mesmo conteúdo
+    (mesmo quadstore, mesmos storids), como o do processo mestre no modo
+    pre-fork (ver prefork.py).
+    """
+    with _lock:
+        index.version = world.graph.db.total_changes
+        _indexes[world] = index
+
+
+def get_graph_index(onto):
+    """Índice do mundo de `onto`, reconstruído só quando a ontologia muda."""
+    world = onto.world
+    version = world.graph.db.total_changes
+    with _lock:
+        index = _indexes.get(world)
+        if index is not None and (index.version == version or is_editing(world)):
+            return index  # durante uma mutação do journal vale a versão anterior
+        index = GraphIndex(world)
+        if not is_editing(world):
+            _indexes[world] = index
+        return index
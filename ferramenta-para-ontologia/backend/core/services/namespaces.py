@@ -0,0 +1,95 @@
+# core/services/namespaces.py
+"""
+Tabela de aliases de namespaces.
+
+Os mesmos termos da O3PO aparecem em três IRIs base (o3po, o3po_merged,
+o3po_inferred) e os do IOF Core em mais de uma (core, core1 e o core do
+ODP). Em vez de cada consulta tentar todas as variantes, as IRIs são
+canonizadas na carga: cada grupo de bases equivalentes tem uma base
+canônica, e cada termo canônico recebe um ID inteiro (TermTable). A tabela
+guarda o caminho inverso, para que as respostas continuem devolvendo as
+IRIs originais da ontologia.
+"""
+
+# prefixo -> IRI base (o primeiro de cada grupo em NAMESPACE_GROUPS é o canônico)
+PREFIXES = {
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'owl': 'http://www.w3.org/2002/07/owl#',
+    'xsd': 'http://www.w3.org/2001/XMLSchema#',
+    'o3po': 'http://html.inf.ufrgs.br/home/pos/nosantos/public_html/o3po.owl#',
+    'o3po_merged': 'http://www.semanticweb.org/nicoy/ontologies/2023/1/o3po_merged#',
+    'o3po_inferred': 'http://www.semanticweb.org/tturb/ontologies/2025/3/o3po_inferred#',
+    'core1': 'https://purl.industrialontologies.org/ontology/core/Core/',
+    'core': 'https://spec.industrialontologies.org/ontology/core/Core/',
+    'odp_core': 'http://www.ontologydesignpatterns.org/cp/owl/core#',
+    'obo': 'http://purl.obolibrary.org/obo/',
+}
+
+NAMESPACE_GROUPS = [
+    [PREFIXES['o3po'], PREFIXES['o3po_merged'], PREFIXES['o3po_inferred']],
+    [PREFIXES['core1'], PREFIXES['core'], PREFIXES['odp_core']],
+]
+
+# base alias -> base canônica
+ALIASES = {alias: group[0] for group in NAMESPACE_GROUPS for alias in group}
+
+
+def split_iri(iri):
+    """(base, local) de uma IRI, cortando no último '#' ou '/'."""
+    i = max(iri.rfind('#'), iri.rfind('/'))
+    return (iri[:i + 1], iri[i + 1:]) if i >= 0 else ('', iri)
+
+
+def canonical_iri(iri):
+    """IRI com a base trocada pela canônica do grupo (ou inalterada)."""
+    if not iri:
+        return iri
+    base, local = split_iri(iri)
+    canon = ALIASES.get(base)
+    return canon + local if canon else iri
+
+
+def expand_term(term):
+    """
+    Converte 'o3po:ICV', '<http://...>' ou 'http://...' numa IRI canônica.
+    Nomes sem prefixo nem base são devolvidos como estão.
+    """
+    if not term:
+        return term
+    s = str(term).strip()
+    if s.startswith('<') and s.endswith('>'):
+        s = s[1:-1].strip()
+    if not (s.startswith('http://') or s.startswith('https://') or s.startswith('urn:')) and ':' in s:
+        prefix, local = s.split(':', 1)
+        if prefix in PREFIXES:
+            s = PREFIXES[prefix] + local
+    return canonical_iri(s)
+
+
+class TermTable:
+    """IDs inteiros para IRIs canônicas, com mapa inverso para as IRIs originais."""
+
+    def __init__(self):
+        self.ids = {}          # IRI canônica -> id
+        self.canonical = []    # id -> IRI canônica
+        self.originals = []    # id -> IRIs originais vistas na ontologia (ordem de aparição)
+
+    def intern(self, iri):
+        canon = canonical_iri(iri)
+        tid = self.ids.get(canon)
+        if tid is None:
+            tid = self.ids[canon] = len(self.canonical)
+            self.canonical.append(canon)
+            self.originals.append([iri])
+        elif iri not in self.originals[tid]:
+            self.originals[tid].append(iri)
+        return tid
+
+    def lookup(self, term):
+        """ID do termo ('o3po:X', IRI de qualquer alias...), ou None se não existe na ontologia."""
+        return self.ids.get(expand_term(term))
+
+    def iri(self, tid):
+        """Primeira IRI original do termo (a que as respostas devolvem)."""
+        return self.originals[tid][0]
@@ -1,27 +1,38 @@
 # ontology/services/ontology_service.py
-from owlready2 import get_ontology, sync_reasoner, default_world
+from owlready2 import sync_reasoner
 import re
 import os
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+import time
+
+from .ontology_store import load_ontology, release_later, store_info
+from .reasoning_jobs import get_jobs, has_local_edits, swap_to_inferred
+from .graph_index import get_graph_index
+from .result_cache import get_result_cache, ontology_version
+from .sparql_engine import get_sparql_engine
+
+# Os módulos de séries temporais (NumPy, pandas) são importados no primeiro
+# uso: o boot dos workers e os comandos do manage.py não pagam por eles.
 
 
 class OntologyService:
-    def __init__(self, owl_path="D:\Área de Trabalho\OntologyManager\backend\data\o3po_merged.owl", run_reasoner_on_init=False):
+    def __init__(self, owl_path="D:\Área de Trabalho\OntologyManager\backend\data\o3po_merged.owl", run_reasoner_on_init=False, store_dir=None):
         """
         Por padrão, não rodar o reasoner aqui (run_reasoner_on_init=False).
         Em dev com runserver, executar no import causa execuções duplicadas.
         Use run_reasoner() explicitamente ou use AppConfig.ready() para ativar.
+
+        Com `store_dir`, a ontologia é aberta do quadstore persistente
+        (ver ontology_store.py) em vez de refazer o parse do RDF/XML.
         """
         self.owl_path = owl_path
+        self.store_dir = store_dir
         self.onto = None
         self._inferred = False
 
         # carregar ontologia se arquivo existir
         if os.path.exists(owl_path):
             print(f"[OntologyService] Loading ontology from {owl_path} ...")
-            self.onto = get_ontology(f"file://{owl_path}").load()
+            self.onto = load_ontology(owl_path, store_dir=store_dir)
             if run_reasoner_on_init:
                 # proteger contra execução duplicada em runserver/reloader:
                 if os.environ.get("RUN_MAIN") == "true" or os.environ.get("WERKZEUG_RUN_MAIN") == "true" or os.environ.get("RUN_MAIN") is None:
@@ -40,22 +51,83 @@ class OntologyService:
         Executa o reasoner de forma robusta:
          - ignora se já rodou (idempotente)
          - tenta chamar sync_reasoner com ou sem o kwarg 'infer_data_property_values'
+         - com quadstore, reaproveita a materialização em cache para as mesmas triplas
+           asseridas e opções (ver reasoning_jobs.py), sem iniciar a JVM
         """
         if self._inferred:
             print("[OntologyService] Reasoner already executed; skipping.")
             return
 
+        jobs = get_jobs(self.store_dir) if self.store_dir and store_info(self.onto) else None
+        if jobs is not None and not has_local_edits(self.onto):
+            cached = jobs.open_inferred(self.onto, infer_property_values, infer_data_property_values)
+            if cached is not None:
+                print("[OntologyService] Using cached reasoner result.")
+                self.onto = cached
+                self._inferred = True
+                return
+        # só publica no cache se o reasoning partir exatamente das triplas asseridas do arquivo
+        publishable = jobs is not None and not has_local_edits(self.onto)
+
         try:
             # versão que tenta passar ambos (algumas versões aceitam)
-            sync_reasoner(infer_property_values=infer_property_values,
+            sync_reasoner(self.onto.world,
+                          infer_property_values=infer_property_values,
                           infer_data_property_values=infer_data_property_values)
         except TypeError:
             # fallback: algumas versões do owlready2/ HermiT não aceitam infer_data_property_values
-            sync_reasoner(infer_property_values=infer_property_values)
+            sync_reasoner(self.onto.world, infer_property_values=infer_property_values)
         self._inferred = True
+        if publishable:
+            jobs.publish(self.onto, infer_property_values, infer_data_property_values)
+
+    def start_background_reasoning(self, infer_property_values: bool = True, infer_data_property_values: bool = False,
+                                   max_workers: int = 1, java_memory=None):
+        """
+        Agenda o reasoning num processo separado (ver reasoning_jobs.py) e retorna o status
+        sem bloquear. Enquanto isso as consultas usam a versão asserida; refresh() troca
+        para o snapshot inferido quando ele ficar pronto.
+        """
+        if self.onto is None or not self.store_dir:
+            raise RuntimeError("Reasoning em segundo plano requer a ontologia aberta pelo quadstore (store_dir).")
+        self._jobs = get_jobs(self.store_dir, max_workers=max_workers, java_memory=java_memory)
+        return self._jobs.submit(self.onto,
+                                 infer_property_values=infer_property_values,
+                                 infer_data_property_values=infer_data_property_values)
+
+    def refresh(self):
+        """Troca para o snapshot inferido se o job em segundo plano já terminou."""
+        jobs = getattr(self, "_jobs", None)
+        if jobs is None or self._inferred:
+            return
+        old = self.onto
+        new = swap_to_inferred(old, jobs)
+        if new is not old:
+            self.onto = new
+            self._inferred = True
+            # consultas em andamento ainda podem estar no mundo asserido
+            release_later(old)
+            print("[OntologyService] Switched to inferred snapshot.")
 
     def as_rdflib(self):
-        return default_world.as_rdflib_graph()
+        return self.onto.world.as_rdflib_graph()
+
+    def sparql(self, query, params=(), engine=None):
+        """
+        Executa uma consulta SPARQL com parâmetros posicionais (`??1`, `??2`...)
+        no motor nativo do Owlready2, com fallback para o rdflib no que ele não
+        suporta (ver sparql_engine.py). Retorna (variáveis, motor usado, gerador
+        de linhas no formato SPARQL JSON); SparqlError se a consulta for inválida.
+        """
+        self.refresh()
+        if self.onto is None:
+            raise RuntimeError("Ontology not loaded. Set correct O3PO_OWL_PATH and load the ontology.")
+        prepared, used, rows = get_sparql_engine().execute(self.onto.world, query, params=params, engine=engine)
+        return prepared.variables, used, rows
+
+    def sparql_stats(self):
+        """Tempos de preparo/execução por consulta e motor (nativo x rdflib)."""
+        return get_sparql_engine().stats()
 
     def _local_name(self, uri_str: str) -> str:
         if not uri_str:
@@ -64,76 +136,181 @@ class OntologyService:
         return m.group("local") if m else uri_str
 
     def get_icv_annular_pressure_tags_for_well(self, well_local_name: str):
-        if self.onto is None:
+        self.refresh()
+        onto = self.onto
+        if onto is None:
             raise RuntimeError("Ontology not loaded. Set correct O3PO_OWL_PATH and load the ontology.")
-        sparql = f"""
-        PREFIX rdf:  <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-        PREFIX o3po: <http://html.inf.ufrgs.br/home/pos/nosantos/public_html/o3po.owl#>
-        PREFIX o3po_merged: <http://www.semanticweb.org/nicoy/ontologies/2023/1/o3po_merged#>
-        PREFIX core1: <https://purl.industrialontologies.org/ontology/core/Core/>
-
-        SELECT DISTINCT ?suj ?label WHERE {{
-          ?icv rdf:type o3po:ICV .
-          ?icv o3po:component_of o3po_merged:{well_local_name} .
-          ?anular rdf:type o3po:ICV_annular_pressure .
-          ?anular core1:qualityOf ?icv .
-          ?suj core1:isAbout ?anular .
-          OPTIONAL {{ ?suj rdfs:label ?label . }}
-        }}
-        """
-        g = self.as_rdflib()
-        qres = g.query(sparql)
-
-        tags = []
-        for row in qres:
-            raw = row[0]
-            label = str(row[1]) if len(row) > 1 and row[1] is not None else None
-
-            if hasattr(raw, "toPython"):
-                try:
-                    raw_py = raw.toPython()
-                except:
-                    raw_py = str(raw)
-            else:
-                raw_py = str(raw)
+        # em cache pela versão da ontologia (ver result_cache.py)
+        tags, _ = get_result_cache().get_or_compute(
+            "icv_tags", lambda: ontology_version(onto), [well_local_name],
+            lambda: self._icv_annular_pressure_tags(onto, well_local_name),
+        )
+        return tags
 
-            if isinstance(raw_py, str) and (raw_py.startswith("http://") or raw_py.startswith("https://")):
-                local = self._local_name(raw_py)
-                tag_value = local
-            else:
-                tag_value = raw_py
+    def _icv_annular_pressure_tags(self, onto, well_local_name):
+        # junções sobre o índice de adjacências (termos já canonizados entre os aliases
+        # o3po/o3po_merged/o3po_inferred e core/core1, ver namespaces.py)
+        g = get_graph_index(onto)
+        icv_cls, annular_cls = g.id("o3po:ICV"), g.id("o3po:ICV_annular_pressure")
+        component_of, quality_of, is_about = g.id("o3po:component_of"), g.id("core1:qualityOf"), g.id("core1:isAbout")
+        well = g.id(f"o3po:{well_local_name}")
 
-            tags.append({
-                "raw": str(raw),
-                "tag": tag_value,
-                "label": label
-            })
+        tags = []
+        seen = set()
+        for icv in g.subjects_of(component_of, well):
+            if not g.has_type(icv, icv_cls):
+                continue
+            for anular in g.subjects_of(quality_of, icv):
+                if not g.has_type(anular, annular_cls):
+                    continue
+                for suj in g.subjects_of(is_about, anular):
+                    if suj in seen:
+                        continue
+                    seen.add(suj)
+                    raw = g.iri(suj)
+                    tags.append({
+                        "raw": raw,
+                        "tag": self._local_name(raw) if raw.startswith(("http://", "https://")) else raw,
+                        "label": g.label_of.get(suj)
+                    })
         return tags
 
     # timeseries helpers (mesmo que você já tem)
     def _csv_path_for_tag(self, tag):
+        return self._timeseries_store().csv_path(tag)
+
+    def _timeseries_store(self):
+        from .timeseries_store import get_timeseries_store
         csv_dir = os.environ.get("TIMESERIES_CSV_DIR", "/mnt/data/timeseries")
-        return os.path.join(csv_dir, f"{tag}.csv")
-
-    def get_timeseries_for_tag(self, tag, start=None, end=None, max_points=500):
-        path = self._csv_path_for_tag(tag)
-        if os.path.exists(path):
-            df = pd.read_csv(path, parse_dates=["timestamp"])
-            if start:
-                df = df[df["timestamp"] >= pd.to_datetime(start)]
-            if end:
-                df = df[df["timestamp"] <= pd.to_datetime(end)]
-            if len(df) > max_points:
-                df = df.iloc[-max_points:]
-            timestamps = [ts.isoformat() for ts in df["timestamp"].tolist()]
-            values = [float(v) if not pd.isna(v) else None for v in df["value"].tolist()]
-            return {"tag": tag, "simulated": False, "timestamps": timestamps, "values": values}
+        return get_timeseries_store(csv_dir, os.environ.get("TIMESERIES_STORE_DIR") or None)
+
+    def get_timeseries_for_tag(self, tag, start=None, end=None, max_points=500, downsample="lttb"):
+        """
+        Série da tag no período [start, end]. Com mais de `max_points` pontos, a
+        janela inteira é reduzida a exatamente `max_points` (downsampling.py:
+        "lttb", "minmax" ou "tail" = só os últimos pontos, como antes).
+
+        Janelas longas são respondidas pelos rollups (1 min / 1 h / 1 dia) do
+        nível mais grosso que ainda tem `max_points` buckets: "lttb" usa a média
+        de cada bucket e "minmax" o mínimo e o máximo. `resolution` indica o
+        nível usado ("raw" para os pontos brutos).
+        """
+        import numpy as np
+        from .downsampling import MODES as DOWNSAMPLE_MODES, downsample as downsample_indices
+        from .synthetic_timeseries import synthetic_series
+        from .timeseries_store import iso_timestamps, to_epoch_ns, values_to_json
+
+        if downsample not in DOWNSAMPLE_MODES:
+            raise ValueError(f"modo de downsampling desconhecido: {downsample!r} (use {', '.join(DOWNSAMPLE_MODES)})")
+        # colunas NumPy em mmap (timeseries_store.py), recortadas por searchsorted
+        series = self._timeseries_store().series(tag)
+        if series is not None:
+            start, end = start or None, end or None
+            if downsample == "tail":
+                i, j = series.bounds(start, end)
+                level, total = None, j - i
+            else:
+                level, i, j, total = series.resolve(start, end, max_points,
+                                                    points_per_bucket=2 if downsample == "minmax" else 1)
+            if level is None:
+                ts, values = series.ts[i:j], series.values[i:j]
+            elif downsample == "minmax":
+                # cada bucket vira dois pontos (mínimo e máximo) no início do bucket
+                ts = np.repeat(level.ts[i:j], 2)
+                values = np.column_stack((level.column("min", i, j), level.column("max", i, j))).ravel()
+            else:
+                ts, values = level.ts[i:j], level.column("mean", i, j)
+            reduced = bool(max_points) and len(ts) > max_points
+            if reduced:
+                idx = downsample_indices(ts, values, max_points, downsample)
+                ts, values = ts[idx], values[idx]
+            return {"tag": tag, "simulated": False,
+                    "timestamps": iso_timestamps(ts),
+                    "values": values_to_json(values),
+                    "total_points": total,
+                    "resolution": level.name if level is not None else "raw",
+                    "downsample": downsample if reduced or level is not None else None}
         else:
-            now = datetime.utcnow()
-            hours = 48
-            timestamps = [(now - timedelta(hours=(hours - 1 - i))).isoformat() + "Z" for i in range(hours)]
-            x = np.arange(hours)
-            values = (50 + 5*np.sin(2*np.pi*x/24) + 0.5*x + np.random.normal(scale=0.7, size=hours)).tolist()
-            values = [float(round(v, 3)) for v in values]
-            return {"tag": tag, "simulated": True, "timestamps": timestamps, "values": values}
+            # sem CSV: série sintética determinística (synthetic_timeseries.py), de hora em hora
+            # (ou mais espaçada, para caber em max_points); janela padrão: últimas 48 h
+            hour = 3600 * 1_000_000_000
+            end_ns = to_epoch_ns(end) if end else time.time_ns() // hour * hour
+            start_ns = to_epoch_ns(start) if start else end_ns - 47 * hour
+            step = max(3600, -(-(end_ns - start_ns) // (max_points or 1) // 1_000_000_000))
+            ts, values = synthetic_series(tag, start_ns, end_ns, step)
+            return {"tag": tag, "simulated": True,
+                    "timestamps": iso_timestamps(ts),
+                    "values": values_to_json(np.round(values, 3)),
+                    "total_points": len(ts),
+                    "resolution": "raw",
+                    "downsample": None}
+
+    def get_timeseries_for_tags(self, tags, start=None, end=None, max_points=500, workers=8):
+        """
+        Várias tags numa grade de tempo comum: as séries são abertas (e
+        convertidas, se preciso) em paralelo num pool de `workers` threads e
+        cada uma vira a média por intervalo de uma grade regular com no máximo
+        `max_points` intervalos sobre [start, end] (ou sobre a união das
+        séries). Janelas longas usam os rollups (ver shared_grid).
+
+        Tags sem CSV vão para `missing` (sem série simulada, que não faria
+        sentido no eixo comum); falhas de leitura vão para `errors`.
+        """
+        import numpy as np
+        from .timeseries_store import iso_timestamps, values_to_json
+
+        result, aligned, grid = self.align_timeseries(tags, start=start, end=end, max_points=max_points,
+                                                      workers=workers)
+        result["series"].update({tag: values_to_json(values) for tag, values in aligned.items()})
+        if grid is not None:
+            lo, step, bins, _ = grid
+            result["timestamps"] = iso_timestamps(lo + step * np.arange(bins, dtype=np.int64))
+        return result
+
+    def align_timeseries(self, tags, start=None, end=None, max_points=500, workers=8):
+        """
+        Parte numérica de get_timeseries_for_tags: (resultado sem os valores,
+        {tag: array float64 na grade}, (início, passo, intervalos, rollup) ou
+        None se não há pontos na janela).
+        """
+        import numpy as np
+        from .timeseries_store import LEVEL_NAMES, get_timeseries_pool, shared_grid, to_epoch_ns
+
+        store = self._timeseries_store()
+        tags = list(dict.fromkeys(tags))
+        pool = get_timeseries_pool(workers)
+
+        def open_series(tag):
+            try:
+                return store.series(tag), None
+            except Exception as e:
+                return None, str(e)
+
+        loaded = dict(zip(tags, pool.map(open_series, tags)))
+        errors = {tag: err for tag, (_, err) in loaded.items() if err}
+        found = {tag: series for tag, (series, _) in loaded.items() if series is not None}
+        missing = [tag for tag in tags if tag not in found and tag not in errors]
+        result = {"tags": tags, "timestamps": [], "step_seconds": None, "resolution": None,
+                  "series": {tag: None for tag in tags}, "missing": missing, "errors": errors}
+
+        nonempty = [series for series in found.values() if len(series)]
+        lo = to_epoch_ns(start) if start else min((int(s.ts[0]) for s in nonempty), default=None)
+        hi = to_epoch_ns(end) if end else max((int(s.ts[-1]) for s in nonempty), default=None)
+        if lo is None or hi is None or hi < lo:
+            return result, {tag: np.empty(0) for tag in found}, None
+
+        grid = shared_grid(lo, hi, max(int(max_points), 1))
+        lo, step, bins, seconds = grid
+        binned = pool.map(lambda series: series.binned(lo, step, bins, seconds), found.values())
+        result.update(step_seconds=step / 1e9, resolution=LEVEL_NAMES[seconds] if seconds else "raw")
+        return result, dict(zip(found, binned)), grid
+
+    def follow_timeseries(self, tags, heartbeat=15.0, interval=1.0):
+        """Eventos das linhas acrescentadas aos CSVs das `tags` (ver timeseries_stream.follow)."""
+        from .timeseries_stream import follow as follow_timeseries
+        return follow_timeseries(self._timeseries_store(), tags, heartbeat=heartbeat, interval=interval)
+
+    def follow_timeseries_async(self, tags, run, heartbeat=15.0, interval=1.0):
+        """Gerador assíncrono dos mesmos eventos, para views ASGI (ver timeseries_stream.follow_async)."""
+        from .timeseries_stream import follow_async as follow_timeseries_async
+        return follow_timeseries_async(self._timeseries_store(), tags, run, heartbeat=heartbeat, interval=interval)
@@ -0,0 +1,279 @@
+# core/services/ontology_session.py
+"""
+Ontologia servida pelo processo, com muitos leitores e um único escritor.
+
+As views não guardam mais a ontologia em variáveis globais do módulo: a
+ontologia atual é um `Snapshot` (ontologia, caminho, geração, versão)
+publicado pela sessão com uma troca atômica de referência. Cada requisição
+fixa o snapshot no início (`current()`/`read()`) e usa só ele, então um
+upload ou recarga que publique outra ontologia no meio do caminho não troca
+o objeto sob uma leitura em andamento: a leitura termina na ontologia antiga
+e a próxima requisição já vê a nova. O mundo substituído é fechado (e sua
+cópia de trabalho removida, ver ontology_store.release) `release_grace` s
+depois da troca, ou mais tarde se algum `read()` ainda o tiver fixado.
+
+Escritas (edições, upload, carga sob demanda, troca para o snapshot
+inferido) passam por `write()`, que serializa os escritores num RLock e
+publica um novo snapshot ao sair. Leitores nunca esperam por esse lock.
+
+Cada snapshot publicado de um mundo do quadstore leva uma `ReadView`
+(ontology_store.py): conexão só de leitura fixada, numa transação de leitura
+do WAL, no conteúdo confirmado quando o snapshot foi publicado. As edições
+do journal são confirmadas na conexão do mundo, que só o escritor usa
+diretamente para ler o que acabou de editar; leituras que percorrem a
+ontologia (listagens, exportação, SPARQL) usam `isolated()` /
+`read_isolated(fn)` e recebem a ontologia dessa vista: um conteúdo imutável
+daquela versão, sem repetição e sem espera, por mais que a leitura demore e
+quantas edições forem publicadas enquanto isso. A vista é fechada quando
+outra versão já foi publicada e o último leitor sai.
+
+Os índices derivados (graph_index, class_hierarchy, entity_index) continuam
+sobre o mundo do escritor: são imutáveis por versão (copy-on-write ou
+remontados) e, enquanto uma mutação está em andamento (`editing`), as
+consultas usam a versão anterior.
+
+Sem quadstore (ONTOLOGY_STORE_SETTINGS['ENABLED'] = False, mundo em
+memória) não há conexão separada para ler: `isolated()` entrega o mundo
+publicado segurando o lock de escrita durante a leitura.
+
+`stamp(onto, path)`, se definido, rotula cada snapshot publicado (as views
+usam a versão do cache de resultados), para que o rótulo e o conteúdo da
+vista correspondam sempre à mesma versão.
+
+O prazo das consultas SPARQL interrompe a conexão SQLite do mundo consultado
+(ver sparql_engine.py); `hold_edits` evita que uma interrupção atinja uma
+mutação quando esse mundo é o do escritor.
+"""
+import contextlib
+import logging
+import threading
+import time
+import weakref
+
+from .ontology_store import RELEASE_GRACE, ReadView, release_later, store_info
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Ontologia publicada pela sessão; não é alterado depois de publicado."""
+
+    __slots__ = ("onto", "path", "generation", "version", "stamp", "view", "published_at")
+
+    def __init__(self, onto, path, generation, version, stamp=None, view=None):
+        self.onto = onto
+        self.path = path
+        self.generation = generation   # muda quando outra ontologia é publicada
+        self.version = version         # muda a cada escrita publicada
+        self.stamp = stamp             # rótulo de versão calculado na publicação (ver `stamp`)
+        self.view = view               # ReadView do conteúdo publicado (None sem quadstore)
+        self.published_at = time.time()
+
+    def __iter__(self):
+        # onto, onto_path = session.current()
+        return iter((self.onto, self.path))
+
+    def __repr__(self):
+        return f"<Snapshot gen={self.generation} v={self.version} path={self.path!r}>"
+
+
+class OntologySession:
+    """Publicação atômica de snapshots e exclusão mútua entre escritores."""
+
+    def __init__(self, release_grace=RELEASE_GRACE, stamp=None):
+        self._current = Snapshot(None, "", 0, 0)
+        self._write_lock = threading.RLock()
+        self._depth = 0
+        self._counters_lock = threading.Lock()
+        self._readers = 0
+        self._pinned = {}              # mundo -> read() em andamento sobre ele
+        self._isolated = 0
+        self.release_grace = release_grace
+        self.stamp = stamp
+
+    # ---------- leitura ----------
+    def current(self):
+        """Snapshot publicado agora (uma leitura de referência, sem lock)."""
+        return self._current
+
+    @contextlib.contextmanager
+    def read(self):
+        """Fixa o snapshot atual durante o bloco."""
+        snap = self._current
+        world = snap.onto.world if snap.onto is not None else None
+        with self._counters_lock:
+            self._readers += 1
+            self._pinned[world] = self._pinned.get(world, 0) + 1
+        try:
+            yield snap
+        finally:
+            with self._counters_lock:
+                self._readers -= 1
+                if self._pinned[world] > 1:
+                    self._pinned[world] -= 1
+                else:
+                    del self._pinned[world]
+
+    @contextlib.contextmanager
+    def isolated(self):
+        """
+        Snapshot atual com a ontologia da sua ReadView: o conteúdo publicado,
+        imutável durante o bloco mesmo que outras versões sejam publicadas.
+        Sem quadstore, segura o lock de escrita durante o bloco.
+        """
+        while True:
+            with self.read() as snap:
+                view = snap.view
+                if view is None:
+                    with self._write_lock:
+                        yield self._current
+                    return
+                if not view.acquire():
+                    if self._current is snap:
+                        raise RuntimeError("A leitura isolada da ontologia publicada foi fechada")
+                    continue  # aposentada e fechada entre a leitura do snapshot e o acquire
+                try:
+                    with self._counters_lock:
+                        self._isolated += 1
+                    yield Snapshot(view.ontology(), snap.path, snap.generation, snap.version, snap.stamp, view)
+                    return
+                finally:
+                    view.release()
+
+    def read_isolated(self, fn):
+        """`fn(snapshot)` sobre a ontologia isolada do snapshot atual (ver `isolated`)."""
+        with self.isolated() as snap:
+            return fn(snap)
+
+    # ---------- escrita ----------
+    @contextlib.contextmanager
+    def write(self, publish=True):
+        """
+        Seção de escrita: um escritor por vez (reentrante). Ao sair do bloco
+        mais externo publica uma nova versão do snapshot atual.
+        """
+        with self._write_lock:
+            self._depth += 1
+            try:
+                yield self._current
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and publish:
+                    snap = self._current
+                    self._publish(snap.onto, snap.path, snap.generation, snap.version + 1)
+
+    def replace(self, onto, path):
+        """Publica outra ontologia (nova geração); leituras em andamento continuam na anterior."""
+        with self._write_lock:
+            old = self._current
+            self._publish(onto, path, old.generation + 1, old.version + 1)
+            logger.info("[OntologySession] geração %d publicada (%s)", self._current.generation, path)
+            if old.onto is not None and (onto is None or onto.world is not old.onto.world):
+                release_later(old.onto, self.release_grace, self._in_use)
+            return self._current
+
+    def _publish(self, onto, path, generation, version):
+        """Troca o snapshot atual (com o lock de escrita): confirma as edições e fixa a nova ReadView."""
+        view = stamp = None
+        if onto is not None:
+            if self.stamp is not None:
+                stamp = self.stamp(onto, path)
+            if store_info(onto) is not None:
+                onto.world.graph.commit()
+                view = ReadView(onto)
+        old, self._current = self._current, Snapshot(onto, path, generation, version, stamp, view)
+        if old.view is not None:
+            old.view.retire()
+
+    def _in_use(self, onto):
+        """O mundo de `onto` voltou a ser o publicado ou ainda está fixado por um read()."""
+        current = self._current.onto
+        if current is not None and current.world is onto.world:
+            return True
+        with self._counters_lock:
+            return onto.world in self._pinned
+
+    def try_replace(self, swap):
+        """
+        `swap(snapshot)` devolve a ontologia que deve substituir a atual (ou a
+        mesma). Usado por leitores para trocas oportunistas (snapshot inferido):
+        se há um escritor ativo, não espera e devolve o snapshot atual.
+        """
+        if not self._write_lock.acquire(blocking=False):
+            return self._current
+        try:
+            snap = self._current
+            onto = swap(snap)
+            if onto is not snap.onto:
+                return self.replace(onto, snap.path)
+            return snap
+        finally:
+            self._write_lock.release()
+
+    def stats(self):
+        snap = self._current
+        with self._counters_lock:
+            return {"generation": snap.generation, "version": snap.version, "path": snap.path,
+                    "loaded": snap.onto is not None, "active_readers": self._readers,
+                    "writing": self._depth > 0, "isolated_reads": self._isolated,
+                    "read_view": snap.view is not None}
+
+
+# ---------- coordenação por mundo ----------
+_worlds = threading.Condition()
+_editing = weakref.WeakKeyDictionary()   # mundo -> mutações do journal em andamento
+_held = weakref.WeakKeyDictionary()      # mundo -> hold_edits() ainda não liberados
+
+
+@contextlib.contextmanager
+def editing(world):
+    """Mutação do journal em `world` (ver ChangeJournal.mutation); espera os hold_edits()."""
+    with _worlds:
+        while _held.get(world):
+            _worlds.wait()
+        _editing[world] = _editing.get(world, 0) + 1
+    try:
+        yield
+    finally:
+        with _worlds:
+            if _editing[world] > 1:
+                _editing[world] -= 1
+            else:
+                del _editing[world]
+
+
+def is_editing(world):
+    return bool(_editing.get(world))
+
+
+def hold_edits(world):
+    """
+    Impede novas mutações em `world` até `release_edits(world)`; False (e
+    nada muda) se uma mutação já está em andamento.
+    """
+    with _worlds:
+        if _editing.get(world):
+            return False
+        _held[world] = _held.get(world, 0) + 1
+        return True
+
+
+def release_edits(world):
+    with _worlds:
+        if _held[world] > 1:
+            _held[world] -= 1
+        else:
+            del _held[world]
+            _worlds.notify_all()
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_ontology_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = OntologySession()
+        return _session
@@ -0,0 +1,478 @@
+# core/services/ontology_store.py
+"""
+Quadstore persistente do Owlready2.
+
+Cada arquivo RDF/XML é compilado UMA vez para um quadstore SQLite em disco,
+identificado pelo SHA-256 do conteúdo do arquivo. Processos seguintes apenas
+reabrem esse quadstore (milissegundos) em vez de refazer o parse do XML.
+O RDF/XML fica restrito a importação (compilação) e exportação.
+
+O quadstore compilado é imutável: cada processo trabalha sobre uma cópia
+própria (diretório "work/"), de modo que edições feitas em memória não
+alteram o artefato associado ao hash. As edições ficam no journal do
+snapshot (ver change_journal.py), reaplicado sempre que ele é aberto.
+
+A cópia de trabalho fica em modo WAL, sem fsync nos commits (synchronous =
+NORMAL: ela é descartável, a durabilidade é do journal). Assim uma
+`ReadView` (conexão só de leitura numa transação de leitura aberta) enxerga
+o conteúdo confirmado no instante em que foi criada, enquanto o escritor
+continua confirmando edições na conexão do mundo (ver ontology_session.py).
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import weakref
+from pathlib import Path
+
+from owlready2 import World, get_ontology
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 (hex) do conteúdo de um arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def axiom_digest(db):
+    """
+    SHA-256 do conjunto de triplas asseridas de um quadstore (conexão SQLite).
+
+    Independe da ordem das triplas no arquivo e da numeração interna dos
+    nós em branco: cada nó em branco é rotulado pelo hash das suas arestas
+    de saída (restrições, listas e afins do OWL formam árvores).
+    """
+    iris = dict(db.execute("SELECT storid, iri FROM resources"))
+    objs = db.execute("SELECT s, p, o FROM objs").fetchall()
+    datas = db.execute("SELECT s, p, o, d FROM datas").fetchall()
+
+    def literal(o, d):
+        dt = d if isinstance(d, str) else iris.get(d, d)
+        return f"{o!r}^^{dt}"
+
+    edges = {}
+    for s, p, o in objs:
+        if s < 0:
+            edges.setdefault(s, []).append((p, o, None, True))
+    for s, p, o, d in datas:
+        if s < 0:
+            edges.setdefault(s, []).append((p, o, d, False))
+
+    labels = {}
+
+    def term(x):
+        if x < 0:
+            return labels.get(x) or "_:cycle"
+        return iris.get(x, str(x))
+
+    # rótulos dos nós em branco em pós-ordem (pilha explícita: listas RDF podem ser longas)
+    for root in edges:
+        stack = [(root, False)]
+        while stack:
+            b, expanded = stack.pop()
+            if not expanded:
+                if b in labels:
+                    continue
+                labels[b] = None
+                stack.append((b, True))
+                for _, o, _, is_obj in edges.get(b, ()):
+                    if is_obj and o < 0 and o not in labels:
+                        stack.append((o, False))
+            else:
+                parts = sorted(
+                    f"{iris.get(p, p)} {term(o) if is_obj else literal(o, d)}"
+                    for p, o, d, is_obj in edges.get(b, ())
+                )
+                labels[b] = "_:" + hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+    lines = [f"{term(s)} {iris.get(p, p)} {term(o)}" for s, p, o in objs]
+    lines += [f"{term(s)} {iris.get(p, p)} {literal(o, d)}" for s, p, o, d in datas]
+    lines.sort()
+    h = hashlib.sha256()
+    for line in lines:
+        h.update(line.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+# s até fechar um mundo substituído por outro (ver release_later)
+RELEASE_GRACE = 120
+
+# world -> {"digest", "meta", "work_path", "store"} dos mundos abertos por este processo
+_OPENED = weakref.WeakKeyDictionary()
+_WORK_FILES = set()
+_lock = threading.Lock()
+_closed_hooks = []   # callback(world) chamados quando um mundo (ou ReadView) é fechado
+
+
+class OntologyStore:
+    """
+    Diretório de quadstores compilados:
+        <dir>/<sha256>.sqlite3   quadstore compilado (somente leitura)
+        <dir>/<sha256>.json      metadados (base_iri, arquivo de origem, ...)
+        <dir>/work/              cópias de trabalho por processo
+        <dir>/journal/<sha256>.jsonl  edições ainda não compactadas no RDF/XML
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = os.path.abspath(str(store_dir))
+        self.work_dir = os.path.join(self.store_dir, "work")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._compile_lock = threading.Lock()
+        self._cleanup_stale_work_files()
+
+    # ---------- caminhos ----------
+    def compiled_path(self, digest):
+        return os.path.join(self.store_dir, f"{digest}.sqlite3")
+
+    def meta_path(self, digest):
+        return os.path.join(self.store_dir, f"{digest}.json")
+
+    def journal_path(self, digest):
+        return os.path.join(self.store_dir, "journal", f"{digest}.jsonl")
+
+    def read_meta(self, digest):
+        return self.read_json(self.meta_path(digest))
+
+    def axiom_digest(self, digest):
+        """Hash das triplas asseridas do quadstore `digest` (calculado e gravado nos metadados se faltar)."""
+        meta = self.read_meta(digest) or {}
+        if not meta.get("axiom_digest"):
+            db = sqlite3.connect(f"file:{self.compiled_path(digest)}?mode=ro", uri=True)
+            try:
+                meta["axiom_digest"] = axiom_digest(db)
+            finally:
+                db.close()
+            self._write_json(self.meta_path(digest), meta)
+        return meta["axiom_digest"]
+
+    def is_compiled(self, digest):
+        return self.read_meta(digest) is not None and os.path.exists(self.compiled_path(digest))
+
+    # ---------- compilação ----------
+    def compile(self, owl_path, digest=None):
+        """
+        Faz o parse do RDF/XML para um quadstore SQLite (se ainda não existir)
+        e retorna os metadados. A escrita é atômica (arquivo temporário + rename),
+        então processos concorrentes nunca enxergam um quadstore pela metade.
+        """
+        digest = digest or file_sha256(owl_path)
+        with self._compile_lock:
+            if self.is_compiled(digest):
+                return self.read_meta(digest)
+
+            started = time.perf_counter()
+            tmp = os.path.join(self.store_dir, f"{digest}.{os.getpid()}.tmp")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+            world = World(filename=tmp)
+            try:
+                try:
+                    onto = world.get_ontology(Path(owl_path).resolve().as_uri()).load()
+                    world.save()
+                    meta = {
+                        "digest": digest,
+                        "axiom_digest": axiom_digest(world.graph.db),
+                        "base_iri": onto.base_iri,
+                        "source": os.path.abspath(owl_path),
+                        "compiled_at": time.time(),
+                    }
+                finally:
+                    world.close()
+            except BaseException:
+                # parse falhou (RDF/XML inválido): não deixa o quadstore pela metade no diretório
+                _remove_files(tmp, f"{tmp}-journal")
+                raise
+
+            os.replace(tmp, self.compiled_path(digest))
+            self._write_json(self.meta_path(digest), meta)
+            logger.info("[OntologyStore] %s compilado em %.2fs (%s)",
+                        owl_path, time.perf_counter() - started, digest[:12])
+            return meta
+
+    # ---------- abertura ----------
+    def open(self, owl_path):
+        """Abre a ontologia de `owl_path` a partir do quadstore, compilando se necessário."""
+        digest = file_sha256(owl_path)
+        meta = self.compile(owl_path, digest)
+        return self.open_compiled(self.compiled_path(digest), meta)
+
+    def open_compiled(self, compiled_path, meta, **extra):
+        """
+        Abre uma cópia de trabalho de um quadstore compilado e devolve a ontologia principal.
+        `extra` é guardado junto das informações do mundo (ver store_info()).
+        """
+        work_path = os.path.join(
+            self.work_dir, f"{meta['digest']}-{os.getpid()}-{time.monotonic_ns()}.sqlite3"
+        )
+        shutil.copyfile(compiled_path, work_path)
+        with _lock:
+            _WORK_FILES.add(work_path)
+
+        world = World(filename=work_path, exclusive=False, journal_mode="WAL")
+        # reaplica as edições ainda não compactadas antes de materializar as entidades
+        from .change_journal import replay_journal
+        replayed = replay_journal(world, self.journal_path(meta["digest"]))
+        onto = world.get_ontology(meta["base_iri"]).load()
+        world.graph.commit()
+        world.graph.db.execute("PRAGMA synchronous = NORMAL")
+        with _lock:
+            _OPENED[world] = dict(extra, digest=meta["digest"], meta=meta, compiled_path=compiled_path,
+                                  work_path=work_path, store=self, replayed=replayed,
+                                  changes_at_open=world.graph.db.total_changes)
+        return onto
+
+    def register_view(self, view, digest, meta):
+        """
+        Publica o conteúdo fixado por `view` (ReadView de um mundo aberto por
+        este store) como o quadstore compilado de `digest`, sem refazer o parse
+        do RDF/XML correspondente.
+        """
+        tmp = os.path.join(self.store_dir, f"{digest}.{os.getpid()}.tmp")
+        view.copy(tmp)
+        os.replace(tmp, self.compiled_path(digest))
+        self._write_json(self.meta_path(digest), meta)
+
+    # ---------- utilitários ----------
+    @staticmethod
+    def read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def _cleanup_stale_work_files(self):
+        """Remove cópias de trabalho deixadas por processos que já terminaram (apenas POSIX)."""
+        if os.name != "posix":
+            return
+        for name in os.listdir(self.work_dir):
+            try:
+                pid = int(name.split("-")[1])
+            except (IndexError, ValueError):
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                try:
+                    os.remove(os.path.join(self.work_dir, name))
+                except OSError:
+                    pass
+            except PermissionError:
+                pass
+
+
+class ReadView:
+    """
+    Estado confirmado de um mundo aberto pelo store, fixado no instante da
+    criação: conexão só de leitura à cópia de trabalho numa transação de
+    leitura do WAL. As edições confirmadas depois não aparecem nela. O mundo
+    Owlready2 sobre essa conexão (`ontology()`) só é montado no primeiro uso.
+
+    Quem lê chama `acquire()`/`release()`; depois de `retire()` (outra versão
+    foi publicada) a conexão é fechada quando o último leitor sair.
+    """
+
+    def __init__(self, onto):
+        info = store_info(onto)
+        self.path = info["work_path"]
+        self.base_iri = onto.base_iri
+        self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("BEGIN")
+        self._db.execute("SELECT COUNT(*) FROM ontologies").fetchone()  # a leitura fixa o snapshot do WAL
+        self._onto = None
+        self._readers = 0
+        self._retired = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Registra um leitor; False se a vista já foi fechada."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._readers -= 1
+            close = self._retired and self._readers == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            close = self._readers == 0
+        if close:
+            self.close()
+
+    def ontology(self):
+        """Ontologia principal num mundo Owlready2 sobre a conexão fixada."""
+        with self._lock:
+            if self._onto is None:
+                world = World(filename=self.path, exclusive=False, read_only=True, connection=self._db)
+                self._onto = world.get_ontology(self.base_iri)
+            return self._onto
+
+    def copy(self, path):
+        """Copia o conteúdo fixado para `path`, um quadstore num único arquivo (como copy_world)."""
+        target = sqlite3.connect(path)
+        try:
+            self._db.backup(target)
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            onto, self._onto = self._onto, None
+        if onto is not None:
+            _world_closed(onto.world)
+            onto.world.close()
+        else:
+            self._db.close()
+
+
+def copy_world(world, path):
+    """
+    Copia o conteúdo confirmado de `world` (cópia de trabalho em WAL) para
+    `path`, um quadstore num único arquivo, sem -wal.
+    """
+    world.graph.commit()
+    target = sqlite3.connect(path)
+    try:
+        world.graph.db.backup(target)
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+
+
+def on_world_closed(callback):
+    """Registra `callback(world)`, chamado quando um mundo ou ReadView é fechado (ex.: limpar caches por mundo)."""
+    _closed_hooks.append(callback)
+
+
+def _world_closed(world):
+    for callback in list(_closed_hooks):
+        try:
+            callback(world)
+        except Exception as e:
+            logger.warning("[OntologyStore] callback de fechamento falhou: %s", e)
+
+
+def _remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_stores = {}
+
+
+def get_store(store_dir):
+    """Instância compartilhada de OntologyStore por diretório."""
+    key = os.path.abspath(str(store_dir))
+    with _lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = OntologyStore(key)
+        return store
+
+
+def load_ontology(owl_path, store_dir=None):
+    """
+    Carrega uma ontologia. Com `store_dir`, usa o quadstore persistente;
+    sem ele, mantém o comportamento antigo (parse direto do RDF/XML no default_world).
+    """
+    if not store_dir:
+        return get_ontology(Path(owl_path).resolve().as_uri()).load()
+    return get_store(store_dir).open(owl_path)
+
+
+def store_info(onto):
+    """Metadados do quadstore de onde `onto` foi aberta (ou None se veio do RDF/XML)."""
+    if onto is None:
+        return None
+    with _lock:
+        return _OPENED.get(onto.world)
+
+
+def ontology_digest(onto):
+    info = store_info(onto)
+    return info["digest"] if info else None
+
+
+def release(onto):
+    """Fecha o mundo de `onto` e remove sua cópia de trabalho."""
+    info = store_info(onto)
+    if not info:
+        return
+    with _lock:
+        _OPENED.pop(onto.world, None)
+        _WORK_FILES.discard(info["work_path"])
+    journal = info.get("journal")
+    if journal is not None:
+        # as edições já estão no arquivo do journal; só cancela a compactação agendada
+        journal.close(compact=False)
+    _world_closed(onto.world)
+    try:
+        onto.world.close()
+    finally:
+        work_path = info["work_path"]
+        _remove_files(work_path, f"{work_path}-journal", f"{work_path}-wal", f"{work_path}-shm")
+    logger.info("[OntologyStore] mundo %s liberado", os.path.basename(info["work_path"]))
+
+
+def release_later(onto, delay=RELEASE_GRACE, in_use=None):
+    """
+    Libera `onto` depois de `delay` s: leituras em andamento ainda podem
+    estar usando a ontologia substituída. Se `in_use(onto)` ainda for
+    verdadeiro nesse momento, adia por mais `delay` s.
+    """
+    def attempt():
+        if in_use is not None and in_use(onto):
+            release_later(onto, delay, in_use)
+        else:
+            release(onto)
+
+    timer = threading.Timer(delay, attempt)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+@atexit.register
+def _remove_work_files():
+    for world, info in list(_OPENED.items()):
+        try:
+            world.close()
+        except Exception:
+            pass
+    for path in list(_WORK_FILES):
+        _remove_files(path, f"{path}-wal", f"{path}-shm")
@@ -0,0 +1,329 @@
+# core/services/prefork.py
+"""
+Modo pre-fork: gunicorn com preload_app (ver gunicorn.conf.py).
+
+Sem ele, cada worker carrega a ontologia em OntologyConfig.ready e na
+primeira consulta (_ensure_predefined_ontology), monta os próprios índices e
+agenda o próprio reasoning: memória e aquecimento multiplicados pelo número
+de workers.
+
+No modo pre-fork o processo mestre faz isso uma vez, antes do fork:
+- abre as ontologias pelo quadstore e, se configurado, espera o reasoning
+  (um job do reasoning_jobs; o resultado fica no cache em disco) e troca
+  para o snapshot inferido;
+- monta graph_index, class_hierarchy e entity_index (`preload`);
+- fecha as conexões SQLite e o pool de reasoning, que não atravessam um fork,
+  e congela o heap com gc.freeze (`detach`), para que os objetos já criados
+  fiquem em páginas compartilhadas copy-on-write entre os workers.
+
+Depois do fork cada worker reabre os mesmos quadstores (`attach`: cópia de
+trabalho própria, o arquivo compilado é lido do page cache do SO) e adota os
+índices do mestre em vez de remontá-los, desde que o conteúdo seja o mesmo
+(mesmos storids). Nenhum worker roda o HermiT nem refaz o parse do RDF/XML.
+
+Escritas: um único worker é o escritor (flock em <store>/prefork/owner.lock).
+As views de escrita (@_writes) recebidas por outro worker são executadas no
+escritor, encaminhadas por um socket unix autenticado
+(<store>/prefork/owner.sock). Depois de cada escrita o escritor grava
+<store>/prefork/version; os outros workers comparam esse arquivo (um stat) no
+início de cada requisição e, se mudou, reabrem a ontologia (o journal
+reaplica as edições) e a publicam na sessão. Se o escritor morre, o lock é
+liberado e o próximo worker que receber uma escrita assume.
+"""
+import gc
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener, answer_challenge, deliver_challenge
+
+from django.http import HttpResponse
+
+from .class_hierarchy import adopt as adopt_hierarchy, get_class_hierarchy
+from .entity_index import adopt as adopt_entities, get_entity_index
+from .graph_index import adopt as adopt_graph, get_graph_index
+from .ontology_session import get_ontology_session
+from .ontology_store import OntologyStore, get_store, load_ontology, release, store_info
+from .reasoning_jobs import get_jobs, shutdown_jobs, swap_to_inferred
+
+logger = logging.getLogger(__name__)
+
+# chave do environ das requisições encaminhadas ao escritor (não vem de cabeçalho HTTP)
+FORWARDED = "ontology.prefork.forwarded"
+
+
+def _signature(world):
+    """Maior storid e número de triplas: mundos abertos do mesmo conteúdo têm os mesmos storids."""
+    db = world.graph.db
+    return (db.execute("SELECT MAX(storid) FROM resources").fetchone()[0],
+            db.execute("SELECT COUNT(*) FROM objs").fetchone()[0],
+            db.execute("SELECT COUNT(*) FROM datas").fetchone()[0])
+
+
+class _Preloaded:
+    """Ontologia preparada no mestre e como reabri-la no worker."""
+
+    def __init__(self, onto, attach, tables):
+        self.onto = onto
+        self.attach = attach      # attach(nova_onto): publica a ontologia reaberta no worker
+        self.tables = tables      # (GraphIndex, ClassHierarchy, EntityIndex)
+        self.spec = None          # (store, quadstore, meta, extra), preenchido em detach()
+        self.signature = None
+
+
+class Prefork:
+    """Estado do modo pre-fork neste processo (mestre antes do fork, worker depois)."""
+
+    def __init__(self, store_dir, authkey, release_grace=120):
+        self.store_dir = store_dir
+        self.dir = os.path.join(get_store(store_dir).store_dir, "prefork")
+        os.makedirs(self.dir, exist_ok=True)
+        self.lock_path = os.path.join(self.dir, "owner.lock")
+        self.socket_path = os.path.join(self.dir, "owner.sock")
+        self.version_path = os.path.join(self.dir, "version")
+        self.authkey = authkey
+        self.release_grace = release_grace
+        get_ontology_session().release_grace = release_grace
+        self._preloaded = []
+        self._detached = False
+        self._base_version = None
+        self._seen = (None, None)          # (stat do arquivo de versão, versão aplicada)
+        self._sync_lock = threading.Lock()
+        self._owner_lock = threading.Lock()
+        self._owner_fd = None
+        self._handler = None
+
+    # ---------- mestre ----------
+    def preload(self, onto, attach, jobs=None, timeout=None):
+        """
+        Prepara `onto` (aberta pelo quadstore) para os workers: com `jobs`,
+        espera o reasoning e troca para o snapshot inferido; depois monta os
+        índices. Devolve a ontologia que o mestre deve publicar; no worker,
+        `attach` recebe a mesma ontologia reaberta.
+        """
+        if store_info(onto) is None:
+            raise ValueError("O modo pre-fork requer a ontologia aberta pelo quadstore (ONTOLOGY_STORE_SETTINGS).")
+        if jobs is not None:
+            onto = self._reason(onto, jobs, timeout)
+        started = time.perf_counter()
+        tables = (get_graph_index(onto), get_class_hierarchy(onto), get_entity_index(onto))
+        self._preloaded.append(_Preloaded(onto, attach, tables))
+        logger.info("[Prefork] índices de %s montados no mestre em %.2fs",
+                    store_info(onto)["digest"][:12], time.perf_counter() - started)
+        return onto
+
+    def _reason(self, onto, jobs, timeout):
+        key = jobs.key_for(onto)
+        status = jobs.submit(onto)
+        if not jobs.is_ready(key):
+            logger.info("[Prefork] esperando o reasoning de %s antes do fork", store_info(onto)["digest"][:12])
+            status = jobs.wait(key, timeout)
+        new = swap_to_inferred(onto, jobs)
+        if new is onto:
+            logger.warning("[Prefork] reasoning indisponível (%s); os workers servem a versão asserida",
+                           status.get("error") or status.get("status"))
+            return onto
+        release(onto)
+        return new
+
+    def detach(self):
+        """Antes do fork (idempotente): fecha conexões SQLite e pools e congela o heap."""
+        if self._detached:
+            return
+        for item in self._preloaded:
+            info = store_info(item.onto)
+            source = info["compiled_path"]
+            if info.get("inferred"):
+                source = get_jobs(self.store_dir).inferred_path(info["reasoner_key"])
+            extra = {k: info[k] for k in ("inferred", "reasoner_key") if k in info}
+            item.spec = (info["store"], source, info["meta"], extra)
+            item.signature = _signature(item.onto.world)
+            release(item.onto)
+        view = get_ontology_session().current().view
+        if view is not None:
+            view.close()  # a sessão do worker publica a ontologia reaberta (e uma ReadView nova) no attach
+        shutdown_jobs()
+        self._base_version = (OntologyStore.read_json(self.version_path) or {}).get("version")
+        gc.collect()
+        gc.freeze()
+        self._detached = True
+        logger.info("[Prefork] mestre pronto para o fork (%d ontologia(s))", len(self._preloaded))
+
+    # ---------- worker ----------
+    def attach(self):
+        """No worker, logo depois do fork: reabre as ontologias e adota os índices do mestre."""
+        for item in self._preloaded:
+            if item.spec is None:
+                continue
+            started = time.perf_counter()
+            store, source, meta, extra = item.spec
+            onto = store.open_compiled(source, meta, **extra)
+            adopted = _signature(onto.world) == item.signature
+            if adopted:
+                graph, hierarchy, entities = item.tables
+                adopt_graph(onto.world, graph)
+                adopt_hierarchy(onto.world, hierarchy)
+                adopt_entities(onto.world, entities)
+            item.attach(onto)
+            item.onto = None
+            logger.info("[Prefork] worker %d: %s reaberta em %.3fs (%s)", os.getpid(), meta["digest"][:12],
+                        time.perf_counter() - started,
+                        "índices do mestre" if adopted else "conteúdo mudou, índices remontados sob demanda")
+        # versões publicadas depois do fork (worker recriado pelo gunicorn) são aplicadas no próximo sync()
+        self._seen = (None, self._base_version)
+        self.is_owner()
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.version_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def sync(self):
+        """Início de cada requisição: reabre a ontologia se o escritor publicou outra versão."""
+        if self._owner_fd is not None:
+            return
+        stamp = self._stamp()
+        if stamp is None or stamp == self._seen[0]:
+            return
+        with self._sync_lock:
+            if stamp == self._seen[0]:
+                return
+            data = OntologyStore.read_json(self.version_path) or {}
+            if data.get("version") != self._seen[1]:
+                self._reattach(data)
+            self._seen = (stamp, data.get("version"))
+
+    def _reattach(self, data):
+        session = get_ontology_session()
+        old = session.current()
+        path = data.get("path") or old.path
+        if not path:
+            return
+        started = time.perf_counter()
+        session.replace(load_ontology(path, store_dir=self.store_dir), path)
+        logger.info("[Prefork] worker %d: versão %s do escritor aplicada em %.3fs", os.getpid(),
+                    data.get("version"), time.perf_counter() - started)
+        # o mundo antigo é fechado pela sessão depois de release_grace s (leituras em andamento)
+
+    # ---------- escritor ----------
+    def is_owner(self):
+        """True se este worker é o escritor; assume o papel se o lock estiver livre."""
+        if self._owner_fd is not None:
+            return True
+        import fcntl
+        with self._owner_lock:
+            if self._owner_fd is not None:
+                return True
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self.sync()  # o escritor anterior pode ter publicado versões que este worker não aplicou
+            self._listen()
+            self._owner_fd = fd
+            logger.info("[Prefork] worker %d é o escritor da ontologia", os.getpid())
+            return True
+
+    def publish(self):
+        """Escritor, depois de cada escrita: grava a nova versão para os outros workers."""
+        snap = get_ontology_session().current()
+        with self._sync_lock:
+            data = OntologyStore.read_json(self.version_path) or {}
+            version = int(data.get("version") or 0) + 1
+            tmp = f"{self.version_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": version, "path": snap.path, "pid": os.getpid(), "at": time.time()}, f)
+            os.replace(tmp, self.version_path)
+            self._seen = (self._stamp(), version)
+
+    def _listen(self):
+        try:
+            os.remove(self.socket_path)  # deixado por um escritor que morreu
+        except FileNotFoundError:
+            pass
+        listener = Listener(self.socket_path, family="AF_UNIX")
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self._serve, args=(listener,), name="prefork-owner", daemon=True).start()
+
+    def _serve(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+            environ, body = conn.recv()
+            conn.send(self._run(environ, body))
+        except (AuthenticationError, EOFError, OSError) as e:
+            logger.warning("[Prefork] requisição encaminhada descartada: %s", e)
+        finally:
+            conn.close()
+
+    def _run(self, environ, body):
+        """Executa a requisição encaminhada pelo handler WSGI do Django deste processo."""
+        if self._handler is None:
+            from django.core.handlers.wsgi import WSGIHandler
+            self._handler = WSGIHandler()
+        environ = dict(environ, **{
+            "wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr, "wsgi.version": (1, 0),
+            "wsgi.multithread": True, "wsgi.multiprocess": True, "wsgi.run_once": False,
+            "CONTENT_LENGTH": str(len(body)), FORWARDED: True,
+        })
+        reply = {}
+
+        def start_response(status, headers, exc_info=None):
+            reply["status"], reply["headers"] = status, headers
+
+        result = self._handler(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return reply["status"], reply["headers"], content
+
+    def forward(self, request):
+        """Executa a requisição de escrita no escritor; None se ele não responder."""
+        environ = {k: v for k, v in request.META.items() if isinstance(v, str)}
+        try:
+            body = request.body
+            with Client(self.socket_path, family="AF_UNIX", authkey=self.authkey) as conn:
+                conn.send((environ, body))
+                status, headers, content = conn.recv()
+        except (AuthenticationError, EOFError, OSError) as e:
+            logger.warning("[Prefork] escritor indisponível: %s", e)
+            return None
+        response = HttpResponse(content, status=int(status.split(" ", 1)[0]))
+        for name, value in headers:
+            if name.lower() != "content-length":
+                response[name] = value
+        return response
+
+
+_prefork = None
+
+
+def configure(store_dir, authkey, release_grace=120):
+    """Ativa o modo pre-fork neste processo (OntologyConfig.ready, no mestre)."""
+    global _prefork
+    _prefork = Prefork(store_dir, authkey, release_grace)
+    return _prefork
+
+
+def get_prefork():
+    """Estado do modo pre-fork, ou None fora dele."""
+    return _prefork
@@ -0,0 +1,379 @@
+# core/services/reasoning_jobs.py
+"""
+Reasoning (HermiT) em segundo plano, fora do processo do Django.
+
+O job roda num pool de processos locais (contexto "spawn", para não herdar
+conexões SQLite nem o estado do Django), lê o quadstore compilado da ontologia
+(ver ontology_store.py) e grava o resultado num quadstore "inferido" no mesmo
+diretório compartilhado.
+
+O resultado funciona como cache: a chave é o hash das triplas asseridas
+(axiom_digest) combinado com as opções do reasoner, então reiniciar, subir
+outro worker ou reenviar o mesmo arquivo reaproveita a materialização já
+calculada em vez de iniciar a JVM de novo:
+
+    <store>/reasoned/<chave>.sqlite3   snapshot inferido (gravado com rename atômico)
+    <store>/jobs/<chave>.json          status/progresso do job
+    <store>/jobs/<chave>.lock          evita que dois processos rodem o mesmo job
+
+Os workers continuam servindo a versão apenas asserida e trocam para o
+snapshot inferido assim que ele aparece em disco, sem reiniciar.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .ontology_store import OntologyStore, copy_world, get_store, store_info
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# lock mais velho que isso é considerado abandonado (processo morto no meio do job)
+STALE_LOCK_SECONDS = 6 * 3600
+
+
+def reasoner_cache_key(axiom_digest, infer_property_values=True, infer_data_property_values=False):
+    """Chave do cache de reasoning: triplas asseridas + opções que alteram o resultado."""
+    raw = f"{axiom_digest}|infer_property_values={bool(infer_property_values)}" \
+          f"|infer_data_property_values={bool(infer_data_property_values)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _java_memory_mb(heap_size):
+    """Converte '2g' / '512m' (HERMIT_SETTINGS['java_heap_size']) em MB para o Owlready2."""
+    if not heap_size:
+        return None
+    s = str(heap_size).strip().lower()
+    try:
+        if s.endswith("g"):
+            return int(float(s[:-1]) * 1024)
+        if s.endswith("m"):
+            return int(float(s[:-1]))
+        return int(s)
+    except ValueError:
+        return None
+
+
+def _update_status(status_path, **fields):
+    status = OntologyStore.read_json(status_path) or {}
+    status.update(fields)
+    OntologyStore._write_json(status_path, status)
+    return status
+
+
+def _run_reasoning_job(compiled_path, base_iri, out_path, status_path, lock_path,
+                       infer_property_values=True, infer_data_property_values=False,
+                       java_memory=None):
+    """
+    Executado no processo filho: copia o quadstore asserido, roda o HermiT e
+    publica o snapshot inferido com os.replace (atômico).
+    """
+    import owlready2
+    from owlready2 import World, sync_reasoner
+
+    started = time.time()
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    try:
+        _update_status(status_path, status=STATUS_RUNNING, stage="loading", progress=0.1,
+                       started_at=started, pid=os.getpid())
+        shutil.copyfile(compiled_path, tmp)
+        world = World(filename=tmp)
+        try:
+            world.get_ontology(base_iri).load()
+
+            _update_status(status_path, stage="reasoning", progress=0.3)
+            if java_memory:
+                owlready2.reasoning.JAVA_MEMORY = java_memory
+            try:
+                sync_reasoner(world,
+                              infer_property_values=infer_property_values,
+                              infer_data_property_values=infer_data_property_values)
+            except TypeError:
+                # fallback: algumas versões do owlready2/ HermiT não aceitam infer_data_property_values
+                sync_reasoner(world, infer_property_values=infer_property_values)
+
+            _update_status(status_path, stage="saving", progress=0.9)
+            world.save()
+        finally:
+            world.close()
+
+        os.replace(tmp, out_path)
+        _update_status(status_path, status=STATUS_DONE, stage="done", progress=1.0,
+                       finished_at=time.time(), duration=round(time.time() - started, 3))
+    except Exception as e:
+        _update_status(status_path, status=STATUS_FAILED, stage="failed",
+                       error=f"{type(e).__name__}: {e}", finished_at=time.time())
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+class ReasoningJobs:
+    """Fila de jobs de reasoning de um OntologyStore."""
+
+    def __init__(self, store, max_workers=1, java_memory=None):
+        self.store = store
+        self.max_workers = max_workers
+        self.java_memory = java_memory
+        self.jobs_dir = os.path.join(store.store_dir, "jobs")
+        self.reasoned_dir = os.path.join(store.store_dir, "reasoned")
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        os.makedirs(self.reasoned_dir, exist_ok=True)
+        self._executor = None
+        self._futures = {}
+        self._ready = {}       # chave -> snapshot inferido em disco (True) ou não (False)
+        self._pending = set()  # chaves com job agendado (aqui ou em outro processo) ainda não pronto
+        self._lock = threading.Lock()
+
+    # ---------- caminhos ----------
+    def inferred_path(self, key):
+        return os.path.join(self.reasoned_dir, f"{key}.sqlite3")
+
+    def _status_path(self, key):
+        return os.path.join(self.jobs_dir, f"{key}.json")
+
+    def _lock_path(self, key):
+        return os.path.join(self.jobs_dir, f"{key}.lock")
+
+    def key_for(self, onto, infer_property_values=True, infer_data_property_values=False):
+        """
+        Chave do cache de reasoning para a ontologia `onto` (aberta pelo
+        OntologyStore); calculada uma vez por mundo e guardada em store_info.
+        """
+        info = store_info(onto)
+        if not info:
+            return None
+        options = (bool(infer_property_values), bool(infer_data_property_values))
+        keys = info.setdefault("reasoner_keys", {})
+        key = keys.get(options)
+        if key is None:
+            digest = info["meta"].get("axiom_digest") or self.store.axiom_digest(info["digest"])
+            key = keys[options] = reasoner_cache_key(digest, *options)
+        return key
+
+    # ---------- status ----------
+    def status(self, key):
+        status = OntologyStore.read_json(self._status_path(key))
+        if os.path.exists(self.inferred_path(key)):
+            status = dict(status or {}, status=STATUS_DONE, progress=1.0)
+        return status or {"status": None}
+
+    def is_ready(self, key):
+        """
+        True se o snapshot inferido de `key` está em disco. Chamado a cada
+        leitura (swap_to_inferred): o disco só é consultado na primeira vez e
+        enquanto houver um job pendente para a chave (agendado por este
+        processo ou, se o lock existia na primeira consulta, por outro).
+        """
+        ready = self._ready.get(key)
+        if ready or (ready is False and key not in self._pending):
+            return ready
+        ready = os.path.exists(self.inferred_path(key))
+        with self._lock:
+            if ready:
+                self._pending.discard(key)
+            elif key not in self._ready and os.path.exists(self._lock_path(key)):
+                self._pending.add(key)
+            self._ready[key] = ready
+        return ready
+
+    # ---------- execução ----------
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _claim(self, key):
+        """Cria o lock do job de forma exclusiva (O_EXCL); False se outro processo já o detém."""
+        path = self._lock_path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < STALE_LOCK_SECONDS:
+                        return False
+                    os.remove(path)
+                except OSError:
+                    return False
+        return False
+
+    def submit(self, onto, infer_property_values=True, infer_data_property_values=False):
+        """
+        Agenda o reasoning da ontologia `onto` (aberta pelo OntologyStore).
+        Retorna o status atual; não bloqueia.
+        """
+        info = store_info(onto)
+        if not info:
+            raise ValueError("Ontologia não foi aberta pelo quadstore; reasoning em segundo plano indisponível.")
+        digest = info["digest"]
+        key = self.key_for(onto, infer_property_values, infer_data_property_values)
+        if self.is_ready(key):
+            logger.info("[ReasoningJobs] reaproveitando reasoning em cache para %s", digest[:12])
+            return self.status(key)
+
+        with self._lock:
+            self._pending.add(key)
+            fut = self._futures.get(key)
+            if fut is not None and not fut.done():
+                return self.status(key)
+            if not self._claim(key):
+                return self.status(key)
+
+            status_path = self._status_path(key)
+            _update_status(status_path, key=key, digest=digest, status=STATUS_QUEUED, stage="queued",
+                           progress=0.0, queued_at=time.time(), error=None,
+                           infer_property_values=infer_property_values,
+                           infer_data_property_values=infer_data_property_values)
+            try:
+                fut = self._pool().submit(
+                    _run_reasoning_job,
+                    self.store.compiled_path(digest), info["meta"]["base_iri"],
+                    self.inferred_path(key), status_path, self._lock_path(key),
+                    infer_property_values, infer_data_property_values, self.java_memory,
+                )
+            except Exception:
+                os.remove(self._lock_path(key))
+                raise
+            fut.add_done_callback(lambda f, k=key: self._job_finished(k, f))
+            self._futures[key] = fut
+        logger.info("[ReasoningJobs] job de reasoning agendado para %s", digest[:12])
+        return self.status(key)
+
+    def wait(self, key, timeout=None):
+        """Espera o job `key` agendado por este processo terminar (ou `timeout` s); devolve o status."""
+        with self._lock:
+            fut = self._futures.get(key)
+        if fut is not None:
+            try:
+                fut.result(timeout=timeout)
+            except Exception:
+                pass  # falha já registrada no status por _job_finished
+        return self.status(key)
+
+    def shutdown(self):
+        """Encerra o pool de processos (ele não sobrevive a um fork); é recriado sob demanda."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _job_finished(self, key, fut):
+        exc = fut.exception()
+        if exc is not None:
+            with self._lock:
+                self._pending.discard(key)
+            logger.warning("[ReasoningJobs] reasoning falhou (%s): %s", key[:12], exc)
+        else:
+            logger.info("[ReasoningJobs] snapshot inferido pronto (%s)", key[:12])
+
+    def open_inferred(self, onto, infer_property_values=True, infer_data_property_values=False):
+        """Abre (cópia de trabalho) o snapshot inferido de `onto`, ou None se ainda não existir."""
+        info = store_info(onto)
+        key = self.key_for(onto, infer_property_values, infer_data_property_values)
+        if key is None or not self.is_ready(key):
+            return None
+        return self.store.open_compiled(self.inferred_path(key), info["meta"],
+                                        inferred=True, reasoner_key=key)
+
+    def publish(self, onto, infer_property_values=True, infer_data_property_values=False):
+        """
+        Grava no cache o resultado de um reasoning feito em processo (sync_reasoner
+        sobre a cópia de trabalho de `onto`), para que outros processos o reaproveitem.
+        """
+        info = store_info(onto)
+        key = self.key_for(onto, infer_property_values, infer_data_property_values)
+        if key is None or self.is_ready(key):
+            return key
+        tmp = f"{self.inferred_path(key)}.{os.getpid()}.tmp"
+        copy_world(onto.world, tmp)
+        os.replace(tmp, self.inferred_path(key))
+        with self._lock:
+            self._ready[key] = True
+            self._pending.discard(key)
+        info["inferred"] = True
+        info["reasoner_key"] = key
+        _update_status(self._status_path(key), key=key, digest=info["digest"], status=STATUS_DONE,
+                       stage="done", progress=1.0, finished_at=time.time(),
+                       infer_property_values=infer_property_values,
+                       infer_data_property_values=infer_data_property_values)
+        return key
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def get_jobs(store_dir, max_workers=1, java_memory=None):
+    """Instância compartilhada de ReasoningJobs por diretório de quadstore."""
+    store = get_store(store_dir)
+    with _jobs_lock:
+        jobs = _jobs.get(store.store_dir)
+        if jobs is None:
+            jobs = _jobs[store.store_dir] = ReasoningJobs(store, max_workers, _java_memory_mb(java_memory))
+        return jobs
+
+
+def shutdown_jobs():
+    """Encerra os pools de reasoning deste processo (ver ReasoningJobs.shutdown)."""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    for j in jobs:
+        j.shutdown()
+
+
+def has_local_edits(onto):
+    """True se o conteúdo de `onto` difere do snapshot de onde foi aberta (journal ou edições)."""
+    info = store_info(onto)
+    if not info:
+        return False
+    if info.get("replayed"):
+        return True
+    journal = info.get("journal")
+    if journal is not None:
+        return journal.dirty()
+    return onto.world.graph.db.total_changes != info.get("changes_at_open", 0)
+
+
+def swap_to_inferred(onto, jobs, infer_property_values=True, infer_data_property_values=False):
+    """
+    Se o snapshot inferido de `onto` já está pronto, devolve a ontologia
+    aberta a partir dele; caso contrário devolve `onto` inalterada.
+    Não troca se a cópia asserida já recebeu edições neste processo. Quem
+    troca fecha a asserida depois (OntologySession.replace, release_later).
+    """
+    info = store_info(onto)
+    if not info or info.get("inferred"):
+        return onto
+    key = jobs.key_for(onto, infer_property_values, infer_data_property_values)
+    if not jobs.is_ready(key):
+        return onto
+    if has_local_edits(onto):
+        if not info.get("swap_skipped"):
+            info["swap_skipped"] = True
+            logger.info("[ReasoningJobs] snapshot inferido pronto, mas a ontologia tem edições locais; mantendo a versão asserida.")
+        return onto
+    new = jobs.open_inferred(onto, infer_property_values, infer_data_property_values)
+    return new if new is not None else onto
@@ -0,0 +1,132 @@
+# core/services/result_cache.py
+"""
+Cache de resultados das consultas sobre a ontologia: casos de uso
+predefinidos, páginas SPARQL e listagens de entidades serializadas.
+
+Os resultados ficam no cache do Django (settings.CACHES), então vários
+workers podem compartilhar um mesmo Redis; com LocMem o cache é do processo.
+A chave inclui a versão da ontologia (`ontology_version`): digest do
+quadstore, snapshot servido (asserido ou chave do reasoning) e versão do
+journal com o instante da última mutação. Uma edição muda a versão e as
+entradas anteriores simplesmente deixam de ser lidas (saem pelo TTL): a
+invalidação é exata, não depende do TTL. Processos que servem o mesmo
+conteúdo (workers do modo pre-fork, outro servidor com o mesmo quadstore)
+calculam a mesma chave.
+
+DL_QUERY_SETTINGS['ENABLE_CACHE'] liga/desliga, 'CACHE_TTL' é o TTL das
+entradas e 'CACHE_ALIAS' o cache usado. Os contadores de acertos/falhas
+(`stats()`) são do processo.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .change_journal import existing_journal
+from .ontology_store import store_info
+
+logger = logging.getLogger(__name__)
+
+
+def ontology_version(onto):
+    """
+    Versão de `onto` para chaves de cache e cursores, igual em todos os
+    processos que servem o mesmo conteúdo. Sem quadstore o conteúdo não é
+    identificável entre processos e a versão vale só para este.
+    """
+    journal = existing_journal(onto)
+    seq = f"{journal.version}.{int((journal.head or 0) * 1e6):x}" if journal is not None else "0"
+    info = store_info(onto)
+    if info is None:
+        return f"local-{os.getpid()}-{id(onto)}-{seq}"
+    snapshot = (info.get("reasoner_key") or "asserted")[:16]
+    return f"{info['digest'][:16]}-{snapshot}-{seq}"
+
+
+class ResultCache:
+    """Resultados por (tipo, versão da ontologia, parâmetros) num cache do Django."""
+
+    def __init__(self, alias="default", timeout=300, enabled=True):
+        self.alias = alias
+        self.timeout = timeout
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}   # tipo -> {"hits", "misses", "stores", "errors"}
+
+    def _count(self, kind, name):
+        with self._lock:
+            counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "stores": 0, "errors": 0})
+            counters[name] += 1
+
+    @staticmethod
+    def key(kind, version, params):
+        raw = json.dumps(params, sort_keys=True, default=str, ensure_ascii=False)
+        return f"result:{kind}:{version}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]}"
+
+    def get_or_compute(self, kind, version, params, compute, cacheable=None):
+        """
+        (valor, hit). `version()` é lida antes e depois de `compute()`: se a
+        ontologia mudou no meio, o valor é devolvido mas não é guardado (ele
+        pode ser de qualquer uma das duas versões). `cacheable(valor)` exclui
+        respostas de erro. Falhas do backend (Redis fora do ar) viram falhas
+        de cache, nunca erros da requisição.
+        """
+        before = version() if self.enabled else None
+        if before is None:
+            return compute(), False
+        key = self.key(kind, before, params)
+        cache = caches[self.alias]
+        try:
+            cached = cache.get(key)
+        except Exception as e:
+            self._count(kind, "errors")
+            logger.warning("[ResultCache] leitura falhou (%s): %s", kind, e)
+            cached = None
+        if cached is not None:
+            self._count(kind, "hits")
+            return cached, True
+        self._count(kind, "misses")
+        value = compute()
+        if (cacheable is None or cacheable(value)) and version() == before:
+            try:
+                cache.set(key, value, self.timeout)
+                self._count(kind, "stores")
+            except Exception as e:
+                self._count(kind, "errors")
+                logger.warning("[ResultCache] escrita falhou (%s): %s", kind, e)
+        return value, False
+
+    def clear(self):
+        """Remove todas as entradas do cache configurado (de todos os processos que o compartilham)."""
+        caches[self.alias].clear()
+
+    def stats(self):
+        with self._lock:
+            by_kind = {kind: dict(c) for kind, c in self._counters.items()}
+        hits = sum(c["hits"] for c in by_kind.values())
+        misses = sum(c["misses"] for c in by_kind.values())
+        cache = caches[self.alias]
+        backend = getattr(cache, "backend", cache)  # FailoverCache: Redis ou memória local
+        return {"enabled": self.enabled, "backend": backend.__class__.__name__,
+                "timeout": self.timeout, "pid": os.getpid(), "hits": hits, "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+                "by_kind": by_kind}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Instância do processo, configurada por DL_QUERY_SETTINGS (ENABLE_CACHE, CACHE_TTL, CACHE_ALIAS)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            cfg = getattr(settings, "DL_QUERY_SETTINGS", {})
+            _cache = ResultCache(cfg.get("CACHE_ALIAS", "default"), cfg.get("CACHE_TTL", 300),
+                                 cfg.get("ENABLE_CACHE", True))
+        return _cache
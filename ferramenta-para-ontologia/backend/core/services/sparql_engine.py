@@ -0,0 +1,452 @@
+# core/services/sparql_engine.py
+"""
+Execução de SPARQL sobre o mundo Owlready2 da ontologia.
+
+O caminho padrão é o motor nativo do Owlready2, que traduz a consulta para
+SQL sobre o quadstore: a tradução (parse + plano) é feita uma vez por texto
+de consulta e versão da ontologia e fica num LRU; as execuções seguintes só
+rodam o SQL com os parâmetros ligados. Parâmetros são posicionais (`??1`,
+`??2`, ... ou `??` na ordem) e nunca interpolados no texto.
+
+O rdflib (grafo `world.as_rdflib_graph()`, avaliador em Python puro) fica
+só para o que o motor nativo não suporta: ASK/CONSTRUCT/DESCRIBE, alguns
+caminhos de propriedade e funções, e parâmetros com IRIs que não existem na
+ontologia. A consulta preparada lembra qual motor usar, então uma consulta
+não suportada não é retraduzida a cada chamada.
+
+Cada execução mede o tempo de preparo e de execução por motor; stats()
+agrega por consulta (impressão digital do texto) para comparar os dois.
+
+Com `deadline`, a execução é interrompida quando o prazo passa, mesmo no
+meio de um único passo do SQLite: um temporizador chama sqlite3_interrupt na
+conexão do mundo se a consulta ainda está produzindo uma linha. Como o grafo
+rdflib também lê do quadstore, o mesmo mecanismo corta as consultas que
+caíram no rdflib.
+
+Um progress handler do SQLite não serve para isso: todas as threads usam a
+mesma conexão do mundo, o callback em Python precisa do GIL enquanto segura
+o mutex da conexão, e outra thread lendo colunas segura o GIL esperando esse
+mutex (deadlock). A interrupção, por sua vez, vale para a conexão inteira:
+- nunca é disparada durante uma mutação do journal, e novas mutações
+  esperam até a consulta interrompida finalizar a instrução
+  (ontology_session.hold_edits);
+- uma consulta dentro do prazo que foi abortada pela interrupção de outra
+  roda de novo a partir da linha em que estava (a ordem das linhas é a
+  mesma entre execuções, como na paginação por cursor).
+"""
+import hashlib
+import itertools
+import logging
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from .namespaces import PREFIXES
+from .ontology_session import hold_edits, release_edits
+from .ontology_store import on_world_closed
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ("native", "rdflib")
+_PARAM = re.compile(r"\?\?(\d*)")
+_DECLARED = re.compile(r"PREFIX\s+([A-Za-z][\w.-]*)?:", re.IGNORECASE)
+_FORM = re.compile(r"^\s*(?:(?:PREFIX|BASE)\s+[^<]*<[^>]*>\s*)*(SELECT|ASK|CONSTRUCT|DESCRIBE|INSERT|DELETE|WITH)\b",
+                   re.IGNORECASE)
+
+
+class SparqlError(ValueError):
+    """Consulta inválida ou não suportada por nenhum dos motores."""
+
+
+class SparqlTimeout(SparqlError):
+    """A consulta passou do prazo e foi interrompida."""
+
+
+class _Execution:
+    """Estado de uma execução com prazo, compartilhado com o temporizador."""
+
+    __slots__ = ("deadline", "stepping", "held", "done", "__weakref__")
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.stepping = False   # produzindo uma linha (dentro de next())
+        self.held = False       # interrompeu a conexão e segura as mutações
+        self.done = threading.Event()
+
+
+_interrupts = weakref.WeakKeyDictionary()   # mundo -> sqlite3_interrupt disparados na conexão
+_interrupts_lock = threading.Lock()
+
+
+def _interrupt_count(world):
+    with _interrupts_lock:
+        return _interrupts.get(world, 0)
+
+
+def _interrupt_connection(world):
+    with _interrupts_lock:
+        _interrupts[world] = _interrupts.get(world, 0) + 1
+    world.graph.db.interrupt()
+
+
+def with_prefixes(query):
+    """Acrescenta as declarações PREFIX de namespaces.PREFIXES usadas e não declaradas na consulta."""
+    declared = set(_DECLARED.findall(query))
+    missing = [p for p, iri in PREFIXES.items()
+               if p not in declared and re.search(rf"(?<![\w?$<]){re.escape(p)}:", query)]
+    return "".join(f"PREFIX {p}: <{PREFIXES[p]}>\n" for p in missing) + query
+
+
+def query_form(query):
+    """SELECT, ASK, CONSTRUCT, DESCRIBE ou UPDATE (INSERT/DELETE)."""
+    m = _FORM.match(query)
+    if not m:
+        return None
+    form = m.group(1).upper()
+    return "UPDATE" if form in ("INSERT", "DELETE", "WITH") else form
+
+
+def _iri_param(value):
+    """IRI de um parâmetro escrito como <iri>, http(s)://... ou prefixo:nome; None se for literal."""
+    if not isinstance(value, str):
+        return None
+    s = value.strip()
+    if s.startswith("<") and s.endswith(">"):
+        return s[1:-1].strip()
+    if s.startswith(("http://", "https://", "urn:")):
+        return s
+    prefix, sep, local = s.partition(":")
+    if sep and prefix in PREFIXES and " " not in local:
+        return PREFIXES[prefix] + local
+    return None
+
+
+def _numbered(query):
+    """Troca `??` sem número por `??1`, `??2`, ... (na ordem em que aparecem)."""
+    counter = iter(range(1, 10 ** 6))
+    return _PARAM.sub(lambda m: m.group(0) if m.group(1) else f"??{next(counter)}", query)
+
+
+def fingerprint(query):
+    return hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()[:12]
+
+
+class PreparedSparql:
+    """Consulta traduzida para um mundo/versão: motor escolhido, colunas e objeto preparado."""
+
+    def __init__(self, world, text):
+        self.world = world
+        self.text = _numbered(with_prefixes(text))
+        self.fingerprint = fingerprint(text)
+        self.form = query_form(self.text)
+        if self.form == "UPDATE":
+            raise SparqlError("Consultas de atualização (INSERT/DELETE) não são aceitas")
+        self.native = None
+        self.native_error = None
+        self._rdflib = None
+        self._rdflib_lock = threading.Lock()
+        started = time.perf_counter()
+        if self.form == "SELECT":
+            try:
+                self.native = world.prepare_sparql(self.text, False)
+            except Exception as e:
+                self.native_error = f"{type(e).__name__}: {e}"
+        else:
+            self.native_error = (f"{self.form} não suportado pelo motor nativo" if self.form
+                                 else "forma da consulta não reconhecida")
+        self.prepare_seconds = time.perf_counter() - started
+        if self.native is None:
+            self.rdflib_query()  # erros de sintaxe aparecem aqui, não na primeira execução
+        self.engine = "native" if self.native is not None else "rdflib"
+        if self.native is not None:
+            self.variables = [c[1:] for c in self.native.column_names]
+        elif self.form == "ASK":
+            self.variables = []
+        elif self.form in ("CONSTRUCT", "DESCRIBE"):
+            self.variables = ["subject", "predicate", "object"]
+        else:
+            self.variables = [str(v) for v in (self._rdflib.algebra.get("PV") or [])]
+
+    def rdflib_query(self):
+        """Consulta rdflib preparada (parse + álgebra), criada na primeira vez que é necessária."""
+        with self._rdflib_lock:
+            if self._rdflib is None:
+                from rdflib.plugins.sparql import prepareQuery
+                started = time.perf_counter()
+                try:
+                    self._rdflib = prepareQuery(_PARAM.sub(r"?__p\1", self.text))
+                except Exception as e:
+                    raise SparqlError(f"Consulta SPARQL inválida: {e}" if self.native_error is None
+                                      else f"Consulta SPARQL inválida: {e} (motor nativo: {self.native_error})")
+                self.prepare_seconds += time.perf_counter() - started
+            return self._rdflib
+
+
+class SparqlEngine:
+    """Consultas preparadas (LRU por mundo e versão) e estatísticas de tempo por motor."""
+
+    def __init__(self, max_prepared=256, max_stats=512):
+        self.max_prepared = max_prepared
+        self.max_stats = max_stats
+        self._prepared = weakref.WeakKeyDictionary()   # world -> OrderedDict((versão, texto) -> PreparedSparql)
+        self._stats = OrderedDict()                    # fingerprint -> {motor: contadores}
+        self._lock = threading.Lock()
+
+    # ---------- preparo ----------
+    def prepare(self, world, query):
+        version = world.graph.db.total_changes
+        key = (version, query)
+        with self._lock:
+            cache = self._prepared.setdefault(world, OrderedDict())
+            prepared = cache.get(key)
+            if prepared is not None:
+                cache.move_to_end(key)
+                return prepared
+        prepared = PreparedSparql(world, query)
+        if prepared.native_error and prepared.form == "SELECT":
+            logger.info("[SparqlEngine] %s no rdflib: %s", prepared.fingerprint, prepared.native_error)
+        with self._lock:
+            # o preparo nativo pode abreviar IRIs novas; guarda pela versão de depois dele também
+            for k in {key, (world.graph.db.total_changes, query)}:
+                cache[k] = prepared
+            while len(cache) > self.max_prepared:
+                cache.popitem(last=False)
+        return prepared
+
+    def forget(self, world):
+        """Descarta as consultas preparadas de `world` (mundo ou ReadView fechado)."""
+        with self._lock:
+            self._prepared.pop(world, None)
+
+    # ---------- execução ----------
+    def execute(self, world, query, params=(), engine=None, offset=0, deadline=None):
+        """
+        Executa `query` com os `params` posicionais. Retorna (PreparedSparql,
+        motor usado, linhas), onde linhas é um gerador de listas de termos no
+        formato SPARQL JSON ({"type": "uri"|"bnode"|"literal", "value": ...});
+        para ASK, uma única linha [{"type": "boolean", "value": bool}].
+        `engine` força "native" ou "rdflib" (para comparar os dois); `offset`
+        pula as primeiras linhas sem convertê-las; `deadline` (time.monotonic())
+        faz o gerador levantar SparqlTimeout quando o prazo passa.
+        """
+        if engine not in (None,) + ENGINES:
+            raise SparqlError(f"motor desconhecido: {engine!r} (use {', '.join(ENGINES)})")
+        prepared = self.prepare(world, query)
+        params = list(params or ())
+        use = engine or prepared.engine
+        bound = None
+        if use == "native":
+            if prepared.native is None:
+                raise SparqlError(f"Consulta não suportada pelo motor nativo: {prepared.native_error}")
+            if len(params) < prepared.native.nb_parameter:
+                raise SparqlError(f"A consulta espera {prepared.native.nb_parameter} parâmetro(s)")
+            bound = self._native_params(world, params)
+            if bound is None:
+                if engine == "native":
+                    raise SparqlError("Parâmetro com IRI inexistente na ontologia")
+                use = "rdflib"
+        def run(skip):
+            return (self._run_native(prepared, bound, offset + skip) if use == "native"
+                    else self._run_rdflib(world, prepared, params, offset + skip))
+        return prepared, use, self._timed(world, prepared, use, run, deadline)
+
+    def _native_params(self, world, params):
+        """Entidades/literais para o motor nativo; None se alguma IRI não existe no mundo."""
+        bound = []
+        for value in params:
+            iri = _iri_param(value)
+            if iri is None:
+                bound.append(value)
+                continue
+            entity = world[iri]
+            if entity is None:
+                return None
+            bound.append(entity)
+        return bound
+
+    def _run_native(self, prepared, params, offset=0):
+        world, native = prepared.world, prepared.native
+        types = native.column_types
+        for raw in itertools.islice(native.execute_raw(params), offset, None):
+            row, i = [], 0
+            while i < len(raw):
+                if types[i] in ("objs", "onto"):
+                    row.append(_native_node(world, raw[i]))
+                    i += 1
+                else:
+                    row.append(_native_node(world, raw[i]) if raw[i + 1] == "o"
+                               else _native_literal(world, raw[i], raw[i + 1]))
+                    i += 2
+            yield row
+
+    def _run_rdflib(self, world, prepared, params, offset=0):
+        from rdflib import Literal, URIRef
+        bindings = {}
+        for n, value in enumerate(params, start=1):
+            iri = _iri_param(value)
+            bindings[f"__p{n}"] = URIRef(iri) if iri is not None else Literal(value)
+        result = world.as_rdflib_graph().query(prepared.rdflib_query(), initBindings=bindings)
+        if result.type == "ASK":
+            yield [{"type": "boolean", "value": bool(result.askAnswer)}]
+        else:  # SELECT; CONSTRUCT/DESCRIBE viram linhas (s, p, o)
+            for row in itertools.islice(result, offset, None):
+                yield [_rdflib_term(t) for t in row]
+
+    def _timed(self, world, prepared, engine, run, deadline=None):
+        """
+        Repassa as linhas de `run(0)` medindo o tempo até o gerador terminar
+        (ou ser fechado). O prazo vale só enquanto a próxima linha é
+        produzida, não enquanto o consumidor (ex.: a resposta HTTP) está com
+        ela. Se a interrupção de outra consulta abortar esta dentro do prazo,
+        continua com `run(linhas já entregues)`.
+        """
+        started = time.perf_counter()
+        count = 0
+        execution = _Execution(deadline)
+        watchdog = None
+        if deadline is not None:
+            watchdog = threading.Timer(max(deadline - time.monotonic(), 0.0), self._interrupt, (world, execution))
+            watchdog.daemon = True
+            watchdog.start()
+        rows = run(0)
+        try:
+            while True:
+                interrupts = _interrupt_count(world)
+                execution.stepping = True
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise SparqlTimeout("Tempo limite da consulta SPARQL excedido") from e
+                    if execution.held or _interrupt_count(world) == interrupts:
+                        raise
+                    # abortada pela interrupção de outra consulta (o erro varia: OperationalError, ou
+                    # o rdflib recebe None de um cursor interrompido): recomeça de onde estava
+                    logger.debug("[SparqlEngine] %s interrompida por outra consulta; retomando na linha %d",
+                                 prepared.fingerprint, count)
+                    rows.close()
+                    rows = run(count)
+                    continue
+                finally:
+                    execution.stepping = False
+                if deadline is not None and time.monotonic() > deadline:
+                    raise SparqlTimeout("Tempo limite da consulta SPARQL excedido")
+                count += 1
+                yield row
+        finally:
+            execution.done.set()
+            if watchdog is not None:
+                watchdog.cancel()
+                watchdog.join()  # o temporizador pode estar no meio de um hold_edits()
+            rows.close()  # finaliza a instrução antes de liberar as mutações
+            if execution.held:
+                release_edits(world)
+            self._record(prepared, engine, time.perf_counter() - started, count)
+
+    @staticmethod
+    def _interrupt(world, execution):
+        """
+        Temporizador do prazo: até a execução terminar, interrompe o SQLite
+        sempre que a consulta está produzindo uma linha. Repete a cada 50 ms
+        porque a interrupção só atinge instruções em andamento, e o rdflib
+        passa boa parte do tempo em Python, entre uma instrução e outra. O
+        prazo pode vencer antes do primeiro passo (o preparo da consulta conta
+        no prazo): o temporizador espera o passo em vez de desistir.
+        """
+        while not execution.done.is_set():
+            if execution.stepping:
+                if not execution.held:
+                    execution.held = hold_edits(world)
+                if execution.held:
+                    _interrupt_connection(world)
+            execution.done.wait(0.05)
+
+    def _record(self, prepared, engine, seconds, rows):
+        with self._lock:
+            entry = self._stats.get(prepared.fingerprint)
+            if entry is None:
+                entry = self._stats[prepared.fingerprint] = {
+                    "query": " ".join(prepared.text.split())[:200], "form": prepared.form,
+                    "default_engine": prepared.engine, "native_error": prepared.native_error,
+                    "prepare_ms": round(prepared.prepare_seconds * 1000, 3)}
+            self._stats.move_to_end(prepared.fingerprint)
+            stats = entry.setdefault(engine, {"calls": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = seconds * 1000
+            stats["calls"] += 1
+            stats["rows"] += rows
+            stats["total_ms"] = round(stats["total_ms"] + ms, 3)
+            stats["max_ms"] = round(max(stats["max_ms"], ms), 3)
+            stats["mean_ms"] = round(stats["total_ms"] / stats["calls"], 3)
+            while len(self._stats) > self.max_stats:
+                self._stats.popitem(last=False)
+        logger.debug("[SparqlEngine] %s %s: %d linhas em %.1f ms", prepared.fingerprint, engine, rows, ms)
+
+    def stats(self):
+        """Tempos por consulta e motor: {fingerprint: {query, form, default_engine, prepare_ms, native|rdflib: {...}}}."""
+        with self._lock:
+            return {k: {**v, **{e: dict(v[e]) for e in ENGINES if e in v}} for k, v in self._stats.items()}
+
+    def clear_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def _native_node(world, storid):
+    if storid is None:
+        return None
+    if isinstance(storid, int) and storid < 0:
+        return {"type": "bnode", "value": f"_:{-storid}"}
+    iri = world._unabbreviate(storid) if isinstance(storid, int) else str(storid)
+    return {"type": "uri", "value": iri}
+
+
+def _native_literal(world, value, datatype):
+    if value is None:
+        return None
+    term = {"type": "literal", "value": _lexical(world._to_python(value, datatype))}
+    if isinstance(datatype, str) and datatype.startswith("@"):
+        term["xml:lang"] = datatype[1:]
+    elif isinstance(datatype, int) and datatype > 0:
+        term["datatype"] = world._unabbreviate(datatype)
+    return term
+
+
+def _lexical(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _rdflib_term(term):
+    from rdflib import BNode, Literal
+    if term is None:
+        return None
+    if isinstance(term, Literal):
+        out = {"type": "literal", "value": str(term)}
+        if term.language:
+            out["xml:lang"] = term.language
+        elif term.datatype:
+            out["datatype"] = str(term.datatype)
+        return out
+    if isinstance(term, BNode):
+        return {"type": "bnode", "value": f"_:{term}"}
+    return {"type": "uri", "value": str(term)}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_sparql_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SparqlEngine()
+            # as consultas preparadas seguram o mundo: sem isso um mundo fechado nunca sairia do cache
+            on_world_closed(_engine.forget)
+        return _engine
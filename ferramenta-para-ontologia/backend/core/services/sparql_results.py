@@ -0,0 +1,166 @@
+# core/services/sparql_results.py
+"""
+Paginação e serialização dos resultados de /api/sparql-query/.
+
+Paginação por cursor: o cursor é um token assinado (django.core.signing)
+com a impressão digital da consulta e dos parâmetros, a versão da ontologia
+e o deslocamento da próxima página. Uma página a mais não reexecuta nada que
+o cliente já recebeu no lado do Python (as linhas anteriores são puladas sem
+conversão, ver SparqlEngine.execute), e um cursor de outra consulta ou de
+uma versão anterior da ontologia é recusado em vez de devolver linhas
+deslocadas.
+
+Formatos:
+- json: {status, variables, results: [{var: valor}], ...}, como o frontend usa;
+- ndjson: uma linha {"head": ...}, uma linha por resultado ({var: termo
+  SPARQL JSON}) e uma linha final {"end": ...} ou {"error": ...};
+- sparql-json: o formato W3C (application/sparql-results+json), escrito à
+  medida que as linhas são produzidas, com next_cursor/error no fim.
+Os dois últimos são gerados em streaming: a primeira linha sai antes de a
+consulta terminar.
+"""
+import json
+import time
+
+from django.core import signing
+
+from .sparql_engine import SparqlError, SparqlTimeout, fingerprint
+
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "sparql-json": "application/sparql-results+json",
+}
+_SALT = "core.sparql-cursor"
+
+
+class CursorError(SparqlError):
+    """Cursor inválido (status 400) ou expirado porque a ontologia mudou (`expired`, status 409)."""
+
+    def __init__(self, message, expired=False):
+        super().__init__(message)
+        self.expired = expired
+
+
+def _identity(query, params):
+    return fingerprint(query), fingerprint(json.dumps(list(params), default=str))
+
+
+def make_cursor(query, params, version, offset):
+    q, p = _identity(query, params)
+    return signing.dumps({"q": q, "p": p, "v": list(version), "o": offset}, salt=_SALT, compress=True)
+
+
+def read_cursor(cursor, query, params, version):
+    """Deslocamento guardado no cursor; CursorError se não for desta consulta/versão."""
+    try:
+        data = signing.loads(cursor, salt=_SALT)
+    except signing.BadSignature:
+        raise CursorError("cursor inválido")
+    if (data.get("q"), data.get("p")) != _identity(query, params):
+        raise CursorError("cursor de outra consulta ou com outros parâmetros")
+    if data.get("v") != list(version):
+        raise CursorError("cursor expirado: a ontologia mudou; refaça a consulta", expired=True)
+    return int(data.get("o", 0))
+
+
+def accepted_format(request_format, accept=""):
+    """Formato pedido em `format` ou, na falta dele, pelo cabeçalho Accept."""
+    if request_format:
+        fmt = str(request_format).lower()
+        if fmt not in FORMATS:
+            raise SparqlError(f"formato desconhecido: {request_format!r} (use {', '.join(FORMATS)})")
+        return fmt
+    for fmt, mime in FORMATS.items():
+        if mime in (accept or "") and fmt != "json":
+            return fmt
+    return "json"
+
+
+class Page:
+    """
+    Até `size` linhas de `rows`; depois de consumida, `more` diz se havia
+    mais linhas (a consulta produz uma a mais para saber) e `count` quantas
+    foram entregues.
+    """
+
+    def __init__(self, rows, size):
+        self.rows = rows
+        self.size = size
+        self.count = 0
+        self.more = False
+        self.started = time.perf_counter()
+
+    def __iter__(self):
+        try:
+            for row in self.rows:
+                if self.count >= self.size:
+                    self.more = True
+                    break
+                self.count += 1
+                yield row
+        finally:
+            self.rows.close()
+
+    @property
+    def elapsed_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+
+def flat(variables, row):
+    """{variável: valor} (string/None), o formato que o frontend mostra."""
+    return {var: (term["value"] if term else None) for var, term in zip(variables, row)}
+
+
+def binding(variables, row):
+    """{variável: termo SPARQL JSON}, sem as variáveis não ligadas."""
+    return {var: term for var, term in zip(variables, row) if term}
+
+
+def _ask(prepared, row):
+    return bool(row and row[0] and row[0].get("value"))
+
+
+def stream_ndjson(prepared, engine, page, next_cursor):
+    """Linhas NDJSON: head, um resultado por linha e end (ou error)."""
+    variables = prepared.variables
+    yield json.dumps({"head": {"vars": variables, "form": prepared.form, "engine": engine}}) + "\n"
+    try:
+        for row in page:
+            if prepared.form == "ASK":
+                yield json.dumps({"boolean": _ask(prepared, row)}) + "\n"
+            else:
+                yield json.dumps(binding(variables, row), ensure_ascii=False) + "\n"
+    except SparqlError as e:
+        yield json.dumps({"error": {"message": str(e), "timeout": isinstance(e, SparqlTimeout),
+                                    "rows": page.count}}) + "\n"
+        return
+    yield json.dumps({"end": {"rows": page.count, "elapsed_ms": page.elapsed_ms,
+                              "next_cursor": next_cursor(page.count) if page.more else None}}) + "\n"
+
+
+def stream_sparql_json(prepared, engine, page, next_cursor):
+    """application/sparql-results+json escrito incrementalmente (next_cursor/error como membros extras)."""
+    try:
+        if prepared.form == "ASK":
+            answer = False
+            for row in page:
+                answer = _ask(prepared, row)
+            yield json.dumps({"head": {}, "boolean": answer, "engine": engine})
+            return
+        variables = prepared.variables
+        yield '{"head": ' + json.dumps({"vars": variables}) + ', "results": {"bindings": ['
+        separator = ""
+        try:
+            for row in page:
+                yield separator + json.dumps(binding(variables, row), ensure_ascii=False)
+                separator = ", "
+        except SparqlError as e:
+            yield "]}, " + json.dumps({"engine": engine, "error": str(e),
+                                       "timeout": isinstance(e, SparqlTimeout)})[1:]
+            return
+        tail = {"engine": engine, "elapsed_ms": page.elapsed_ms,
+                "next_cursor": next_cursor(page.count) if page.more else None}
+        yield "]}, " + json.dumps(tail)[1:]
+    except SparqlError as e:  # ASK interrompido
+        yield json.dumps({"head": {}, "error": str(e), "timeout": isinstance(e, SparqlTimeout)})
@@ -0,0 +1,113 @@
+# core/services/synthetic_timeseries.py
+"""
+Séries sintéticas determinísticas, para tags sem CSV e para testes de carga.
+
+O valor de uma tag num instante depende só do nome da tag e do timestamp
+(em segundos), nunca da janela pedida nem da chamada: o nível, as
+amplitudes e as fases das componentes periódicas (diária, semanal e uma
+deriva lenta) vêm de um gerador semeado pelo SHA-256 da tag, e o ruído é
+um hash (splitmix64) de (semente, segundo) convertido em normal por
+Box-Muller. Assim a mesma tag devolve os mesmos pontos em qualquer
+resolução e processo, o resultado pode ir para cache e ser comparado, e
+tudo é calculado com operações vetorizadas (milhões de pontos por segundo).
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from .graph_index import get_graph_index, local_name
+
+NS = 1_000_000_000
+DAY = 86400
+TAG_PREDICATES = ('core:isAbout', 'core:about')
+
+
+def tag_seed(tag):
+    """Semente estável (entre processos e execuções) derivada do nome da tag."""
+    return int.from_bytes(hashlib.sha256(str(tag).encode('utf-8')).digest()[:8], 'little')
+
+
+def _splitmix64(x):
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(seed, counter):
+    """Uniformes em (0, 1) a partir de (semente, contador), sem estado."""
+    bits = _splitmix64(np.asarray(counter, dtype=np.uint64) ^ np.uint64(seed))
+    return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) / float(1 << 53)
+
+
+def _normal(seed, counter):
+    u1 = _uniform(seed, counter * np.uint64(2))
+    u2 = _uniform(seed, counter * np.uint64(2) + np.uint64(1))
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+def grid(start_ns, end_ns, step_seconds):
+    """Timestamps (ns) múltiplos de `step_seconds` em [start, end]."""
+    step = max(int(step_seconds * NS), 1)
+    first = -(-int(start_ns) // step) * step
+    if int(end_ns) < first:
+        return np.empty(0, dtype=np.int64)
+    return np.arange(first, int(end_ns) + 1, step, dtype=np.int64)
+
+
+def synthetic_values(tag, ts_ns):
+    """Valores da tag nos timestamps `ts_ns` (int64, ns)."""
+    seed = tag_seed(tag)
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(20.0, 200.0)
+    daily, weekly, drift = base * rng.uniform(0.02, 0.1, size=3)
+    phases = rng.uniform(0.0, 2 * np.pi, size=3)
+    drift_days = rng.uniform(20.0, 90.0)
+    noise = base * rng.uniform(0.002, 0.01)
+
+    seconds = np.asarray(ts_ns, dtype=np.int64) // NS
+    t = seconds.astype(np.float64)
+    values = (base
+              + daily * np.sin(2 * np.pi * t / DAY + phases[0])
+              + weekly * np.sin(2 * np.pi * t / (7 * DAY) + phases[1])
+              + drift * np.sin(2 * np.pi * t / (drift_days * DAY) + phases[2]))
+    return values + noise * _normal(seed, seconds.view(np.uint64))
+
+
+def synthetic_series(tag, start_ns, end_ns, step_seconds=3600):
+    """(timestamps, valores) da tag numa grade de `step_seconds` em [start, end]."""
+    ts = grid(start_ns, end_ns, step_seconds)
+    return ts, synthetic_values(tag, ts)
+
+
+def write_csv(path, tag, start_ns, end_ns, step_seconds, chunk=1_000_000):
+    """Grava o CSV (timestamp,value) da tag em blocos de `chunk` linhas; retorna o número de linhas."""
+    step = max(int(step_seconds * NS), 1)
+    first = -(-int(start_ns) // step) * step
+    rows = 0
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        f.write('timestamp,value\n')
+        for lo in range(first, int(end_ns) + 1, step * chunk):
+            ts = np.arange(lo, min(lo + step * chunk, int(end_ns) + 1), step, dtype=np.int64)
+            values = synthetic_values(tag, ts)
+            stamps = np.datetime_as_string(ts.view('datetime64[ns]'), unit='s' if step % NS == 0 else 'ms')
+            lines = np.char.add(np.char.add(stamps, ','), np.char.mod('%.6g', values))
+            f.write('\n'.join(lines.tolist()))
+            f.write('\n')
+            rows += len(ts)
+    os.replace(tmp, path)
+    return rows
+
+
+def ontology_tags(onto):
+    """Nomes locais das tags da ontologia (sujeitos de core:isAbout / core:about)."""
+    g = get_graph_index(onto)
+    tags = set()
+    for p in g.ids(TAG_PREDICATES):
+        for s in g.out.get(p, {}):
+            iri = g.iri(s)
+            if not iri.startswith('_:'):
+                tags.add(local_name(iri))
+    return sorted(tags)
@@ -0,0 +1,256 @@
+# core/services/timeseries_analytics.py
+"""
+Estatísticas entre tags (revisão de integridade de poço) calculadas no
+servidor, em vez de mandar as séries brutas para o navegador.
+
+As séries são alinhadas na grade comum de OntologyService.align_timeseries
+(média por intervalo, com os rollups em janelas longas) e empilhadas numa
+matriz tags x intervalos; todas as métricas saem de operações NumPy sobre a
+matriz inteira, com NaN nos intervalos sem dados:
+
+- estatísticas descritivas por tag (contagem, média, desvio, mín., máx., percentis);
+- matriz de correlação de Pearson entre pares, usando só os intervalos em
+  que as duas tags têm valor (três produtos de matrizes);
+- taxa de variação entre intervalos vizinhos, em unidades por hora;
+- excedências de limites (`high`/`low`): intervalos fora do limite, número de
+  excursões e tempo fora.
+
+O resultado fica em cache por (tags, janela, resolução, limites) e vale
+enquanto o mtime/tamanho dos CSVs das tags não mudar (mesma validação do
+painel do poço, ver well_dashboard.py).
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .timeseries_store import iso_timestamps, values_to_json
+from .well_dashboard import DashboardCache, csv_stamps
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (5, 50, 95)
+MIN_PAIRED = 3
+
+
+def _stack(tags, aligned, bins):
+    """Matriz float64 (tags x intervalos); tags sem série ficam com NaN."""
+    matrix = np.full((len(tags), bins), np.nan)
+    for row, tag in enumerate(tags):
+        values = aligned.get(tag)
+        if values is not None and len(values) == bins:
+            matrix[row] = values
+    return matrix
+
+
+def describe(matrix):
+    """Estatísticas por linha, ignorando NaN: dict de arrays com uma posição por tag."""
+    valid = ~np.isnan(matrix)
+    count = valid.sum(axis=1)
+    names = ("mean", "std", "min", "max", *(f"p{p:02d}" for p in PERCENTILES), "first", "last")
+    if not matrix.shape[1]:
+        return {"count": count, **{name: np.full(len(matrix), np.nan) for name in names}}
+    has = count > 0
+    filled = np.where(valid, matrix, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=1) / count
+        std = np.sqrt(np.where(valid, (matrix - mean[:, None]) ** 2, 0.0).sum(axis=1) / count)
+    stats = {
+        "count": count,
+        "mean": mean,
+        "std": std,
+        "min": np.where(has, np.where(valid, matrix, np.inf).min(axis=1), np.nan),
+        "max": np.where(has, np.where(valid, matrix, -np.inf).max(axis=1), np.nan),
+    }
+    qs = np.full((len(PERCENTILES), len(matrix)), np.nan)
+    if has.any():
+        qs[:, has] = np.nanpercentile(matrix[has], PERCENTILES, axis=1)
+    for p, q in zip(PERCENTILES, qs):
+        stats[f"p{p:02d}"] = q
+    # primeiro/último valor válido de cada linha
+    rows = np.arange(len(matrix))
+    first = valid.argmax(axis=1)
+    last = matrix.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    stats["first"] = np.where(has, matrix[rows, first], np.nan)
+    stats["last"] = np.where(has, matrix[rows, last], np.nan)
+    return stats
+
+
+def correlation(matrix, min_paired=MIN_PAIRED):
+    """
+    Correlação de Pearson entre todas as linhas, par a par sobre os intervalos
+    em que ambas têm valor: (matriz de correlação, matriz de intervalos em
+    comum). Pares com menos de `min_paired` intervalos ou variância nula ficam NaN.
+    """
+    valid = (~np.isnan(matrix)).astype(np.float64)
+    x = np.where(valid > 0, matrix, 0.0)
+    n = valid @ valid.T               # intervalos em comum
+    sx = x @ valid.T                  # soma de x_i onde i e j têm valor
+    sxx = (x * x) @ valid.T
+    sxy = x @ x.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = n * sxy - sx * sx.T
+        var = (n * sxx - sx * sx) * (n * sxx - sx * sx).T
+        corr = cov / np.sqrt(var)
+    corr[(n < min_paired) | ~(var > 0)] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return corr, n.astype(np.int64)
+
+
+def _previous_valid(matrix):
+    """Índice do último intervalo com valor até cada posição (-1 se ainda não houve nenhum)."""
+    positions = np.where(~np.isnan(matrix), np.arange(matrix.shape[1]), -1)
+    return np.maximum.accumulate(positions, axis=1)
+
+
+def rate_of_change(matrix, step_seconds):
+    """
+    Variação entre valores consecutivos (unidades/hora; intervalos vazios no
+    meio são pulados): média absoluta, maior subida e maior queda por linha.
+    """
+    if matrix.shape[1] < 2:
+        empty = np.full(len(matrix), np.nan)
+        return {"mean_abs_per_hour": empty, "max_rise_per_hour": empty, "max_fall_per_hour": empty}
+    previous = _previous_valid(matrix)[:, :-1]
+    current = matrix[:, 1:]
+    rows = np.arange(len(matrix))[:, None]
+    gap = np.arange(1, matrix.shape[1]) - previous
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(previous >= 0, (current - matrix[rows, previous]) / gap, np.nan) * (3600.0 / step_seconds)
+    valid = ~np.isnan(rate)
+    count = valid.sum(axis=1)
+    has = count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_abs = np.where(valid, np.abs(rate), 0.0).sum(axis=1) / count
+    return {
+        "mean_abs_per_hour": mean_abs,
+        "max_rise_per_hour": np.where(has, np.where(valid, rate, -np.inf).max(axis=1), np.nan),
+        "max_fall_per_hour": np.where(has, np.where(valid, rate, np.inf).min(axis=1), np.nan),
+    }
+
+
+def exceedances(matrix, high, low, step_seconds):
+    """
+    Intervalos acima de `high` / abaixo de `low` (arrays com um limite por
+    linha; NaN = sem limite), número de excursões e tempo fora, em segundos.
+    Intervalos vazios mantêm o último valor, então uma excursão com uma falha
+    de dados no meio conta uma vez e o tempo fora inclui a falha.
+    """
+    previous = _previous_valid(matrix)
+    held = np.where(previous >= 0, matrix[np.arange(len(matrix))[:, None], np.maximum(previous, 0)], np.nan)
+    result = {}
+    with np.errstate(invalid="ignore"):
+        for name, limit, compare in (("high", high, np.greater), ("low", low, np.less)):
+            outside = compare(held, limit[:, None])
+            starts = outside[:, :1].sum(axis=1) + (outside[:, 1:] & ~outside[:, :-1]).sum(axis=1)
+            result[name] = {"bins": (compare(matrix, limit[:, None])).sum(axis=1), "excursions": starts,
+                            "seconds": outside.sum(axis=1) * step_seconds}
+    return result
+
+
+def _thresholds(tags, thresholds):
+    """
+    Limites por tag a partir de {"high": x, "low": y} (todas as tags) e/ou
+    {"<tag>": {"high": x, "low": y}}; ValueError se algum não for número.
+    """
+    high = np.full(len(tags), np.nan)
+    low = np.full(len(tags), np.nan)
+    thresholds = thresholds or {}
+    for row, tag in enumerate(tags):
+        per_tag = thresholds.get(tag) if isinstance(thresholds.get(tag), dict) else {}
+        for target, name in ((high, "high"), (low, "low")):
+            value = per_tag.get(name, thresholds.get(name))
+            if value not in (None, ""):
+                try:
+                    target[row] = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f'limite "{name}" inválido para {tag}: {value!r}')
+    return high, low
+
+
+def _column(values):
+    return values_to_json(np.asarray(values, dtype=np.float64))
+
+
+def analyze(tags, aligned, grid, thresholds=None):
+    """Métricas das `tags` já alinhadas ({tag: array na grade}, grade de align_timeseries)."""
+    high, low = _thresholds(tags, thresholds)
+    bins = grid[2] if grid is not None else 0
+    step_seconds = grid[1] / 1e9 if grid is not None else None
+    matrix = _stack(tags, aligned, bins)
+
+    stats = describe(matrix)
+    corr, paired = correlation(matrix)
+    rates = rate_of_change(matrix, step_seconds or 1.0)
+    exceed = exceedances(matrix, high, low, step_seconds or 0.0)
+
+    per_tag = {}
+    columns = {name: _column(values) for name, values in {**stats, **rates}.items() if name != "count"}
+    for row, tag in enumerate(tags):
+        entry = {"count": int(stats["count"][row])}
+        entry.update({name: values[row] for name, values in columns.items()})
+        entry["thresholds"] = {
+            name: {"limit": None if np.isnan(limit[row]) else float(limit[row]),
+                   "bins": int(exceed[name]["bins"][row]),
+                   "excursions": int(exceed[name]["excursions"][row]),
+                   "seconds": float(exceed[name]["seconds"][row])}
+            for name, limit in (("high", high), ("low", low))}
+        per_tag[tag] = entry
+
+    return {
+        "stats": per_tag,
+        "correlation": {"tags": tags, "matrix": [_column(row) for row in corr],
+                        "paired_bins": paired.tolist()},
+        "window": None if grid is None else {
+            "start": iso_timestamps([grid[0]])[0],
+            "end": iso_timestamps([grid[0] + grid[1] * grid[2]])[0],
+            "bins": int(grid[2]),
+        },
+    }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_analytics_cache(max_entries=256):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DashboardCache(max_entries)
+        return _cache
+
+
+def _freeze(thresholds):
+    if not isinstance(thresholds, dict):
+        return thresholds
+    return tuple(sorted((k, _freeze(v)) for k, v in thresholds.items()))
+
+
+def build_analytics(svc, tags, start=None, end=None, max_points=2000, thresholds=None, workers=8,
+                    max_entries=256):
+    """
+    Métricas das `tags` na janela [start, end], numa grade de até `max_points`
+    intervalos: {tags, step_seconds, resolution, missing, errors, window,
+    stats, correlation, cached}. ValueError se os limites forem inválidos.
+    """
+    started = time.perf_counter()
+    tags = list(dict.fromkeys(tags))
+    _thresholds(tags, thresholds)  # valida antes de ler as séries
+    cache = get_analytics_cache(max_entries)
+    store = svc._timeseries_store()
+    key = (tuple(tags), start, end, max_points, _freeze(thresholds))
+    cached = cache.get(key, None, store)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    stamps = csv_stamps(store, tags)
+    result, aligned, grid = svc.align_timeseries(tags, start=start, end=end, max_points=max_points, workers=workers)
+    result.pop("series")
+    result.pop("timestamps")
+    payload = {**result, **analyze(tags, aligned, grid, thresholds)}
+    cache.put(key, None, tuple(tags), stamps, payload)
+    logger.info("[TimeseriesAnalytics] %d tags, %d intervalos (%.3fs)",
+                len(tags), grid[2] if grid else 0, time.perf_counter() - started)
+    return {**payload, "cached": False}
@@ -0,0 +1,495 @@
+# core/services/timeseries_store.py
+"""
+Armazenamento colunar das séries temporais exportadas do historiador.
+
+O `<tag>.csv` (colunas timestamp,value) é convertido para colunas binárias
+lidas depois com mmap:
+
+    <dir>/<tag>.ts.i8          int64, epoch em nanossegundos (UTC), ordenado
+    <dir>/<tag>.val.f8         float64 (NaN para valores ausentes)
+    <dir>/<tag>.r<seg>.i8      início de cada bucket de <seg> segundos (60, 3600, 86400)
+    <dir>/<tag>.r<seg>.f8      min, max, soma, contagem e último valor de cada bucket
+    <dir>/<tag>.json           metadados: CSV de origem, bytes já lidos, linhas por arquivo
+
+As agregações (rollups) de 1 minuto, 1 hora e 1 dia permitem responder
+janelas longas sem tocar nos pontos brutos: a consulta usa o nível mais
+grosso que ainda tem pelo menos `max_points` buckets na janela (resolve).
+
+Quando o CSV só cresceu (o historiador acrescenta linhas no fim), apenas os
+bytes novos são lidos: as linhas vão para o fim das colunas e os rollups
+são recalculados a partir do último bucket de cada nível. Qualquer outra
+mudança (arquivo reescrito, linhas fora de ordem) refaz a conversão inteira.
+
+O arquivo de metadados é o ponto de commit: leitores mapeiam só o número de
+linhas que ele declara, então os bytes acrescentados antes da gravação dele
+ficam invisíveis. A conversão completa grava arquivos novos com rename
+atômico; um lock exclusivo por tag (O_EXCL) impede dois workers de
+converter a mesma tag ao mesmo tempo.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 2
+LEVELS = (60, 3600, 86400)
+LEVEL_NAMES = {60: "1min", 3600: "1h", 86400: "1d"}
+AGGREGATES = ("min", "max", "sum", "count", "last")
+TAIL_CHECK_BYTES = 4096
+STALE_LOCK_SECONDS = 600
+
+
+def to_epoch_ns(value):
+    """datetime / string ISO / pd.Timestamp -> epoch em ns (UTC); None passa direto."""
+    if value is None or value == "":
+        return None
+    import pandas as pd  # só para interpretar datas e CSVs: importado no primeiro uso
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return int(ts.as_unit("ns").value)
+
+
+def iso_timestamps(ts_ns):
+    """Epoch em ns -> strings ISO 8601 (sem fuso, UTC), na menor unidade que não perde precisão."""
+    ts_ns = np.asarray(ts_ns, dtype=np.int64)
+    if not len(ts_ns) or not (ts_ns % 1_000_000_000).any():
+        unit = "s"
+    elif not (ts_ns % 1_000_000).any():
+        unit = "ms"
+    else:
+        unit = "us"
+    return np.datetime_as_string(ts_ns.view("datetime64[ns]"), unit=unit).tolist()
+
+
+def values_to_json(values):
+    """float64 -> lista de floats, com None no lugar de NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def _map(path, dtype, rows, width=None):
+    shape = (rows,) if width is None else (rows, width)
+    if not rows:
+        # arquivo vazio não pode ser mapeado
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _parse(source, names=None):
+    """CSV (caminho ou buffer) -> (ts int64 ns, valores float64), descartando timestamps inválidos."""
+    import pandas as pd
+    if names is None:
+        df = pd.read_csv(source, usecols=["timestamp", "value"])
+    else:
+        df = pd.read_csv(source, header=None, names=names, usecols=["timestamp", "value"])
+    ts = pd.to_datetime(df["timestamp"], format="ISO8601", utc=True, errors="coerce")
+    keep = ts.notna().to_numpy()
+    ts_ns = ts[keep].dt.tz_localize(None).to_numpy().astype("datetime64[ns]").astype(np.int64)
+    values = pd.to_numeric(df["value"], errors="coerce")[keep].to_numpy(dtype=np.float64)
+    return ts_ns, values
+
+
+def rollup(ts_ns, values, seconds):
+    """
+    Agrega pontos ordenados em buckets de `seconds`: (inícios int64, matriz k x 5
+    com min, max, soma, contagem e último valor). Valores ausentes são ignorados;
+    buckets sem nenhum valor não aparecem.
+    """
+    keep = ~np.isnan(values)
+    ts_ns, values = ts_ns[keep], values[keep]
+    if not len(ts_ns):
+        return np.empty(0, dtype=np.int64), np.empty((0, len(AGGREGATES)), dtype=np.float64)
+    width = seconds * 1_000_000_000
+    buckets = ts_ns // width * width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    agg = np.empty((len(starts), len(AGGREGATES)), dtype=np.float64)
+    agg[:, 0] = np.minimum.reduceat(values, starts)
+    agg[:, 1] = np.maximum.reduceat(values, starts)
+    agg[:, 2] = np.add.reduceat(values, starts)
+    agg[:, 3] = ends - starts
+    agg[:, 4] = values[ends - 1]
+    return buckets[starts], agg
+
+
+class Rollup:
+    """Buckets de um nível (mmap): início, min, max, soma, contagem e último valor."""
+
+    def __init__(self, seconds, ts, agg):
+        self.seconds = seconds
+        self.name = LEVEL_NAMES[seconds]
+        self.ts = ts
+        self.agg = agg
+
+    def __len__(self):
+        return len(self.ts)
+
+    def bounds(self, start=None, end=None):
+        """Índices [i, j) dos buckets que cobrem algum instante de [start, end]."""
+        width = self.seconds * 1_000_000_000
+        i = 0 if start is None else int(np.searchsorted(self.ts, to_epoch_ns(start) // width * width, side="left"))
+        j = len(self.ts) if end is None else int(np.searchsorted(self.ts, to_epoch_ns(end), side="right"))
+        return i, max(i, j)
+
+    def column(self, name, i=0, j=None):
+        if name == "mean":
+            agg = self.agg[i:j]
+            return agg[:, 2] / agg[:, 3]
+        return np.asarray(self.agg[i:j, AGGREGATES.index(name)])
+
+
+class Series:
+    """Arrays (mmap) de uma tag, na versão do CSV em que foram convertidos."""
+
+    def __init__(self, tag, ts, values, source_stamp, rollups=None):
+        self.tag = tag
+        self.ts = ts
+        self.values = values
+        self.source_stamp = source_stamp
+        self.rollups = rollups or {}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def bounds(self, start=None, end=None):
+        """Índices [i, j) dos pontos com start <= timestamp <= end."""
+        i = 0 if start is None else int(np.searchsorted(self.ts, to_epoch_ns(start), side="left"))
+        j = len(self.ts) if end is None else int(np.searchsorted(self.ts, to_epoch_ns(end), side="right"))
+        return i, max(i, j)
+
+    def slice(self, start=None, end=None):
+        i, j = self.bounds(start, end)
+        return self.ts[i:j], self.values[i:j]
+
+    def resolve(self, start=None, end=None, max_points=None, points_per_bucket=1):
+        """
+        Nível que responde a janela: o rollup mais grosso com pelo menos
+        `max_points` pontos (`points_per_bucket` por bucket) em [start, end],
+        ou os pontos brutos quando nenhum nível chega lá. Retorna
+        (rollup ou None, i, j, total de pontos brutos na janela).
+        """
+        i, j = self.bounds(start, end)
+        if max_points and j - i > max_points:
+            for seconds in sorted(self.rollups, reverse=True):
+                level = self.rollups[seconds]
+                bi, bj = level.bounds(start, end)
+                if (bj - bi) * points_per_bucket >= max_points:
+                    return level, bi, bj, j - i
+        return None, i, j, j - i
+
+    def binned(self, lo, step, bins, seconds=None):
+        """
+        Média por intervalo de uma grade regular (lo, lo + step, ...; `bins`
+        intervalos, em ns), somando a partir do rollup de `seconds` ou dos
+        pontos brutos. Intervalos sem valores ficam NaN.
+        """
+        hi = lo + step * bins
+        if seconds:
+            level = self.rollups[seconds]
+            i = int(np.searchsorted(level.ts, lo, side="left"))
+            j = int(np.searchsorted(level.ts, hi, side="left"))
+            ts, sums, counts = level.ts[i:j], level.column("sum", i, j), level.column("count", i, j)
+        else:
+            i = int(np.searchsorted(self.ts, lo, side="left"))
+            j = int(np.searchsorted(self.ts, hi, side="left"))
+            ts, values = self.ts[i:j], np.asarray(self.values[i:j])
+            valid = ~np.isnan(values)
+            sums, counts = np.where(valid, values, 0.0), valid.astype(np.float64)
+        k = (np.asarray(ts) - lo) // step
+        total = np.bincount(k, weights=sums, minlength=bins)
+        count = np.bincount(k, weights=counts, minlength=bins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+
+def shared_grid(lo, hi, max_points):
+    """
+    Grade comum a várias séries em [lo, hi] (ns) com no máximo `max_points`
+    intervalos: (início, passo, intervalos, nível de rollup ou None). O passo
+    é múltiplo do nível escolhido, com o início alinhado a ele, de modo que
+    cada bucket do rollup cai inteiro num intervalo; usa o nível mais grosso
+    cujo arredondamento ainda deixa ao menos 80% dos `max_points` intervalos.
+    """
+    span = hi - lo + 1
+    step = max(-(-span // max_points), 1)
+    candidates = [s for s in sorted(LEVELS, reverse=True) if s * 1_000_000_000 <= step]
+    for seconds in candidates:
+        unit = seconds * 1_000_000_000
+        start = lo // unit * unit
+        width = -(-step // unit) * unit
+        while -(-(hi - start + 1) // width) > max_points:
+            width += unit
+        bins = -(-(hi - start + 1) // width)
+        if bins >= 0.8 * max_points or seconds == candidates[-1]:
+            return start, width, bins, seconds
+    # passo menor que o rollup mais fino: pontos brutos
+    if step >= 1_000_000_000:
+        step = -(-step // 1_000_000_000) * 1_000_000_000
+        lo = lo // 1_000_000_000 * 1_000_000_000
+        while -(-(hi - lo + 1) // step) > max_points:
+            step += 1_000_000_000
+    return lo, step, -(-(hi - lo + 1) // step), None
+
+
+class TimeseriesStore:
+    """Conversão CSV -> colunas NumPy (com rollups) e leitura por período, por diretório de CSVs."""
+
+    def __init__(self, csv_dir, store_dir):
+        self.csv_dir = csv_dir  # só lido: é o diretório do historiador
+        self.store_dir = store_dir
+        self._series = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    # ---------- caminhos ----------
+    def csv_path(self, tag):
+        return os.path.join(self.csv_dir, f"{tag}.csv")
+
+    def _paths(self, tag):
+        base = os.path.join(self.store_dir, tag)
+        return f"{base}.ts.i8", f"{base}.val.f8", f"{base}.json"
+
+    def _rollup_paths(self, tag, seconds):
+        base = os.path.join(self.store_dir, f"{tag}.r{seconds}")
+        return f"{base}.i8", f"{base}.f8"
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+
+    def _tag_lock(self, tag):
+        with self._lock:
+            return self._locks.setdefault(tag, threading.Lock())
+
+    @contextmanager
+    def _exclusive(self, tag, timeout=120):
+        """Lock entre processos (arquivo criado com O_EXCL) durante a conversão de uma tag."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = os.path.join(self.store_dir, f"{tag}.lock")
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_LOCK_SECONDS:
+                        os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"conversão da tag {tag} presa em outro processo ({path})")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- metadados ----------
+    def _meta(self, tag):
+        try:
+            with open(self._paths(tag)[2], "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("format") == FORMAT else None
+
+    def _write_meta(self, tag, meta):
+        meta_path = self._paths(tag)[2]
+        tmp = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    @staticmethod
+    def _tail_digest(f, offset):
+        """Hash dos últimos bytes antes de `offset`: detecta se o início do CSV foi reescrito."""
+        f.seek(max(0, offset - TAIL_CHECK_BYTES))
+        return hashlib.sha1(f.read(offset - max(0, offset - TAIL_CHECK_BYTES))).hexdigest()
+
+    # ---------- conversão ----------
+    def convert(self, tag):
+        """Lê o CSV inteiro e regrava colunas e rollups da tag; retorna o número de pontos."""
+        started = time.perf_counter()
+        csv_path = self.csv_path(tag)
+        with open(csv_path, "rb") as f:
+            stamp = self._stamp(csv_path)
+            content = f.read(stamp[1])
+            digest = self._tail_digest(f, len(content))
+        import pandas as pd
+        columns = pd.read_csv(io.BytesIO(content), nrows=0).columns.tolist()
+        ts_ns, values = _parse(io.BytesIO(content))
+        if len(ts_ns) > 1 and (np.diff(ts_ns) < 0).any():
+            order = np.argsort(ts_ns, kind="stable")
+            ts_ns, values = ts_ns[order], values[order]
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        ts_path, val_path, _ = self._paths(tag)
+        outputs = [(ts_path, ts_ns), (val_path, values)]
+        rollups = {}
+        for seconds in LEVELS:
+            starts, agg = rollup(ts_ns, values, seconds)
+            outputs += list(zip(self._rollup_paths(tag, seconds), (starts, agg)))
+            rollups[str(seconds)] = len(starts)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        for path, arr in outputs:
+            with open(path + suffix, "wb") as f:
+                f.write(np.ascontiguousarray(arr).tobytes())
+            os.replace(path + suffix, path)
+        self._write_meta(tag, {"format": FORMAT, "source": csv_path, "stamp": stamp,
+                               "offset": len(content), "tail": digest, "columns": columns,
+                               "rows": int(len(ts_ns)), "rollups": rollups})
+        logger.info("[TimeseriesStore] %s convertido (%d pontos, %.2fs)", tag, len(ts_ns), time.perf_counter() - started)
+        return len(ts_ns)
+
+    def append(self, tag, meta):
+        """
+        Incorpora só as linhas acrescentadas ao CSV desde a última conversão.
+        Retorna o número de pontos novos, ou None se o arquivo não cresceu só
+        no fim (aí é preciso converter tudo de novo).
+        """
+        started = time.perf_counter()
+        csv_path = self.csv_path(tag)
+        offset = meta["offset"]
+        with open(csv_path, "rb") as f:
+            stamp = self._stamp(csv_path)
+            if stamp[1] < offset or not offset or self._tail_digest(f, offset) != meta["tail"]:
+                return None
+            f.seek(offset - 1)
+            chunk = f.read(stamp[1] - offset + 1)
+        if chunk[:1] != b"\n":
+            return None
+        # só linhas completas; uma linha ainda sendo escrita fica para a próxima leitura
+        chunk = chunk[1:chunk.rfind(b"\n") + 1]
+        ts_ns, values = _parse(io.BytesIO(chunk), names=meta["columns"]) if chunk.strip() else (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+        rows = meta["rows"]
+        ts_path, val_path, _ = self._paths(tag)
+        stored_ts = _map(ts_path, np.int64, rows)
+        if len(ts_ns) and ((rows and ts_ns[0] < stored_ts[-1]) or (np.diff(ts_ns) < 0).any()):
+            return None
+
+        if len(ts_ns):
+            # grava depois da última linha declarada nos metadados (nunca encolhe arquivos mapeados)
+            for path, arr, size in ((ts_path, ts_ns, 8), (val_path, values, 8)):
+                with open(path, "r+b") as f:
+                    f.seek(rows * size)
+                    f.write(arr.tobytes())
+            all_ts = _map(ts_path, np.int64, rows + len(ts_ns))
+            all_values = _map(val_path, np.float64, rows + len(ts_ns))
+            for seconds in LEVELS:
+                # refaz a partir do último bucket existente, que pode ter recebido pontos novos
+                count = meta["rollups"][str(seconds)]
+                ts_file, agg_file = self._rollup_paths(tag, seconds)
+                first = max(count - 1, 0)
+                i = int(np.searchsorted(all_ts, _map(ts_file, np.int64, count)[first], side="left")) if count else 0
+                starts, agg = rollup(all_ts[i:], np.asarray(all_values[i:]), seconds)
+                for path, arr in ((ts_file, starts), (agg_file, agg)):
+                    with open(path, "r+b") as f:
+                        f.seek(first * arr.itemsize * (arr.shape[1] if arr.ndim > 1 else 1))
+                        f.write(np.ascontiguousarray(arr).tobytes())
+                meta["rollups"][str(seconds)] = first + len(starts)
+        with open(csv_path, "rb") as f:
+            meta["tail"] = self._tail_digest(f, offset + len(chunk))
+        meta.update(stamp=stamp, offset=offset + len(chunk), rows=rows + len(ts_ns))
+        self._write_meta(tag, meta)
+        logger.info("[TimeseriesStore] %s: +%d pontos (%.3fs)", tag, len(ts_ns), time.perf_counter() - started)
+        return len(ts_ns)
+
+    def refresh(self, tag):
+        """Atualiza as colunas da tag (incrementalmente quando possível); retorna os metadados."""
+        with self._exclusive(tag):
+            stamp = self._stamp(self.csv_path(tag))
+            meta = self._meta(tag)
+            if meta is not None and meta["stamp"] == stamp:
+                return meta
+            if meta is None or self.append(tag, meta) is None:
+                self.convert(tag)
+            return self._meta(tag)
+
+    # ---------- leitura ----------
+    def has(self, tag):
+        return os.path.exists(self.csv_path(tag))
+
+    def series(self, tag):
+        """Series (mmap) da tag, convertendo o CSV se ainda não foi ou se mudou; None se não há CSV."""
+        try:
+            stamp = self._stamp(self.csv_path(tag))
+        except OSError:
+            return None
+        cached = self._series.get(tag)
+        if cached is not None and cached.source_stamp == stamp:
+            return cached
+        with self._tag_lock(tag):
+            cached = self._series.get(tag)
+            if cached is not None and cached.source_stamp == stamp:
+                return cached
+            meta = self._meta(tag)
+            if meta is None or meta["stamp"] != stamp:
+                meta = self.refresh(tag)
+            ts_path, val_path, _ = self._paths(tag)
+            rollups = {}
+            for seconds in LEVELS:
+                ts_file, agg_file = self._rollup_paths(tag, seconds)
+                count = meta["rollups"][str(seconds)]
+                rollups[seconds] = Rollup(seconds, _map(ts_file, np.int64, count),
+                                          _map(agg_file, np.float64, count, len(AGGREGATES)))
+            series = Series(tag, _map(ts_path, np.int64, meta["rows"]), _map(val_path, np.float64, meta["rows"]),
+                            meta["stamp"], rollups)
+            self._series[tag] = series
+            return series
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def default_store_dir(csv_dir):
+    """Colunas de `csv_dir` sob TIMESERIES_SETTINGS['STORE_DIR'], um subdiretório por diretório de CSVs."""
+    from django.conf import settings
+    root = getattr(settings, "TIMESERIES_SETTINGS", {}).get("STORE_DIR") \
+        or os.path.join(settings.BASE_DIR, "data", "timeseries_store")
+    return os.path.join(root, hashlib.sha1(os.path.abspath(csv_dir).encode()).hexdigest()[:12])
+
+
+def get_timeseries_store(csv_dir, store_dir=None):
+    """Instância compartilhada por diretório de CSVs (sem `store_dir`, em default_store_dir)."""
+    store_dir = store_dir or default_store_dir(csv_dir)
+    key = (os.path.abspath(csv_dir), store_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = TimeseriesStore(csv_dir, store_dir)
+        return store
+
+
+_pools = {}
+
+
+def get_timeseries_pool(workers):
+    """Pool de threads compartilhado para leituras de séries em lote (limitado a `workers`)."""
+    with _stores_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="timeseries")
+        return pool
@@ -0,0 +1,257 @@
+# core/services/timeseries_stream.py
+"""
+Acompanhamento ao vivo dos CSVs do historiador (tail-follow) para SSE.
+
+Cada tag com assinantes tem uma única thread (TagWatcher) que observa o
+mtime/tamanho do `<tag>.csv`. Quando o arquivo muda, o TimeseriesStore lê
+só os bytes acrescentados desde o último offset (ver timeseries_store.py) e
+as linhas novas são entregues a todos os assinantes daquela tag. O custo por
+atualização independe do número de clientes e do tamanho do arquivo.
+
+Se o arquivo foi reescrito (a série deixa de ser um prefixo da anterior),
+acabou de aparecer ou recebeu mais de MAX_EVENT_POINTS linhas de uma vez, os
+assinantes recebem `reset` e devem recarregar a série. Um assinante que não
+consome os eventos a tempo (fila cheia) também recebe `reset`, em vez de
+segurar a memória do processo.
+
+`follow` é o gerador síncrono (WSGI); `follow_async` entrega os mesmos
+eventos a uma view assíncrona (ASGI) sem ocupar uma thread por cliente.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+
+import numpy as np
+
+from .timeseries_store import iso_timestamps, values_to_json
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 1000
+MAX_EVENT_POINTS = 10000
+
+
+class Subscription:
+    """Fila de eventos (evento, dados) de um cliente, possivelmente de várias tags."""
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def push(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except queue.Full:
+            # cliente atrasado: descarta o que está pendente e pede para recarregar
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(("reset", {"tag": data.get("tag"), "reason": "lagging"}))
+
+    def get(self, timeout):
+        """Próximo evento, ou None se nada chegou em `timeout` segundos."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """
+    Subscription para um loop asyncio: o TagWatcher entrega os eventos pelo
+    loop (call_soon_threadsafe) e o cliente espera sem bloquear uma thread.
+    """
+
+    def __init__(self, loop, maxsize=QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event, data):
+        try:
+            self.loop.call_soon_threadsafe(self._push, event, data)
+        except RuntimeError:
+            pass  # loop encerrado; o cancelamento da assinatura vem logo em seguida
+
+    def _push(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+            self.queue.put_nowait(("reset", {"tag": data.get("tag"), "reason": "lagging"}))
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TagWatcher(threading.Thread):
+    """Thread que observa o CSV de uma tag e distribui as linhas novas aos assinantes."""
+
+    def __init__(self, hub, store, tag, interval):
+        super().__init__(name=f"timeseries-watch-{tag}", daemon=True)
+        self.hub = hub
+        self.store = store
+        self.tag = tag
+        self.interval = interval
+        self.subscribers = set()
+        self.stopped = threading.Event()
+        self.stamp = None
+        self.rows = 0
+        self.last_ts = None
+        self._sync()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.store.csv_path(self.tag))
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _sync(self):
+        """Atualiza o store; devolve (série, (início, fim) das linhas novas), com None se a série foi reescrita."""
+        self.stamp = self._stat()
+        series = self.store.series(self.tag) if self.stamp else None
+        rows = len(series) if series is not None else 0
+        appended = rows >= self.rows and (
+            not self.rows or (series is not None and int(series.ts[self.rows - 1]) == self.last_ts))
+        start = self.rows if appended else 0
+        self.rows = rows
+        self.last_ts = int(series.ts[rows - 1]) if rows else None
+        return series, (start, rows) if appended else None
+
+    def snapshot(self):
+        return {"tag": self.tag, "rows": self.rows,
+                "last": iso_timestamps([self.last_ts])[0] if self.last_ts is not None else None}
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            previous = self.stamp
+            if self._stat() == previous:
+                continue
+            try:
+                series, span = self._sync()
+            except Exception as e:
+                logger.warning("[TimeseriesStream] falha ao ler %s: %s", self.tag, e)
+                continue
+            if span is None or previous is None:
+                reason = "created" if previous is None else "rewritten"
+                self.hub.broadcast(self, "reset", {**self.snapshot(), "reason": reason})
+            elif span[1] - span[0] > MAX_EVENT_POINTS:
+                self.hub.broadcast(self, "reset", {**self.snapshot(), "reason": "too_many_points"})
+            elif span[1] > span[0]:
+                i, j = span
+                self.hub.broadcast(self, "points", {
+                    "tag": self.tag,
+                    "rows": j,
+                    "timestamps": iso_timestamps(series.ts[i:j]),
+                    "values": values_to_json(np.asarray(series.values[i:j])),
+                })
+
+
+class StreamHub:
+    """Um TagWatcher por (diretório, tag), compartilhado por todos os assinantes."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._watchers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, store, tag, subscription):
+        """Registra `subscription` na tag; devolve o estado atual (linhas, último timestamp)."""
+        key = (store.store_dir, tag)
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is None or watcher.stopped.is_set():
+                watcher = self._watchers[key] = TagWatcher(self, store, tag, self.interval)
+                watcher.start()
+                logger.info("[TimeseriesStream] observando %s", tag)
+            watcher.subscribers.add(subscription)
+            return watcher.snapshot()
+
+    def unsubscribe(self, store, tag, subscription):
+        key = (store.store_dir, tag)
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is None:
+                return
+            watcher.subscribers.discard(subscription)
+            if not watcher.subscribers:
+                watcher.stopped.set()
+                del self._watchers[key]
+                logger.info("[TimeseriesStream] %s sem assinantes; observador encerrado", tag)
+
+    def broadcast(self, watcher, event, data):
+        with self._lock:
+            subscribers = list(watcher.subscribers)
+        for subscription in subscribers:
+            subscription.push(event, data)
+
+    def stats(self):
+        with self._lock:
+            return {tag: len(w.subscribers) for (_, tag), w in self._watchers.items()}
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_stream_hub(interval=1.0):
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = StreamHub(interval)
+        return _hub
+
+
+def follow(store, tags, heartbeat=15.0, interval=1.0):
+    """
+    Gerador de eventos (evento, dados) para as `tags`: primeiro `ready` com o
+    estado atual de cada tag, depois `points`/`reset` conforme os CSVs mudam,
+    e None a cada `heartbeat` segundos sem eventos. Fechar o gerador cancela
+    a assinatura.
+    """
+    hub = get_stream_hub(interval)
+    subscription = Subscription()
+    subscribed = []
+    try:
+        states = []
+        for tag in tags:
+            states.append(hub.subscribe(store, tag, subscription))
+            subscribed.append(tag)
+        yield "ready", {"tags": states}
+        while True:
+            yield subscription.get(heartbeat)
+    finally:
+        for tag in subscribed:
+            hub.unsubscribe(store, tag, subscription)
+
+
+async def follow_async(store, tags, run, heartbeat=15.0, interval=1.0):
+    """
+    Versão assíncrona de `follow`. `run(fn, *args)` executa fora do loop as
+    chamadas que leem o disco (assinar uma tag abre o CSV pela primeira vez).
+    """
+    hub = get_stream_hub(interval)
+    subscription = AsyncSubscription(asyncio.get_running_loop())
+    subscribed = []
+    try:
+        states = []
+        for tag in tags:
+            states.append(await run(hub.subscribe, store, tag, subscription))
+            subscribed.append(tag)
+        yield "ready", {"tags": states}
+        while True:
+            yield await subscription.get(heartbeat)
+    finally:
+        # unsubscribe só mexe no registro em memória: seguro chamar no loop
+        for tag in subscribed:
+            hub.unsubscribe(store, tag, subscription)
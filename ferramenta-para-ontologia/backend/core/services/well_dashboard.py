@@ -0,0 +1,135 @@
+# core/services/well_dashboard.py
+"""
+Painel de um poço/plataforma numa única requisição: identificador -> tags
+(junções do caso de uso sobre o índice do grafo) -> séries na grade comum
+(OntologyService.get_timeseries_for_tags).
+
+As duas etapas se sobrepõem: enquanto a ontologia é consultada na thread da
+requisição, as séries das tags que o mesmo identificador devolveu da última
+vez já são abertas (e convertidas, se preciso) no pool de séries. Quando a
+resolução termina, só as tags novas ainda precisam ser lidas.
+
+O resultado fica em cache por (identificador, caso de uso, parâmetros,
+janela) e vale enquanto a versão da ontologia e o mtime/tamanho dos CSVs
+das tags forem os mesmos; qualquer edição na ontologia ou linha nova num
+CSV faz a próxima requisição remontar o painel.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .timeseries_store import get_timeseries_pool
+
+logger = logging.getLogger(__name__)
+
+
+def tag_names(results):
+    """Nomes das tags (como nos CSVs) nas linhas devolvidas pelo caso de uso, sem repetição."""
+    names = []
+    for row in results:
+        name = row.get('tag_name') or row.get('file_name')
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def csv_stamps(store, tags):
+    """mtime/tamanho do CSV de cada tag (None se não existe)."""
+    stamps = []
+    for tag in tags:
+        try:
+            st = os.stat(store.csv_path(tag))
+            stamps.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class DashboardCache:
+    """LRU dos painéis montados, validado pela versão da ontologia e pelos CSVs das tags."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._last_tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, store):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        entry_version, tags, stamps, payload = entry
+        if entry_version != version or csv_stamps(store, tags) != stamps:
+            return None
+        return payload
+
+    def put(self, key, version, tags, stamps, payload):
+        with self._lock:
+            self._entries[key] = (version, tags, stamps, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def last_tags(self, identity):
+        return self._last_tags.get(identity, [])
+
+    def remember_tags(self, identity, tags):
+        with self._lock:
+            self._last_tags[identity] = tags
+            while len(self._last_tags) > self.max_entries:
+                self._last_tags.pop(next(iter(self._last_tags)))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_dashboard_cache(max_entries=256):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DashboardCache(max_entries)
+        return _cache
+
+
+def build_dashboard(svc, resolve, query, version, start=None, end=None, max_points=500, workers=8,
+                    max_entries=256):
+    """
+    Monta (ou devolve do cache) o painel de `query` = (identificador, caso de
+    uso, parâmetros da consulta); `version` identifica a versão da ontologia
+    consultada. `resolve()` faz a consulta na ontologia e retorna (payload,
+    status HTTP) no formato da predefined_sparql_view; as séries das tags
+    encontradas vão em payload['timeseries']. Retorna (payload, status).
+    """
+    started = time.perf_counter()
+    cache = get_dashboard_cache(max_entries)
+    store = svc._timeseries_store()
+    key = (query, start, end, max_points)
+    cached = cache.get(key, version, store)
+    if cached is not None:
+        return {**cached, 'cached': True}, 200
+
+    # abre de forma especulativa as séries da última resolução enquanto a ontologia é consultada
+    pool = get_timeseries_pool(workers)
+    prefetch = [pool.submit(store.series, tag) for tag in cache.last_tags(query)]
+    payload, status = resolve()
+    for future in prefetch:
+        try:
+            future.result()
+        except Exception:
+            pass  # a leitura definitiva abaixo reporta o erro em 'errors'
+    if status != 200 or payload.get('status') != 'success':
+        return payload, status
+
+    tags = tag_names(payload.get('results', []))
+    cache.remember_tags(query, tags)
+    stamps = csv_stamps(store, tags)
+    payload = {**payload, 'timeseries': svc.get_timeseries_for_tags(tags, start=start, end=end,
+                                                                     max_points=max_points, workers=workers)}
+    cache.put(key, version, tags, stamps, payload)
+    logger.info("[WellDashboard] %s montado (%d tags, %.3fs)", query[:2], len(tags), time.perf_counter() - started)
+    return {**payload, 'cached': False}, 200
@@ -1,3 +1,983 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import types
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from owlready2 import ObjectProperty, Thing, World
+
+from .services.namespaces import PREFIXES
+from .services.ontology_store import load_ontology, release
+
+BASE = PREFIXES['o3po_merged']
+
+
+def write_small_ontology(path):
+    """RDF/XML com duas classes, uma propriedade e dois indivíduos ligados (namespace o3po_merged)."""
+    world = World()
+    onto = world.get_ontology(BASE.rstrip('#'))
+    with onto:
+        class Well(Thing):
+            pass
+
+        class Sensor(Thing):
+            pass
+
+        class monitors(ObjectProperty):
+            domain = [Sensor]
+            range = [Well]
+
+        well = Well('W1')
+        Sensor('S1', label=['sensor um'], monitors=[well])
+    onto.save(file=path, format='rdfxml')
+    world.close()
+
+
+class OntologyTestCase(SimpleTestCase):
+    """Ontologia pequena aberta pelo quadstore num diretório temporário."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.owl_path = os.path.join(self.dir, 'small.owl')
+        self.store_dir = os.path.join(self.dir, 'quadstore')
+        write_small_ontology(self.owl_path)
+        self.onto = self.open()
+
+    def open(self):
+        onto = load_ontology(self.owl_path, store_dir=self.store_dir)
+        self.addCleanup(release, onto)
+        return onto
+
+
+class OntologyStoreTests(OntologyTestCase):
+    def quadstore(self, objs, datas):
+        import sqlite3
+        db = sqlite3.connect(':memory:')
+        self.addCleanup(db.close)
+        db.execute('CREATE TABLE resources (storid INTEGER, iri TEXT)')
+        db.execute('CREATE TABLE objs (s INTEGER, p INTEGER, o INTEGER)')
+        db.execute('CREATE TABLE datas (s INTEGER, p INTEGER, o, d)')
+        db.executemany('INSERT INTO resources VALUES (?, ?)',
+                       [(300, BASE + 'Well'), (301, BASE + 'p'), (302, BASE + 'q'), (303, BASE + 'W1')])
+        db.executemany('INSERT INTO objs VALUES (?, ?, ?)', objs)
+        db.executemany('INSERT INTO datas VALUES (?, ?, ?, ?)', datas)
+        return db
+
+    def test_axiom_digest_ignores_order_and_blank_node_ids(self):
+        from .services.ontology_store import axiom_digest
+        # W1 p _:a ; _:a q Well ; _:a q _:b ; _:b q W1 ; _:b label "x"
+        objs = [(303, 301, -1), (-1, 302, 300), (-1, 302, -2), (-2, 302, 303)]
+        datas = [(-2, 301, 'x', 0)]
+        renumbered = [(303, 301, -7), (-7, 302, 300), (-7, 302, -5), (-5, 302, 303)]
+        digest = axiom_digest(self.quadstore(objs, datas))
+        self.assertEqual(axiom_digest(self.quadstore(objs[::-1], datas)), digest)
+        self.assertEqual(axiom_digest(self.quadstore(renumbered[::-1], [(-5, 301, 'x', 0)])), digest)
+        self.assertNotEqual(axiom_digest(self.quadstore(objs, [(-2, 301, 'y', 0)])), digest)
+        self.assertNotEqual(axiom_digest(self.quadstore(objs, [(-1, 301, 'x', 0)])), digest)  # outro nó
+
+    def test_open_reuses_compiled_quadstore(self):
+        from .services.ontology_store import OntologyStore, file_sha256
+        store = OntologyStore(self.store_dir)
+        compiled = store.compiled_path(file_sha256(self.owl_path))
+        mtime = os.stat(compiled).st_mtime_ns
+        with mock.patch('owlready2.triplelite.SubGraph.parse', side_effect=AssertionError('parse do RDF/XML')):
+            onto = store.open(self.owl_path)
+        self.addCleanup(release, onto)
+        self.assertIsNot(onto.world, self.onto.world)  # cópia de trabalho própria
+        self.assertIsNotNone(onto.search_one(iri=BASE + 'W1'))
+        self.assertEqual(os.stat(compiled).st_mtime_ns, mtime)
+
+
+class ReasoningJobsTests(OntologyTestCase):
+    def jobs(self):
+        from .services.ontology_store import OntologyStore
+        from .services.reasoning_jobs import ReasoningJobs
+        jobs = ReasoningJobs(OntologyStore(self.store_dir))
+        self.addCleanup(jobs.shutdown)
+        return jobs
+
+    def test_job_runs_in_background_and_swaps_when_ready(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from .services.ontology_store import store_info
+        from .services.reasoning_jobs import STATUS_DONE, STATUS_QUEUED, STATUS_RUNNING, swap_to_inferred
+        jobs = self.jobs()
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        executor = ThreadPoolExecutor(1)  # o job real, numa thread em vez do processo "spawn"
+        self.addCleanup(executor.shutdown)
+        with mock.patch.object(jobs, '_pool', return_value=executor), \
+                mock.patch('owlready2.sync_reasoner', side_effect=lambda *a, **k: gate.wait(5)):
+            status = jobs.submit(self.onto)  # não espera o HermiT
+            key = jobs.key_for(self.onto)
+            self.assertIn(status['status'], (STATUS_QUEUED, STATUS_RUNNING))
+            self.assertIs(swap_to_inferred(self.onto, jobs), self.onto)  # enquanto isso, a versão asserida
+            self.assertIn(jobs.submit(self.onto)['status'], (STATUS_QUEUED, STATUS_RUNNING))  # sem job duplicado
+
+            gate.set()
+            self.assertEqual(jobs.wait(key, 5)['status'], STATUS_DONE)
+        self.assertFalse(os.path.exists(jobs._lock_path(key)))
+        inferred = swap_to_inferred(self.onto, jobs)
+        self.addCleanup(release, inferred)
+        self.assertIsNot(inferred, self.onto)
+        self.assertEqual((store_info(inferred)['inferred'], store_info(inferred)['reasoner_key']), (True, key))
+        self.assertIsNotNone(inferred.search_one(iri=BASE + 'W1'))
+
+
+    def test_same_key_reuses_cached_result(self):
+        from .services.ontology_store import store_info
+        from .services.reasoning_jobs import STATUS_DONE, reasoner_cache_key
+        first = self.jobs()
+        key = first.publish(self.onto)  # resultado de um reasoning feito em processo
+        self.assertEqual(key, reasoner_cache_key(first.store.axiom_digest(store_info(self.onto)['digest'])))
+        self.assertNotEqual(first.key_for(self.onto, infer_property_values=False), key)  # opções entram na chave
+
+        other = self.open()  # mesmo conteúdo, outro mundo (ou outro processo, depois de reiniciar)
+        second = self.jobs()
+        with mock.patch.object(second, '_pool', side_effect=AssertionError('job duplicado')):
+            status = second.submit(other)
+        self.assertEqual(second.key_for(other), key)
+        self.assertEqual(status['status'], STATUS_DONE)
+
+
+class GraphIndexTests(OntologyTestCase):
+    def test_index_matches_world(self):
+        from .services.graph_index import get_graph_index
+        index = get_graph_index(self.onto)
+        well, sensor = index.id(BASE + 'W1'), index.id(BASE + 'S1')
+        monitors = index.id(BASE + 'monitors')
+        self.assertEqual(list(index.objects(sensor, monitors)), [well])
+        self.assertEqual(list(index.subjects_of(monitors, well)), [sensor])
+        self.assertTrue(index.has_type(well, index.id(BASE + 'Well')))
+        self.assertEqual(index.labels['sensor um'], sensor)
+        self.assertEqual(index.by_local['W1'], well)
+        self.assertIs(get_graph_index(self.onto), index)  # mesma versão do mundo: sem reconstrução
+
+    def test_journaled_edit_copies_on_write(self):
+        from .services.change_journal import journaled
+        from .services.graph_index import RDF_TYPE, GraphIndex, get_graph_index
+        old = get_graph_index(self.onto)
+        sensor, well, monitors = old.id(BASE + 'S1'), old.id(BASE + 'W1'), old.id(BASE + 'monitors')
+        with journaled(self.onto, self.owl_path, compact_delay=None, fsync=False), self.onto:
+            self.onto.S1.monitors.append(self.onto.Well('W2'))
+
+        new = get_graph_index(self.onto)
+        self.assertIsNot(new, old)
+        self.assertEqual(new.version, self.onto.world.graph.db.total_changes)
+        well2 = new.id(BASE + 'W2')
+        self.assertEqual(list(new.objects(sensor, monitors)), [well, well2])
+        self.assertTrue(new.has_type(well2, new.id(BASE + 'Well')))
+        # o índice anterior continua como estava, para quem ainda o usa
+        self.assertEqual(list(old.objects(sensor, monitors)), [well])
+        self.assertFalse(old.has_type(well2, old.id(BASE + 'Well')))
+        self.assertNotIn(well2, old.subjects)
+        self.assertIs(new.subjects_of(monitors, well), old.subjects_of(monitors, well))  # não tocada: compartilhada
+
+        def objects(index, s, p):
+            return sorted(index.iri(o) for o in index.objects(index.id(s), index.id(p)))
+
+        rebuilt = GraphIndex(self.onto.world)  # mesmo conteúdo, IDs próprios: compara as IRIs
+        for s, p in ((BASE + 'S1', BASE + 'monitors'), (BASE + 'W2', RDF_TYPE)):
+            self.assertEqual(objects(new, s, p), objects(rebuilt, s, p))
+        self.assertIn(BASE + 'Well', objects(new, BASE + 'W2', RDF_TYPE))
+
+
+class EntityIndexTests(OntologyTestCase):
+    def test_find_matches_search_one(self):
+        from owlready2 import ObjectPropertyClass, ThingClass
+        from .services.entity_index import get_entity_index
+        index = get_entity_index(self.onto)
+        for name in ('W1', 'S1', 'Well', 'monitors', BASE + 'W1', 'sensor um', 'Nada', BASE + 'Nada'):
+            with self.subTest(name=name):
+                expected = self.onto.search_one(iri=f'*{name}') or self.onto.search_one(label=name)
+                self.assertIs(index.find(name), expected)
+        self.assertIs(index.find('monitors', ObjectPropertyClass), self.onto.monitors)
+        self.assertIsNone(index.find('monitors', ThingClass))
+
+    def test_resolve_follows_journaled_edits(self):
+        from owlready2 import destroy_entity
+        from .services.change_journal import journaled
+        from .services.entity_index import get_entity_index, sanitize_local_name
+        index = get_entity_index(self.onto)
+        with journaled(self.onto, self.owl_path, compact_delay=None, fsync=False), self.onto:
+            well = self.onto.Well(sanitize_local_name('Poço 9'), label=['poço nove'])
+        self.assertIs(index.resolve('Poço 9'), well)  # nome original -> nome sanitizado
+        self.assertIs(index.find('poço nove'), well)
+        self.assertIs(index, get_entity_index(self.onto))  # atualizado, não remontado
+
+        with journaled(self.onto), self.onto:
+            destroy_entity(well)
+        self.assertIsNone(index.resolve('Poço 9'))
+        self.assertIsNone(self.onto.search_one(iri='*Poco_9'))
+
+
+class ClassHierarchyTests(SimpleTestCase):
+    def test_descendant_counts_tolerate_subclass_cycles(self):
+        from owlready2.base import rdfs_subclassof
+        from .services.class_hierarchy import ClassHierarchy
+        world = World()
+        self.addCleanup(world.close)
+        onto = world.get_ontology(BASE.rstrip('#'))
+        with onto:
+            classes = {name: types.new_class(name, (Thing,)) for name in 'ABCDEFGH'}
+        # A -> B -> C -> A (ciclo), D e E abaixo de A, G com dois caminhos até H, F acima de B
+        edges = [('B', 'A'), ('C', 'B'), ('A', 'C'), ('D', 'A'), ('E', 'D'), ('E', 'C'),
+                 ('B', 'F'), ('H', 'G'), ('H', 'E')]
+        for child, parent in edges:  # triplas cruas: o Owlready2 recusa o ciclo via is_a
+            onto._add_obj_triple_spo(classes[child].storid, rdfs_subclassof, classes[parent].storid)
+
+        hierarchy = ClassHierarchy(world)
+
+        def descendants(name):  # busca simples, para comparar
+            seen, todo = set(), [name]
+            while todo:
+                node = todo.pop()
+                for child, parent in edges:
+                    if parent == node and child not in seen:
+                        seen.add(child)
+                        todo.append(child)
+            seen.discard(name)
+            return len(seen)
+
+        for name, cls in classes.items():
+            with self.subTest(name=name):
+                node = hierarchy.node(cls.storid)
+                self.assertEqual(node['descendants_count'], descendants(name))
+                self.assertEqual(node['children_count'], sum(1 for _, parent in edges if parent == name))
+        self.assertEqual(hierarchy.node(classes['F'].storid)['descendants_count'], 6)  # B, C, A, D, E, H
+        self.assertEqual(sorted(hierarchy.name[c] for c in hierarchy.roots), ['F', 'G'])
+
+
+class NamespaceAliasTests(OntologyTestCase):
+    def test_aliases_collapse_to_one_term(self):
+        from .services.graph_index import get_graph_index
+        from .services.namespaces import canonical_iri, expand_term
+        self.assertEqual(canonical_iri(PREFIXES['o3po_inferred'] + 'ICV'), PREFIXES['o3po'] + 'ICV')
+        self.assertEqual(expand_term('o3po_merged:ICV'), PREFIXES['o3po'] + 'ICV')
+        self.assertEqual(expand_term('<http://example.org/x#ICV>'), 'http://example.org/x#ICV')
+
+        index = get_graph_index(self.onto)
+        well = index.id(BASE + 'W1')
+        self.assertIsNotNone(well)
+        self.assertEqual(index.id('o3po:W1'), well)
+        self.assertEqual(index.id(PREFIXES['o3po_inferred'] + 'W1'), well)
+        self.assertEqual(index.ids(['o3po:W1', 'o3po_merged:W1', 'o3po:Nada']), [well])
+        self.assertEqual(index.iri(well), BASE + 'W1')  # respostas com a IRI original
+
+
+class ChangeJournalTests(OntologyTestCase):
+    def mutate(self, onto, edit):
+        from .services.change_journal import journaled
+        with journaled(onto, self.owl_path, compact_delay=None, fsync=False) as journal, onto:
+            edit(onto)
+        return journal
+
+    def test_edits_survive_reopen_without_rewriting_owl(self):
+        from .services.ontology_store import store_info
+        with open(self.owl_path, 'rb') as f:
+            before = f.read()
+        journal = self.mutate(self.onto, lambda onto: onto.Well('W2'))
+        self.assertEqual(journal.entries, 1)
+        with open(self.owl_path, 'rb') as f:
+            self.assertEqual(f.read(), before)
+
+        release(self.onto)
+        onto = self.open()
+        self.assertIsNotNone(onto.search_one(iri=BASE + 'W2'))
+        self.assertEqual(store_info(onto)['replayed'], 1)
+
+    def test_compaction_rewrites_owl_and_empties_journal(self):
+        from .services.ontology_store import store_info
+        journal = self.mutate(self.onto, lambda onto: onto.Well('W2'))
+        old_journal = journal.path
+        self.assertIsNotNone(journal.compact())
+        self.assertEqual(journal.entries, 0)
+        self.assertFalse(os.path.exists(old_journal))
+
+        release(self.onto)
+        onto = self.open()
+        self.assertIsNotNone(onto.search_one(iri=BASE + 'W2'))
+        self.assertEqual(store_info(onto)['replayed'], 0)
+
+    def test_mutations_continue_during_compaction(self):
+        import threading
+        from owlready2.namespace import Ontology
+        from .services.ontology_store import store_info
+        journal = self.mutate(self.onto, lambda onto: onto.Well('W2'))
+        save = Ontology.save
+        writer = threading.Thread(target=self.mutate, args=(self.onto, lambda onto: onto.Well('W3')))
+
+        def save_while_editing(onto, *args, **kwargs):
+            save(onto, *args, **kwargs)  # RDF/XML do instante da compactação (sem W3)
+            writer.start()
+            writer.join(5)
+            self.assertFalse(writer.is_alive())  # a mutação não esperou a compactação
+
+        with mock.patch.object(Ontology, 'save', save_while_editing):
+            digest = journal.compact()
+        self.assertEqual(store_info(self.onto)['digest'], digest)
+        self.assertEqual(journal.entries, 1)  # W3 passou para o journal do novo snapshot
+        with open(self.owl_path, encoding='utf-8') as f:
+            owl = f.read()
+        self.assertIn('W2', owl)
+        self.assertNotIn('W3', owl)
+
+        release(self.onto)
+        onto = self.open()
+        self.assertIsNotNone(onto.search_one(iri=BASE + 'W2'))
+        self.assertIsNotNone(onto.search_one(iri=BASE + 'W3'))
+        self.assertEqual(store_info(onto)['replayed'], 1)
+
+    def test_failed_mutation_is_rolled_back(self):
+        def edit(onto):
+            onto.Well('W3')
+            raise ValueError('falhou no meio')
+
+        with self.assertRaises(ValueError):
+            self.mutate(self.onto, edit)
+        from .services.change_journal import get_journal
+        journal = get_journal(self.onto)
+        self.assertEqual((journal.entries, journal.pending()), (0, 0))
+        self.assertIsNone(self.onto.search_one(iri=BASE + 'W3'))
+
+        self.mutate(self.onto, lambda onto: onto.Well('W4'))
+        release(self.onto)
+        onto = self.open()
+        self.assertIsNone(onto.search_one(iri=BASE + 'W3'))
+        self.assertIsNotNone(onto.search_one(iri=BASE + 'W4'))
+
+    def test_destroyed_entity_is_journaled(self):
+        from owlready2 import destroy_entity
+        self.mutate(self.onto, lambda onto: onto.Well('W2'))
+        journal = self.mutate(self.onto, lambda onto: destroy_entity(onto.W2))
+        self.assertEqual(journal.last_change(), [BASE + 'W2'])
+
+        release(self.onto)
+        onto = self.open()
+        self.assertIsNone(onto.search_one(iri=BASE + 'W2'))
+        self.assertIsNotNone(onto.search_one(iri=BASE + 'W1'))
+
+
+@override_settings(ONTOLOGY_STORE_SETTINGS={'ENABLED': True, 'COMPACT_DELAY': None, 'JOURNAL_FSYNC': False})
+class SchemaEditTests(OntologyTestCase):
+    def test_annotation_property_is_created_in_place(self):
+        import json
+        from django.test import RequestFactory
+        from owlready2 import AnnotationPropertyClass
+        from . import views
+        from .services.change_journal import ChangeJournal
+        from .services.entity_index import get_entity_index
+        from .services.ontology_session import OntologySession
+        session = OntologySession(release_grace=3600)
+        session.replace(self.onto, self.owl_path)
+        self.addCleanup(lambda: session.current().view.close())
+        index = get_entity_index(self.onto)
+
+        request = RequestFactory().post('/create-annotation-property/', json.dumps({'name': 'nota', 'domain': ['Well']}),
+                                        content_type='application/json')
+        no_reload = AssertionError('serialização/recarga da ontologia')
+        with mock.patch.object(views, '_session', session), \
+                mock.patch('owlready2.namespace.Ontology.save', side_effect=no_reload), \
+                mock.patch('owlready2.namespace.Ontology.load', side_effect=no_reload), \
+                mock.patch.object(ChangeJournal, 'compact', side_effect=no_reload):
+            response = views.create_annotation_property_view(request)
+        body = json.loads(response.content)
+        self.assertEqual(response.status_code, 200, body)
+        self.assertEqual([p['iri'] for p in body['changes']['annotation_properties']], [BASE + 'nota'])
+
+        self.assertIs(session.current().onto, self.onto)  # mesma ontologia, nova versão publicada
+        self.assertEqual(session.current().version, 2)
+        prop = self.onto.nota
+        self.assertIsInstance(prop, AnnotationPropertyClass)
+        self.assertEqual(prop.domain, [self.onto.Well])
+        self.assertIs(index.find('nota', AnnotationPropertyClass), prop)
+        self.assertIs(get_entity_index(self.onto), index)
+
+
+class ChangeLogTests(OntologyTestCase):
+    def test_mutations_report_changed_entities(self):
+        from .services.change_journal import get_journal, journaled
+        journal = get_journal(self.onto, self.owl_path, compact_delay=None, fsync=False)
+        start = journal.version
+        with journaled(self.onto), self.onto:
+            self.onto.Well('W2')
+        self.assertEqual(journal.version, start + 1)
+        self.assertEqual(journal.last_change(), [BASE + 'W2'])
+        with journaled(self.onto), self.onto:
+            self.onto.S1.label = ['sensor renomeado']
+
+        self.assertEqual(journal.changes_since(start), [BASE + 'W2', BASE + 'S1'])
+        self.assertEqual(journal.changes_since(start + 1), [BASE + 'S1'])
+        self.assertEqual(journal.changes_since(journal.version), [])
+        self.assertIsNone(journal.changes_since(journal.version + 1))  # versão do futuro: recarregar
+
+
+class OntologySessionTests(OntologyTestCase):
+    def test_isolated_read_keeps_its_version(self):
+        from .services.change_journal import journaled
+        from .services.ontology_session import OntologySession
+        session = OntologySession()
+        session.replace(self.onto, self.owl_path)
+        self.addCleanup(lambda: session.current().view.close())
+
+        with session.isolated() as snap:
+            old_view = snap.view
+            self.assertIsNot(snap.onto.world, self.onto.world)
+            with session.write(), journaled(self.onto, self.owl_path, compact_delay=None, fsync=False), self.onto:
+                self.onto.Well('W2')
+            self.assertIsNotNone(self.onto.search_one(iri=BASE + 'W2'))
+            # a edição publicada não aparece na leitura em andamento
+            self.assertIsNone(snap.onto.search_one(iri=BASE + 'W2'))
+            self.assertEqual(sorted(i.name for i in snap.onto.individuals()), ['S1', 'W1'])
+            self.assertEqual(snap.version, session.current().version - 1)
+        self.assertTrue(old_view._closed)  # aposentada e sem leitores: fechada
+
+        with session.isolated() as snap:
+            self.assertIsNot(snap.view, old_view)
+            self.assertIsNotNone(snap.onto.search_one(iri=BASE + 'W2'))
+        self.assertEqual(session.stats()['isolated_reads'], 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                        'LOCATION': 'result-cache-tests'}})
+class ResultCacheTests(OntologyTestCase):
+    def setUp(self):
+        from .services.result_cache import ResultCache
+        super().setUp()
+        self.cache = ResultCache()
+        self.cache.clear()
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        return {'n': self.computed}
+
+    def test_mutation_changes_version_and_misses(self):
+        from .services.change_journal import get_journal, journaled
+        from .services.result_cache import ontology_version
+        get_journal(self.onto, self.owl_path, compact_delay=None, fsync=False)
+        version = lambda: ontology_version(self.onto)
+        before = version()
+        self.assertEqual(self.cache.get_or_compute('lista', version, [], self.compute), ({'n': 1}, False))
+        self.assertEqual(self.cache.get_or_compute('lista', version, [], self.compute), ({'n': 1}, True))
+
+        with journaled(self.onto), self.onto:
+            self.onto.Well('W2')
+        self.assertNotEqual(version(), before)
+        self.assertEqual(self.cache.get_or_compute('lista', version, [], self.compute), ({'n': 2}, False))
+
+    def test_value_computed_across_versions_is_not_stored(self):
+        versions = iter(['v1', 'v2', 'v2', 'v2'])
+        version = lambda: next(versions)
+        self.assertEqual(self.cache.get_or_compute('lista', version, [], self.compute), ({'n': 1}, False))
+        self.assertEqual(self.cache.get_or_compute('lista', version, [], self.compute), ({'n': 2}, False))
+        self.assertEqual(self.cache.stats()['by_kind']['lista']['stores'], 1)  # só o calculado inteiro em v2
+
+    def test_backend_failure_is_a_cache_error(self):
+        from django.core.cache import caches
+        backend = caches['default']
+        with mock.patch.object(backend, 'get', side_effect=ConnectionError('fora do ar')), \
+                mock.patch.object(backend, 'set', side_effect=ConnectionError('fora do ar')):
+            value, hit = self.cache.get_or_compute('lista', lambda: 'v1', [], self.compute)
+        self.assertEqual((value, hit), ({'n': 1}, False))
+        counters = self.cache.stats()['by_kind']['lista']
+        self.assertEqual((counters['errors'], counters['misses'], counters['stores']), (2, 1, 0))
+
+
+class BoundedPoolTests(SimpleTestCase):
+    def test_saturated_pool_rejects_until_tasks_finish(self):
+        import asyncio
+        import threading
+        from django.test import RequestFactory
+        from . import views
+        from .services.executors import BoundedPool, Saturated
+        pool = BoundedPool('teste', max_workers=2, max_queue=1)
+        self.addCleanup(pool._executor.shutdown)
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        futures = [pool.submit(gate.wait, 5) for _ in range(3)]  # 2 rodando + 1 na fila
+        with self.assertRaises(Saturated):
+            pool.submit(gate.wait, 5)
+
+        view = views._offloaded('teste')(lambda request: views.JsonResponse({'status': 'ok'}))
+        with mock.patch.object(views, '_pool', return_value=pool):
+            response = asyncio.run(view(RequestFactory().get('/api/teste/')))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(pool.stats()['rejected'], 2)
+
+        gate.set()
+        self.assertEqual([f.result(5) for f in futures], [True, True, True])
+        for _ in range(500):  # a vaga é devolvida no callback, logo depois do resultado
+            if pool.stats()['pending'] == 0:
+                break
+            time.sleep(0.01)
+        self.assertEqual(pool.submit(lambda: 'ok').result(5), 'ok')  # vagas devolvidas ao terminar
+        stats = pool.stats()
+        self.assertEqual((stats['pending'], stats['completed']), (0, 4))
+
+
+class StartupTests(SimpleTestCase):
+    @override_settings(ONTOLOGY_STORE_SETTINGS={'ENABLED': False}, PREFORK_SETTINGS={'ENABLED': False})
+    def test_ready_does_not_wait_for_in_process_reasoner(self):
+        import threading
+        from django.apps import apps
+        from . import loader
+        from .services.ontology_session import get_ontology_session
+        started, gate = threading.Event(), threading.Event()
+        self.addCleanup(gate.set)
+        svc = types.SimpleNamespace(onto=object(), run_reasoner=lambda: (started.set(), gate.wait(5)))
+        self.addCleanup(setattr, loader, 'ONT_SERVICE', loader.ONT_SERVICE)
+        with mock.patch.dict(os.environ, {'RUN_MAIN': 'true'}), \
+                mock.patch('core.services.ontology_service.OntologyService', return_value=svc):
+            apps.get_app_config('core').ready()  # volta sem esperar o HermiT
+        self.assertIs(loader.ONT_SERVICE, svc)
+        self.assertTrue(started.wait(5))
+        lock = get_ontology_session()._write_lock
+        self.assertFalse(lock.acquire(blocking=False))  # edições esperam o reasoning
+
+        gate.set()
+        self.assertTrue(lock.acquire(timeout=5))
+        lock.release()
+
+
+class PreforkTests(OntologyTestCase):
+    def setUp(self):
+        import gc
+        from .services.ontology_session import OntologySession
+        from .services.prefork import Prefork
+        super().setUp()
+        self.session = OntologySession(release_grace=3600)
+        patcher = mock.patch('core.services.prefork.get_ontology_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(gc.unfreeze)
+        self.prefork = Prefork(self.store_dir, b'chave')
+
+    def publish(self, onto, path):
+        self.session.replace(onto, path)
+        self.addCleanup(release, onto)
+        self.addCleanup(lambda: self.session.current().view.close())
+
+    def test_worker_adopts_master_indexes(self):
+        from .services.class_hierarchy import get_class_hierarchy
+        from .services.entity_index import get_entity_index
+        from .services.graph_index import get_graph_index
+        attached = []
+        self.prefork.preload(self.onto, attached.append)
+        tables = self.prefork._preloaded[0].tables
+        self.prefork.detach()
+        with mock.patch.object(self.prefork, 'is_owner'):
+            self.prefork.attach()
+
+        [onto] = attached
+        self.addCleanup(release, onto)
+        self.assertIsNot(onto.world, self.onto.world)
+        self.assertIs(get_graph_index(onto), tables[0])  # mesmo conteúdo: nada é remontado
+        self.assertIs(get_class_hierarchy(onto), tables[1])
+        self.assertIs(get_entity_index(onto), tables[2])
+        self.assertEqual(get_entity_index(onto).find(BASE + 'W1').iri, BASE + 'W1')
+
+    def test_version_bump_reopens_in_worker(self):
+        import json
+        from .services.change_journal import journaled
+        self.publish(self.onto, self.owl_path)
+        self.prefork.sync()  # sem versão publicada: nada a fazer
+        self.assertIs(self.session.current().onto, self.onto)
+
+        writer = self.open()  # o escritor, em outro processo no modo pre-fork
+        with journaled(writer, self.owl_path, compact_delay=None, fsync=False), writer:
+            writer.Well('W2')
+        with open(self.prefork.version_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'path': self.owl_path}, f)
+
+        self.prefork.sync()
+        snap = self.session.current()
+        self.addCleanup(release, snap.onto)
+        self.assertIsNot(snap.onto, self.onto)
+        self.assertEqual(snap.generation, 2)
+        self.assertIsNotNone(snap.onto.search_one(iri=BASE + 'W2'))  # o journal foi reaplicado
+
+        self.prefork.sync()  # mesma versão: não reabre de novo
+        self.assertIs(self.session.current(), snap)
+
+
+class TimeseriesTestCase(SimpleTestCase):
+    """CSVs de séries num diretório temporário e um TimeseriesStore sobre ele."""
+
+    def setUp(self):
+        from .services.timeseries_store import TimeseriesStore
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.store = TimeseriesStore(self.dir, os.path.join(self.dir, 'columnar'))
+
+    def write(self, tag, lines, mode='w'):
+        with open(os.path.join(self.dir, f'{tag}.csv'), mode, encoding='utf-8') as f:
+            if mode == 'w':
+                f.write('timestamp,value\n')
+            f.write(''.join(f'{line}\n' for line in lines))
+
+
+class TimeseriesStoreTests(TimeseriesTestCase):
+    def test_csv_becomes_columns_and_appends_incrementally(self):
+        from .services.timeseries_store import TimeseriesStore, to_epoch_ns
+        self.write('T1', ['2024-01-01T00:00:00Z,1.5', 'lixo,2', '2024-01-01T00:01:00Z,', '2024-01-01T00:02:00Z,3'])
+        series = self.store.series('T1')
+        self.assertEqual(len(series), 3)  # timestamp inválido descartado
+        self.assertEqual(series.ts[0], to_epoch_ns('2024-01-01T00:00:00Z'))
+        np.testing.assert_array_equal(series.values, [1.5, np.nan, 3.0])
+        self.assertIs(self.store.series('T1'), series)  # CSV inalterado: mesmo mmap
+
+        self.write('T1', ['2024-01-01T00:03:00Z,4', '2024-01-01T01:00:00Z,5'], mode='a')
+        meta = self.store._meta('T1')
+        with mock.patch.object(self.store, 'convert', wraps=self.store.convert) as convert:
+            grown = self.store.series('T1')
+        convert.assert_not_called()  # só as linhas novas foram lidas
+        self.assertEqual(len(grown), 5)
+        self.assertGreater(self.store._meta('T1')['offset'], meta['offset'])
+
+        # o incremental tem que dar o mesmo que converter do zero
+        fresh = TimeseriesStore(self.dir, os.path.join(self.dir, 'fresh')).series('T1')
+        np.testing.assert_array_equal(grown.ts, fresh.ts)
+        np.testing.assert_array_equal(grown.values, fresh.values)
+
+    def test_default_store_dir_is_outside_the_csv_dir(self):
+        from .services.timeseries_store import get_timeseries_store
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        self.write('T1', ['2024-01-01T00:00:00Z,1.5'])
+        with override_settings(TIMESERIES_SETTINGS={'STORE_DIR': root}):
+            store = get_timeseries_store(self.dir)
+        self.assertEqual(len(store.series('T1')), 1)
+        self.assertEqual(os.path.dirname(store.store_dir), root)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['T1.csv'])  # o diretório do historiador só é lido
+
+
+class TimeseriesBatchTests(TimeseriesTestCase):
+    def setUp(self):
+        from .services.ontology_service import OntologyService
+        super().setUp()
+        self.write('T1', [f'2024-01-01T00:{m:02d}:00Z,{m}' for m in range(10)])
+        self.write('T2', [f'2024-01-01T00:{m:02d}:30Z,{10 * m}' for m in range(5, 10)])
+        self.svc = OntologyService(owl_path=os.path.join(self.dir, 'nenhuma.owl'))
+        patcher = mock.patch.object(self.svc, '_timeseries_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_tags_add_well_tags(self):
+        from .views import _batch_tags
+        info = [{'tag': 'T2', 'icv': 'ICV_1'}]
+        with mock.patch.object(self.svc, 'get_icv_annular_pressure_tags_for_well', return_value=info) as tags_for:
+            names, tag_info, error = _batch_tags(self.svc, ['T1', ' ', BASE + 'T1'], BASE + 'P1')
+        tags_for.assert_called_once_with('P1')
+        self.assertEqual((names, tag_info, error), (['T1', 'T1', 'T2'], info, None))
+
+        names, _, error = _batch_tags(self.svc, ['T1', '..'], None)
+        self.assertIsNone(names)
+        self.assertEqual(error.status_code, 400)
+
+    def test_series_share_one_time_axis(self):
+        data = self.svc.get_timeseries_for_tags(['T1', 'T2', 'T1', 'T9'], start='2024-01-01T00:00:00Z',
+                                                end='2024-01-01T00:09:59Z', max_points=5, workers=2)
+        self.assertEqual(data['tags'], ['T1', 'T2', 'T9'])
+        self.assertEqual(data['timestamps'], [f'2024-01-01T00:{m:02d}:00' for m in range(0, 10, 2)])
+        self.assertEqual(data['step_seconds'], 120)
+        self.assertEqual(data['series']['T1'], [0.5, 2.5, 4.5, 6.5, 8.5])  # média de cada intervalo
+        self.assertEqual(data['series']['T2'], [None, None, 50.0, 65.0, 85.0])  # começa depois: NaN -> null
+        self.assertEqual((data['missing'], data['series']['T9']), (['T9'], None))
+
+
+class TimeseriesStreamTests(TimeseriesTestCase):
+    def setUp(self):
+        from .services.timeseries_stream import StreamHub, Subscription
+        super().setUp()
+        self.write('T1', ['2024-01-01T00:00:00Z,1', '2024-01-01T00:01:00Z,2'])
+        self.hub = StreamHub(interval=0.01)
+        self.subscription = Subscription()
+        self.state = self.hub.subscribe(self.store, 'T1', self.subscription)
+        self.watcher = self.hub._watchers[(self.store.store_dir, 'T1')]
+        self.addCleanup(self.hub.unsubscribe, self.store, 'T1', self.subscription)
+
+    def test_append_sends_only_new_points(self):
+        self.assertEqual((self.state['rows'], self.state['last']), (2, '2024-01-01T00:01:00'))
+        self.write('T1', ['2024-01-01T00:02:00Z,3', '2024-01-01T00:03:00Z,4'], mode='a')
+        event, data = self.subscription.get(5)
+        self.assertEqual(event, 'points')
+        self.assertEqual(data['rows'], 4)
+        self.assertEqual(data['timestamps'], ['2024-01-01T00:02:00', '2024-01-01T00:03:00'])
+        self.assertEqual(data['values'], [3.0, 4.0])
+        self.assertIsNone(self.subscription.get(0.1))  # um evento por mudança
+
+    def test_rewrite_sends_reset(self):
+        self.write('T1', ['2023-06-01T00:00:00Z,7', '2023-06-01T00:01:00Z,8', '2023-06-01T00:02:00Z,9'])
+        event, data = self.subscription.get(5)
+        self.assertEqual((event, data['reason'], data['rows']), ('reset', 'rewritten', 3))
+
+    def test_full_queue_asks_client_to_reload(self):
+        from .services.timeseries_stream import Subscription
+        subscription = Subscription(maxsize=2)
+        for i in range(3):
+            subscription.push('points', {'tag': 'T1', 'rows': i})
+        self.assertEqual(subscription.get(0), ('reset', {'tag': 'T1', 'reason': 'lagging'}))
+        self.assertIsNone(subscription.get(0))  # o que estava pendente foi descartado
+
+    def test_last_unsubscribe_stops_watcher(self):
+        from .services.timeseries_stream import Subscription
+        other = Subscription()
+        self.hub.subscribe(self.store, 'T1', other)
+        self.assertIs(self.hub._watchers[(self.store.store_dir, 'T1')], self.watcher)  # um observador por tag
+        self.hub.unsubscribe(self.store, 'T1', other)
+        self.assertFalse(self.watcher.stopped.is_set())
+
+        self.hub.unsubscribe(self.store, 'T1', self.subscription)
+        self.watcher.join(5)
+        self.assertFalse(self.watcher.is_alive())
+        self.assertEqual(self.hub.stats(), {})
+
+
+class DownsamplingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(12)
+        self.x = np.arange(10_000, dtype=np.int64) * 60
+        self.y = np.cumsum(rng.normal(size=len(self.x)))
+        self.y[[500, 7000]] = [80.0, -80.0]   # picos que não podem sumir
+        self.y[2000:2010] = np.nan        # lacuna menor que um bucket: sempre há um ponto válido
+
+    def test_exactly_n_sorted_indices(self):
+        from .services.downsampling import MODES, downsample
+        for mode in MODES:
+            for n in (2, 3, 101, 500):
+                idx = downsample(self.x, self.y, n, mode)
+                self.assertEqual(len(idx), n, (mode, n))
+                self.assertTrue((np.diff(idx) > 0).all(), (mode, n))
+                self.assertTrue(0 <= idx[0] and idx[-1] < len(self.x))
+
+    def test_endpoints_and_extremes_are_kept(self):
+        from .services.downsampling import downsample
+        idx = downsample(self.x, self.y, 500, 'lttb')
+        self.assertEqual((idx[0], idx[-1]), (0, len(self.x) - 1))
+        self.assertTrue({500, 7000} <= set(idx.tolist()))
+        self.assertFalse(np.isnan(self.y[idx]).any())
+
+        idx = downsample(self.x, self.y, 500, 'minmax')
+        self.assertTrue({500, 7000} <= set(idx.tolist()))
+
+        idx = downsample(self.x, self.y, 500, 'tail')
+        np.testing.assert_array_equal(idx, np.arange(len(self.x) - 500, len(self.x)))
+
+    @staticmethod
+    def sequential_lttb(x, y, n):
+        """LTTB bucket a bucket; buckets só com ausentes não mudam a âncora."""
+        x = np.asarray(x, dtype=np.float64) - x[0]
+        edges = 1 + np.linspace(0, len(x) - 2, n - 1).astype(np.int64)
+        out = [0]
+        ax, ay = x[0], y[~np.isnan(y)][0]
+        for k in range(n - 2):
+            lo, hi = edges[k], edges[k + 1]
+            if np.isnan(y[lo:hi]).all():
+                out.append(lo)
+                continue
+            if k + 1 < n - 2:
+                nxt = slice(edges[k + 1], edges[k + 2])
+                cx = x[nxt].mean()
+                cy = np.nanmean(y[nxt]) if not np.isnan(y[nxt]).all() else ay
+            else:
+                cx, cy = x[-1], y[-1] if not np.isnan(y[-1]) else ay
+            area = np.abs((ax - cx) * y[lo:hi] + (cy - ay) * x[lo:hi] + (cx * ay - ax * cy))
+            j = lo + int(np.nanargmax(area))
+            out.append(j)
+            ax, ay = x[j], y[j]
+        return np.array(out + [len(x) - 1])
+
+    def test_lttb_carries_anchor_across_empty_buckets(self):
+        from .services.downsampling import lttb
+        y = self.y.copy()
+        y[3000:3300] = np.nan             # buckets inteiros só com ausentes
+        for n in (11, 101, 201, 1001):
+            idx = lttb(self.x, y, n)
+            self.assertEqual(len(idx), n)
+            self.assertTrue((np.diff(idx) > 0).all())
+            np.testing.assert_array_equal(idx, self.sequential_lttb(self.x, y, n), n)
+
+    def test_short_series_and_unknown_mode(self):
+        from .services.downsampling import downsample
+        np.testing.assert_array_equal(downsample(self.x[:10], self.y[:10], 500), np.arange(10))
+        with self.assertRaises(ValueError):
+            downsample(self.x, self.y, 10, 'media')
+
+
+class RollupTests(TimeseriesTestCase):
+    @staticmethod
+    def brute_force(ts, values, seconds):
+        """{início do bucket: [min, max, soma, contagem, último]} ponto a ponto."""
+        width = seconds * 1_000_000_000
+        buckets = {}
+        for t, v in zip(ts.tolist(), values.tolist()):
+            if np.isnan(v):
+                continue
+            start = t // width * width
+            b = buckets.setdefault(start, [v, v, 0.0, 0, v])
+            b[0], b[1] = min(b[0], v), max(b[1], v)
+            b[2] += v
+            b[3] += 1
+            b[4] = v
+        return buckets
+
+    def lines(self, ts, values):
+        stamps = np.datetime_as_string(ts.view('datetime64[ns]'), unit='s')
+        return [f'{t}Z,{"" if np.isnan(v) else repr(v)}' for t, v in zip(stamps, values.tolist())]
+
+    def assert_levels_match(self, series):
+        from .services.timeseries_store import LEVELS
+        for seconds in LEVELS:
+            expected = self.brute_force(np.asarray(series.ts), np.asarray(series.values), seconds)
+            level = series.rollups[seconds]
+            np.testing.assert_array_equal(level.ts, sorted(expected))
+            np.testing.assert_allclose(level.agg, [expected[t] for t in sorted(expected)], rtol=1e-12)
+
+    def test_levels_match_brute_force_after_append(self):
+        rng = np.random.default_rng(3)
+        start = np.datetime64('2024-03-01T00:00:00', 'ns').astype(np.int64)
+        ts = start + np.cumsum(rng.integers(1, 900, size=3000)) * 1_000_000_000
+        values = np.round(rng.normal(50, 10, size=len(ts)), 3)
+        values[rng.choice(len(ts), 100, replace=False)] = np.nan
+        self.write('T2', self.lines(ts[:2000], values[:2000]))
+        self.assert_levels_match(self.store.series('T2'))
+
+        # o incremental recalcula a partir do último bucket de cada nível
+        self.write('T2', self.lines(ts[2000:], values[2000:]), mode='a')
+        series = self.store.series('T2')
+        self.assertEqual(len(series), len(ts))
+        self.assert_levels_match(series)
+
+    def test_resolve_uses_coarsest_level_with_enough_points(self):
+        start = np.datetime64('2024-01-01T00:00:00', 'ns').astype(np.int64)
+        ts = start + np.arange(0, 10 * 86400, 30) * 1_000_000_000   # 10 dias a cada 30 s
+        self.write('T3', self.lines(ts, np.ones(len(ts))))
+        series = self.store.series('T3')
+        level, i, j, raw = series.resolve(max_points=100)
+        self.assertEqual((level.name, j - i, raw), ('1h', 240, len(ts)))
+        level, i, j, raw = series.resolve(max_points=1000)
+        self.assertEqual(level.name, '1min')
+        self.assertIsNone(series.resolve(max_points=len(ts))[0])   # cabe nos pontos brutos
+
+
+class TimeseriesAnalyticsTests(SimpleTestCase):
+    def test_correlation_matches_corrcoef_on_paired_values(self):
+        from .services.timeseries_analytics import correlation
+        rng = np.random.default_rng(7)
+        matrix = rng.normal(size=(4, 200))
+        matrix[1] += 2 * matrix[0]
+        matrix[2] = -matrix[0] * 3 + 1
+        for row, missing in enumerate((0.1, 0.3, 0.0, 0.5)):
+            matrix[row, rng.random(200) < missing] = np.nan
+        matrix[3, :198] = np.nan  # só 2 intervalos com valor: poucos pares
+
+        corr, paired = correlation(matrix)
+        for i in range(3):
+            for j in range(3):
+                both = ~np.isnan(matrix[i]) & ~np.isnan(matrix[j])
+                self.assertEqual(paired[i, j], both.sum())
+                expected = np.corrcoef(matrix[i, both], matrix[j, both])[0, 1]
+                self.assertAlmostEqual(corr[i, j], expected, places=9)
+        self.assertAlmostEqual(corr[0, 2], -1.0, places=9)
+        self.assertTrue(np.isnan(corr[3]).all())
+        self.assertTrue(np.isnan(correlation(np.array([[1.0, 1.0, 1.0, 1.0], [1.0, 2.0, 3.0, 4.0]]))[0][0, 1]))
+
+
+class SyntheticTimeseriesTests(SimpleTestCase):
+    def test_values_depend_only_on_tag_and_timestamp(self):
+        from .services.synthetic_timeseries import NS, synthetic_series, synthetic_values
+        start = np.datetime64('2024-01-01T00:00:00', 'ns').astype(np.int64)
+        day = 86400 * NS
+        ts, values = synthetic_series('PT-101', start, start + 7 * day, step_seconds=60)
+        np.testing.assert_array_equal(values, synthetic_values('PT-101', ts))
+        # outra janela e outra resolução: os instantes em comum têm os mesmos valores
+        hourly, hourly_values = synthetic_series('PT-101', start + day, start + 3 * day, step_seconds=3600)
+        np.testing.assert_array_equal(hourly_values, values[np.searchsorted(ts, hourly)])
+        self.assertFalse(np.allclose(values, synthetic_values('PT-102', ts)))
+        self.assertTrue(np.isfinite(values).all())
+
+    def test_generated_csvs_are_reproducible(self):
+        from django.core.management import call_command
+        from .services.synthetic_timeseries import synthetic_values
+        from .services.timeseries_store import TimeseriesStore
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        contents = []
+        for run in ('a', 'b'):
+            out = os.path.join(root, run)
+            call_command('generate_timeseries', out=out, tags=['PT-101', 'TT-7'], start='2024-01-01',
+                         end='2024-01-02', step=600, stdout=io.StringIO())
+            with open(os.path.join(out, 'PT-101.csv'), 'rb') as f:
+                contents.append(f.read())
+        self.assertEqual(contents[0], contents[1])
+
+        series = TimeseriesStore(os.path.join(root, 'a'), os.path.join(root, 'columnar')).series('PT-101')
+        self.assertEqual(len(series), 24 * 6 + 1)
+        np.testing.assert_allclose(series.values, synthetic_values('PT-101', np.asarray(series.ts)), rtol=1e-5)
+
+
+class SparqlEngineTests(OntologyTestCase):
+    def setUp(self):
+        from .services.sparql_engine import SparqlEngine
+        super().setUp()
+        self.engine = SparqlEngine()
+        self.world = self.onto.world
+
+    def run_query(self, query, **kwargs):
+        prepared, used, rows = self.engine.execute(self.world, query, **kwargs)
+        return used, list(rows)
+
+    def test_native_and_rdflib_agree(self):
+        query = 'SELECT ?s WHERE { ?s o3po_merged:monitors ??1 }'
+        native = self.run_query(query, params=['o3po_merged:W1'])
+        rdflib = self.run_query(query, params=['o3po_merged:W1'], engine='rdflib')
+        self.assertEqual(native, ('native', [[{'type': 'uri', 'value': BASE + 'S1'}]]))
+        self.assertEqual(rdflib, ('rdflib', native[1]))
+        self.assertEqual(set(self.engine.stats()[self.engine.prepare(self.world, query).fingerprint]),
+                         {'query', 'form', 'default_engine', 'native_error', 'prepare_ms', 'native', 'rdflib'})
+
+    def test_falls_back_to_rdflib(self):
+        from .services.sparql_engine import SparqlError
+        used, rows = self.run_query('ASK { ?s o3po_merged:monitors o3po_merged:W1 }')
+        self.assertEqual((used, rows), ('rdflib', [[{'type': 'boolean', 'value': True}]]))
+        # IRI fora da ontologia: o nativo não consegue ligar o parâmetro
+        used, rows = self.run_query('SELECT ?s WHERE { ?s o3po_merged:monitors ??1 }', params=['o3po_merged:W9'])
+        self.assertEqual((used, rows), ('rdflib', []))
+        with self.assertRaises(SparqlError):
+            self.run_query('SELECT ?s WHERE { ?s o3po_merged:monitors ??1 }', params=['o3po_merged:W9'],
+                           engine='native')
+        with self.assertRaises(SparqlError):
+            self.run_query('SELEC ?s')
+
+    def test_deadline_interrupts_and_releases_edits(self):
+        import time
+        from .services import ontology_session
+        from .services.sparql_engine import SparqlTimeout
+        endless = 'SELECT (COUNT(*) AS ?n) WHERE { %s }' % ' . '.join(f'?s{i} ?p{i} ?o{i}' for i in range(8))
+        started = time.monotonic()
+        with self.assertRaises(SparqlTimeout):
+            self.run_query(endless, deadline=time.monotonic() + 0.2)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertFalse(ontology_session._held.get(self.world))  # mutações não ficam bloqueadas
+
+    def test_query_interrupted_by_another_resumes(self):
+        import threading
+        from .services.sparql_engine import _interrupt_connection
+        query = 'SELECT (COUNT(*) AS ?n) WHERE { ?a ?p ?b . ?c ?q ?d . ?e ?r ?f . ?g ?s ?h }'
+        expected = self.run_query(query, engine='native')[1]
+        # interrupções de outra consulta durante uma execução lenta (rdflib) sem prazo próprio
+        timers = [threading.Timer(delay, _interrupt_connection, (self.world,)) for delay in (0.1, 0.2, 0.4, 0.8)]
+        for timer in timers:
+            timer.start()
+        try:
+            self.assertEqual(self.run_query(query, engine='rdflib'), ('rdflib', expected))
+        finally:
+            for timer in timers:
+                timer.cancel()
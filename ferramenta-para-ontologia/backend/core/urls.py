@@ -11,6 +11,18 @@ from .views import (
     create_annotation_property_view,
     current_ontology_view,
     predefined_sparql_view,
+    sparql_query_view,
+    reasoning_status_view,
+    compact_ontology_view,
+    changes_view,
+    dl_cache_stats_view,
+    clear_dl_cache_view,
+    class_hierarchy_view,
+    timeseries_view,
+    timeseries_batch_view,
+    timeseries_analytics_view,
+    well_dashboard_view,
+    timeseries_stream_view,
 )
 
 urlpatterns = [
@@ -29,6 +41,18 @@ urlpatterns = [
 
     # URLs para os casos de uso
     path('api/predefined-sparql/<str:use_case>/', predefined_sparql_view, name='predefined_sparql'),
+    path('api/sparql-query/', sparql_query_view, name='sparql_query'),
     path('api/current-ontology/', current_ontology_view, name='current_ontology'),
+    path('api/reasoning-status/', reasoning_status_view, name='reasoning_status'),
+    path('api/compact-ontology/', compact_ontology_view, name='compact_ontology'),
+    path('api/changes/', changes_view, name='changes'),
+    path('api/dl-cache-stats/', dl_cache_stats_view, name='dl_cache_stats'),
+    path('api/clear-dl-cache/', clear_dl_cache_view, name='clear_dl_cache'),
+    path('api/class-hierarchy/', class_hierarchy_view, name='class_hierarchy'),
+    path('api/timeseries/', timeseries_view, name='timeseries'),
+    path('api/timeseries/batch/', timeseries_batch_view, name='timeseries_batch'),
+    path('api/timeseries/analytics/', timeseries_analytics_view, name='timeseries_analytics'),
+    path('api/timeseries/stream/', timeseries_stream_view, name='timeseries_stream'),
+    path('api/well-dashboard/<str:use_case>/', well_dashboard_view, name='well_dashboard'),
 
 ]
\ No newline at end of file
@@ -1,85 +1,48 @@
 from django.conf import settings
-from django.http import JsonResponse, FileResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from owlready2 import *
-import re
-from owlready2 import get_ontology
-from owlready2 import ObjectPropertyClass as ObjectProperty 
-import os, traceback, json, types, re, logging, datetime
+from owlready2 import (
+    And, AnnotationProperty, AnnotationPropertyClass, DataProperty, DataPropertyClass, FunctionalProperty,
+    ObjectProperty, ObjectPropertyClass, Or, SymmetricProperty, Thing, ThingClass, TransitiveProperty,
+    locstr, normstr,
+)
+import os, traceback, json, types, re, logging, datetime, functools, time, unicodedata, contextlib
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 logger = logging.getLogger(__name__)
 from types import new_class
-from owlready2 import (
-    Thing, ObjectPropertyClass, DataPropertyClass,
-    AnnotationPropertyClass, FunctionalProperty, ObjectProperty,
-    TransitiveProperty, SymmetricProperty, 
-    Or, And, Not, Thing, ObjectPropertyClass, DataPropertyClass, 
-    AnnotationPropertyClass, DataProperty, normstr, locstr
+from . import loader
+from .services.ontology_store import file_sha256, get_store, load_ontology, ontology_digest, store_info
+from .services.change_journal import discard_journal, existing_journal, get_journal, journaled
+from .services.reasoning_jobs import get_jobs, swap_to_inferred
+from .services.graph_index import get_graph_index
+from .services.namespaces import PREFIXES, expand_term
+from .services.entity_index import get_entity_index, sanitize_local_name
+from .services.class_hierarchy import get_class_hierarchy
+from .services.executors import Saturated, get_pool
+from .services.ontology_session import get_ontology_session
+from .services.result_cache import get_result_cache, ontology_version
+from .services.sparql_engine import SparqlError, SparqlTimeout, get_sparql_engine
+from .services.sparql_results import (
+    FORMATS as SPARQL_FORMATS, CursorError, Page as SparqlPage, accepted_format as accepted_sparql_format, flat,
+    make_cursor, read_cursor, stream_ndjson, stream_sparql_json,
 )
 
 
 # --- utilidades para resolver / sanitizar nomes/IRIs -------------------
 
 
-def sanitize_local_name(name: str) -> str:
-    """
-    Gera um identificador RDF/Python-safe a partir de uma string.
-    Ex.: "Poço Produção #1" -> "Poco_Producao_1"
-    Mantém só ASCII, letras/dígitos/underscore, e garante não começar com dígito.
-    """
-    if name is None:
-        return None
-    # normalize: remove acentos
-    import unicodedata
-    s = unicodedata.normalize("NFKD", name).encode("ASCII", "ignore").decode("ASCII")
-    # keep letters/numbers/underscore
-    s = re.sub(r'[^0-9A-Za-z_]+', '_', s).strip('_')
-    # ensure it does not begin with digit
-    if re.match(r'^[0-9]', s):
-        s = f"n_{s}"
-    if not s:
-        s = "entity"
-    return s
-
 def resolve_individual(onto, identifier: str):
     """
     Tenta localizar um indivíduo pela (1) IRI exata, (2) local name no fim do IRI,
-    (3) label (rdfs:label), (4) atributo .name exato, (5) sanitizado.
+    (3) label (rdfs:label), (4) sanitizado — tudo via índice de entidades
+    (services/entity_index.py), sem varrer a ontologia.
     Retorna o indivíduo Owlready2 ou None.
     """
     if identifier is None:
         return None
-
-    # 1) se é IRI completo
-    if identifier.startswith("http://") or identifier.startswith("https://") or identifier.startswith("urn:"):
-        ind = onto.search_one(iri=identifier)
-        if ind:
-            return ind
-
-    # 2) busca por IRI terminado com local name (wildcard)
-    ind = onto.search_one(iri=f"*{identifier}")
-    if ind:
-        return ind
-
-    # 3) busca por rdfs:label
-    ind = onto.search_one(label=identifier)
-    if ind:
-        return ind
-
-    # 4) busca por name exato (o nome do atributo Python)
-    try:
-        ind = getattr(onto, identifier)
-        if ind:
-            return ind
-    except Exception:
-        pass
-
-    # 5) tentar buscar com sanitizado (caso tenha sido salvo com sanitized name)
-    sanitized = sanitize_local_name(identifier)
-    ind = onto.search_one(iri=f"*{sanitized}") or onto.search_one(label=sanitized) or (getattr(onto, sanitized, None))
-    if ind:
-        return ind
-
-    return None
+    return get_entity_index(onto).resolve(identifier)
 
 
 def individual_to_dict(ind):
@@ -118,22 +81,176 @@ def individual_to_dict(ind):
         "properties": props
     }
 
-onto_path = ""
-onto = None
-
-def build_entity_hierarchy(entity):
-    def get_all_subclasses(entity):
-        subs = []
-        for sub in sorted(entity.subclasses(), key=lambda x: x.name or ""):
-            subs.append({
-                'name': sub.name,
-                'children': get_all_subclasses(sub)
-            })
-        return subs
-    return {
-        'name': entity.name,
-        'children': get_all_subclasses(entity)
-    }
+# ontologia atual: snapshot publicado pela sessão (services/ontology_session.py).
+# Cada view fixa o snapshot no início e usa só ele; as views de escrita rodam
+# inteiras na seção de escrita (@_writes), uma por vez.
+_session = get_ontology_session()
+
+def _current():
+    """(onto, onto_path) do snapshot publicado agora."""
+    return tuple(_session.current())
+
+def _writes(view):
+    """Views que alteram ou trocam a ontologia: exclusão mútua entre escritores; leitores não esperam."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with _session.write():
+            return view(request, *args, **kwargs)
+    wrapper.ontology_write = True  # no modo pre-fork, executada só no worker escritor (core/middleware.py)
+    return wrapper
+
+def _store_dir():
+    """Diretório do quadstore persistente (None = parse direto do RDF/XML)."""
+    cfg = getattr(settings, "ONTOLOGY_STORE_SETTINGS", {})
+    return cfg.get("DIR") if cfg.get("ENABLED", True) else None
+
+def _reasoning_jobs():
+    store_dir = _store_dir()
+    if not store_dir:
+        return None
+    dl_cfg = getattr(settings, "DL_QUERY_SETTINGS", {})
+    hermit_cfg = getattr(settings, "HERMIT_SETTINGS", {})
+    return get_jobs(store_dir, max_workers=dl_cfg.get("REASONER_WORKERS", 1),
+                    java_memory=hermit_cfg.get("java_heap_size"))
+
+def _journal_options():
+    cfg = getattr(settings, "ONTOLOGY_STORE_SETTINGS", {})
+    return {'compact_delay': cfg.get('COMPACT_DELAY', 10), 'fsync': cfg.get('JOURNAL_FSYNC', True)}
+
+def _close_journal(ontology, new_path=None):
+    """Encerra o journal da ontologia que está saindo; compacta, a menos que o arquivo vá ser sobrescrito."""
+    journal = existing_journal(ontology) if ontology is not None else None
+    if journal is not None:
+        same_file = bool(new_path) and os.path.abspath(new_path) == os.path.abspath(journal.owl_path or '')
+        journal.close(compact=not same_file)
+
+def _schedule_reasoning(ontology):
+    """Agenda o HermiT em segundo plano para `ontology`; retorna o status do job (ou None)."""
+    jobs = _reasoning_jobs()
+    if jobs is None or not getattr(settings, "DL_QUERY_SETTINGS", {}).get("ENABLE_REASONING", True):
+        return None
+    try:
+        return jobs.submit(ontology)
+    except Exception as e:
+        logger.warning("Não foi possível agendar o reasoning: %s", e)
+        return {'status': 'failed', 'error': str(e)}
+
+def _refresh_inferred():
+    """
+    Publica o snapshot inferido assim que o reasoning em segundo plano
+    terminar (se nenhum escritor estiver ativo); devolve o snapshot atual.
+    """
+    jobs = _reasoning_jobs()
+    snap = _session.current()
+    if snap.onto is not None and jobs is not None:
+        snap = _session.try_replace(lambda s: swap_to_inferred(s.onto, jobs) if s.onto is not None else s.onto)
+    return snap
+
+def _load_pending():
+    """Carrega `onto_path` se ainda não há ontologia em memória (dentro de @_writes)."""
+    onto, onto_path = _current()
+    if onto is None and onto_path:
+        onto = _session.replace(load_ontology(onto_path, store_dir=_store_dir()), onto_path).onto
+    return onto, onto_path
+
+def _ontology_version(onto, onto_path):
+    """Versão de `onto` igual em todos os workers que servem o mesmo conteúdo (cache e cursores)."""
+    get_journal(onto, onto_path, **_journal_options())
+    return ontology_version(onto)
+
+def _stamp(onto, onto_path):
+    """Rótulo de cada snapshot publicado pela sessão: (versão do cache, versão do journal)."""
+    return _ontology_version(onto, onto_path), get_journal(onto, onto_path, **_journal_options()).version
+
+_session.stamp = _stamp
+
+def _published_version():
+    snap = _session.current()
+    return _ontology_version(snap.onto, snap.path) if snap.onto is not None else None
+
+def _cached(kind, params, compute, version=_published_version, cacheable=None):
+    """(valor, hit) do cache de resultados pela versão da ontologia (services/result_cache.py)."""
+    return get_result_cache().get_or_compute(kind, version, params, compute, cacheable)
+
+def _snapshot_version(snap):
+    return snap.stamp[0] if snap.stamp else None
+
+def _cached_read(kind, params, read):
+    """
+    (valor, hit) de `read(snapshot)` sobre a ontologia isolada do snapshot
+    publicado (ontology_session.isolated), em cache pela versão desse
+    snapshot. Um acerto não abre a leitura isolada; se outra versão for
+    publicada antes dela começar, o valor é devolvido sem ser guardado.
+    """
+    used = [_session.current()]
+
+    def compute():
+        with _session.isolated() as snap:
+            used[0] = snap
+            return read(snap)
+
+    return _cached(kind, params, compute, version=lambda: _snapshot_version(used[0]))
+
+class _ReleasingStream:
+    """Iterador de uma resposta em streaming que libera `resources` (ExitStack) quando a resposta é fechada."""
+
+    def __init__(self, iterable, resources):
+        self._iterator = iter(iterable)
+        self._resources = resources
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        try:
+            close = getattr(self._iterator, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._resources.close()
+
+def _cache_header(response, hit):
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+# Sob ASGI as views síncronas rodam uma de cada vez na mesma thread; as de
+# leitura são assíncronas e o corpo delas vai para um pool limitado
+# (services/executors.py). As de escrita continuam síncronas: já são serializadas.
+def _pool(name):
+    cfg = getattr(settings, "EXECUTOR_SETTINGS", {}).get(name.upper(), {})
+    return get_pool(name, cfg.get('WORKERS', 8), cfg.get('QUEUE', 64))
+
+def _async_exempt(view):
+    """csrf_exempt para views assíncronas (o do Django 4.2 as embrulha numa função síncrona)."""
+    view.csrf_exempt = True
+    return view
+
+def _offloaded(pool_name):
+    """
+    View de leitura assíncrona: a view síncrona decorada roda no pool
+    `pool_name`; pool saturado -> 503 com Retry-After. Sob ASGI, respostas em
+    streaming também são geradas no pool, um pedaço por vez.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            pool = _pool(pool_name)
+            try:
+                response = await pool.run(view, request, *args, **kwargs)
+            except Saturated:
+                logger.warning("[Executors] pool '%s' saturado; %s recusada", pool_name, request.path)
+                response = JsonResponse({'status': 'error', 'message': 'Servidor ocupado; tente novamente'},
+                                        status=503)
+                response['Retry-After'] = str(getattr(settings, "EXECUTOR_SETTINGS", {}).get('RETRY_AFTER', 1))
+                return response
+            if response.streaming and not response.is_async and isinstance(request, ASGIRequest):
+                response.streaming_content = pool.iterate(iter(response.streaming_content))
+            return response
+        return _async_exempt(wrapper)
+    return decorator
 
 def serialize_entity(entity):
     return {
@@ -217,8 +334,6 @@ def serialize_individual(ind):
 
 def serialize_property(prop):
     try:
-        from owlready2 import And, Or, FunctionalProperty, TransitiveProperty, SymmetricProperty, ObjectProperty
-
         # Helper para extrair nomes de classes de expressões lógicas (And/Or)
         def extract_classes(item):
             if isinstance(item, (And, Or)):
@@ -274,11 +389,54 @@ def serialize_property(prop):
             'name': getattr(prop, 'name', 'ErroDesconhecido'),
             'error': str(e)
         }
+
+
+def serialize_class(cls):
+    """Nó da hierarquia de classes (como /api/class-hierarchy/) + classes-pai nomeadas."""
+    return {
+        'name': cls.name,
+        'iri': cls.iri,
+        'label': cls.label.first() if cls.label else None,
+        'children_count': len(list(cls.subclasses())),
+        'descendants_count': len(set(cls.descendants(include_self=False))),
+        'parents': [p.name for p in cls.is_a if isinstance(p, ThingClass) and p is not Thing],
+    }
+
+
+def serialize_changes(ontology, iris):
+    """
+    Estado atual das entidades em `iris`, agrupado como na resposta do load-ontology.
+    Entidades que não existem mais vão para 'removed'.
+    """
+    changes = {'classes': [], 'individuals': [], 'object_properties': [], 'data_properties': [],
+               'annotation_properties': [], 'removed': []}
+    world = ontology.world
+    for iri in iris:
+        entity = world[iri]
+        if entity is None:
+            changes['removed'].append(iri)
+        elif isinstance(entity, ThingClass):
+            changes['classes'].append(serialize_class(entity))
+        elif isinstance(entity, ObjectPropertyClass):
+            changes['object_properties'].append(serialize_property(entity))
+        elif isinstance(entity, DataPropertyClass):
+            changes['data_properties'].append(serialize_property(entity))
+        elif isinstance(entity, AnnotationPropertyClass):
+            changes['annotation_properties'].append(serialize_property(entity))
+        elif isinstance(entity, Thing):
+            changes['individuals'].append(serialize_individual(entity))
+    return changes
+
+
+def _delta(journal):
+    """Trecho comum das respostas de mutação: nova versão + entidades alteradas."""
+    return {'version': journal.version, 'changes': serialize_changes(journal.onto, journal.last_change())}
     
 
 @csrf_exempt
+@_writes
 def load_ontology_view(request):
-    global world, onto, onto_path
+    onto, onto_path = _current()
     if request.method == 'POST':
         if 'ontology_file' not in request.FILES:
             return JsonResponse({'status': 'error', 'message': 'Nenhum arquivo enviado'}, status=400)
@@ -288,35 +446,45 @@ def load_ontology_view(request):
             media_dir = settings.MEDIA_ROOT
             os.makedirs(media_dir, exist_ok=True)
             path = os.path.join(media_dir, file.name)
+            _close_journal(onto, path)
             with open(path, 'wb+') as dest:
                 for chunk in file.chunks(): dest.write(chunk)
 
             onto_path = path
-            onto = get_ontology(path).load()
-            # sync_reasoner()
-
-            all_classes = list(onto.classes())
-            roots = [c for c in onto.classes() if Thing in c.is_a] or all_classes
+            if _store_dir():
+                # o arquivo enviado é a versão de referência: edições pendentes do mesmo conteúdo são descartadas
+                discard_journal(get_store(_store_dir()), file_sha256(path))
+            onto = load_ontology(path, store_dir=_store_dir())
+            _session.replace(onto, onto_path)
+            # HermiT roda em segundo plano; _refresh_inferred() troca para o snapshot inferido
+            reasoning = _schedule_reasoning(onto)
+
+            # só o primeiro nível da hierarquia; o resto vem de /api/class-hierarchy/ sob demanda
+            hierarchy = get_class_hierarchy(onto)
+            _, roots = hierarchy.level(limit=len(hierarchy.roots))
 
             datatypes = {rng.name for p in onto.data_properties() for rng in getattr(p, 'range', []) if hasattr(rng, 'name')}
             datatypes |= {'xsd:string','xsd:integer','xsd:float','xsd:boolean','xsd:dateTime'}
 
             data = {
-                'classes': [build_entity_hierarchy(c) for c in roots],
-                'classes_count': len(all_classes),
+                'classes': roots,
+                'classes_count': len(hierarchy.iri),
+                'class_names': hierarchy.names(),
                 'object_properties': [serialize_property(p) for p in onto.object_properties()],
                 'data_properties': [serialize_property(p) for p in onto.data_properties()],
                 'annotation_properties': [serialize_property(p) for p in onto.annotation_properties()],
                 'individuals': [serialize_individual(i) for i in onto.individuals()],
                 'datatypes': list(datatypes)
             }
-            return JsonResponse({'status':'success','message':'Ontologia carregada!','ontology':data})
+            version = get_journal(onto, onto_path, **_journal_options()).version
+            return JsonResponse({'status':'success','message':'Ontologia carregada!','ontology':data,
+                                 'version':version,'reasoning':reasoning})
         except Exception as e:
             traceback.print_exc()
             return JsonResponse({'status':'error','message':str(e)}, status=400)
     return JsonResponse({'status':'error','message':'Método não permitido'}, status=405)
 
-@csrf_exempt
+@_offloaded('ontology')
 def current_ontology_view(request):
     """
     GET /api/current-ontology/
@@ -326,20 +494,24 @@ def current_ontology_view(request):
         return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
 
     try:
-        global onto
-        if onto is None:
+        if _refresh_inferred().onto is None:
             return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
 
-        individuals = [serialize_individual(i) for i in onto.individuals()]
-        return JsonResponse({'status': 'success', 'ontology': {'individuals': individuals}}, status=200)
+        def read(snap):
+            return [serialize_individual(i) for i in snap.onto.individuals()], snap.stamp[1]
+
+        (individuals, version), hit = _cached_read('individuals', [], read)
+        return _cache_header(JsonResponse({'status': 'success', 'ontology': {'individuals': individuals},
+                                           'version': version}, status=200), hit)
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 @csrf_exempt
+@_writes
 def create_class_view(request):
-    global onto
+    onto, onto_path = _current()
     if onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
 
@@ -353,12 +525,12 @@ def create_class_view(request):
             if not class_name:
                 return JsonResponse({'status': 'error', 'message': 'Nome da classe é obrigatório'}, status=400)
 
-            with onto:
+            with journaled(onto, onto_path, **_journal_options()) as journal, onto:
                 # Definindo classes-pai
                 if parent_names:
                     parents = []
                     for parent_name in parent_names:
-                        parent_cls = onto.search_one(iri="*" + parent_name)
+                        parent_cls = get_entity_index(onto).find(parent_name, ThingClass)
                         if not parent_cls:
                             return JsonResponse({'status': 'error', 'message': f'Classe pai "{parent_name}" não encontrada'}, status=400)
                         parents.append(parent_cls)
@@ -367,19 +539,10 @@ def create_class_view(request):
 
                 # Criando a nova classe
                 NewClass = types.new_class(class_name, tuple(parents))
+                get_entity_index(onto).add(NewClass)
 
-            # Atualizar a árvore de classes
-            all_classes = list(onto.classes())
-            root_classes = [cls for cls in onto.classes() if Thing in cls.is_a]
-            if not root_classes:
-                root_classes = all_classes
-
-            ontology_data = {
-                'classes': [build_entity_hierarchy(cls) for cls in root_classes],
-                'classes_count': len(all_classes)
-            }
-
-            return JsonResponse({'status': 'success', 'message': 'Classe criada com sucesso', 'ontology': ontology_data})
+            # só a classe nova (com as classes-pai) volta; o frontend a encaixa na árvore
+            return JsonResponse({'status': 'success', 'message': 'Classe criada com sucesso', **_delta(journal)})
 
         except Exception as e:
             traceback.print_exc()
@@ -387,8 +550,45 @@ def create_class_view(request):
 
     return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
 
+@_offloaded('ontology')
+def class_hierarchy_view(request):
+    """
+    GET /api/class-hierarchy/?parent=<nome|IRI>&offset=0&limit=100
+    Filhos diretos de `parent` (ou as classes raiz, sem `parent`), paginados,
+    com children_count / descendants_count para expandir a árvore sob demanda.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+    onto, onto_path = _current()
+    if onto is None:
+        return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': '"offset" e "limit" devem ser inteiros'}, status=400)
+
+    hierarchy = get_class_hierarchy(onto)
+    parent_name = request.GET.get('parent')
+    parent = None
+    if parent_name:
+        parent = hierarchy.resolve(parent_name)
+        if parent is None:
+            return JsonResponse({'status': 'error', 'message': f'Classe "{parent_name}" não encontrada'}, status=404)
+    total, classes = hierarchy.level(parent, offset, limit)
+    return JsonResponse({
+        'status': 'success',
+        'parent': hierarchy.node(parent) if parent is not None else None,
+        'classes': classes,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+    })
+
+
 @csrf_exempt
 def export_ontology_view(request):
+    onto, onto_path = _current()
     if onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
 
@@ -398,39 +598,152 @@ def export_ontology_view(request):
             filename += '.owl'
 
         export_path = os.path.join(settings.MEDIA_ROOT, filename)
-        onto.save(file=export_path, format="rdfxml")
+        # versão publicada, isolada das edições feitas durante a serialização
+        _session.read_isolated(lambda snap: snap.onto.save(file=export_path, format="rdfxml"))
 
         return FileResponse(open(export_path, 'rb'), as_attachment=True, filename=filename)
 
     except Exception as e:
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
-    
+
+
+@csrf_exempt
+def reasoning_status_view(request):
+    """
+    GET  /api/reasoning-status/ -> status/progresso do reasoning da ontologia atual
+    POST /api/reasoning-status/ -> agenda o reasoning em segundo plano (se ainda não houver job)
+    """
+    onto, onto_path = _current()
+    if onto is None:
+        return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
+    jobs = _reasoning_jobs()
+    digest = ontology_digest(onto)
+    if jobs is None or digest is None:
+        return JsonResponse({'status': 'error', 'message': 'Reasoning em segundo plano requer o quadstore persistente'}, status=400)
+
+    if request.method == 'POST':
+        job = _schedule_reasoning(onto)
+    elif request.method == 'GET':
+        job = jobs.status(jobs.key_for(onto))
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+    _refresh_inferred()
+    return JsonResponse({
+        'status': 'success',
+        'digest': digest,
+        'reasoner_key': jobs.key_for(onto),
+        'job': job,
+        'serving_inferred': bool((store_info(onto) or {}).get('inferred')),
+    })
+
+
+@csrf_exempt
+@_writes
+def compact_ontology_view(request):
+    """
+    POST /api/compact-ontology/ -> grava agora o RDF/XML completo com as edições do journal
+    GET  /api/compact-ontology/ -> estado do journal (edições ainda não compactadas)
+    """
+    onto, onto_path = _current()
+    if onto is None:
+        return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
+    journal = get_journal(onto, onto_path, **_journal_options())
+    if request.method == 'POST':
+        try:
+            digest = journal.compact()
+        except Exception as e:
+            traceback.print_exc()
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        return JsonResponse({'status': 'success', 'compacted': digest is not None, 'digest': ontology_digest(onto)})
+    elif request.method == 'GET':
+        return JsonResponse({'status': 'success', 'digest': ontology_digest(onto),
+                             'pending_entries': journal.entries, 'path': onto_path})
+    return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+
+@csrf_exempt
+def changes_view(request):
+    """
+    GET /api/changes/?since=<versão>
+    Entidades alteradas depois de `since` (estado atual de cada uma), para o
+    frontend aplicar localmente. `reset: true` quando o log não cobre `since`
+    (ex.: outra ontologia carregada, servidor reiniciado após compactação):
+    nesse caso o cliente deve recarregar a ontologia inteira.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+    onto, onto_path = _current()
+    if onto is None:
+        return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': '"since" deve ser um inteiro'}, status=400)
+
+    journal = get_journal(onto, onto_path, **_journal_options())
+    iris = journal.changes_since(since)
+    payload = {'status': 'success', 'version': journal.version, 'since': since, 'reset': iris is None}
+    if iris is not None:
+        payload['changes'] = serialize_changes(onto, iris)
+    return JsonResponse(payload)
+
+
+@csrf_exempt
+def dl_cache_stats_view(request):
+    """
+    GET /api/dl-cache-stats/
+    Acertos/falhas do cache de resultados neste processo, por tipo de consulta,
+    e a versão da ontologia que compõe as chaves (services/result_cache.py).
+    """
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+    return JsonResponse({'status': 'success', 'version': _published_version(), **get_result_cache().stats()})
+
 
 @csrf_exempt
+def clear_dl_cache_view(request):
+    """
+    POST /api/clear-dl-cache/
+    Esvazia o cache de resultados (compartilhado, se for o Redis). Não é preciso
+    para refletir edições: a versão da ontologia já faz parte das chaves.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+    try:
+        get_result_cache().clear()
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    return JsonResponse({'status': 'success'})
+
+
+@csrf_exempt
+@_writes
 def create_annotation_property_view(request):
-    global onto
+    onto, onto_path = _current()
     if onto is None: return JsonResponse({'status':'error','message':'Nenhuma ontologia carregada'},status=400)
     if request.method!='POST': return JsonResponse({'status':'error','message':'Método não permitido'},status=405)
     try:
         data=json.loads(request.body)
         name, domains = data.get('name'), data.get('domain',[])
         if not name: return JsonResponse({'status':'error','message':'Nome é obrigatório'},status=400)
-        with onto:
-            New = types.new_class(name, (AnnotationPropertyClass,))
+        with journaled(onto, onto_path, **_journal_options()) as journal, onto:
+            New = types.new_class(name, (AnnotationProperty,))
             New.namespace = onto
             if domains:
-                New.domain = [d for d in domains if d]
+                New.domain = [c for c in (get_entity_index(onto).find(d, ThingClass) for d in domains if d) if c]
+            get_entity_index(onto).add(New)
 
-            onto.save(file=onto_path, format="rdfxml")
-            onto = get_ontology(onto_path).load()
-        return JsonResponse({'status':'success','message':'AnnotationProperty criada','annotation_properties':[serialize_property(p) for p in onto.annotation_properties()]})
+        # alteração feita no modelo em memória; a persistência fica com o journal
+        return JsonResponse({'status':'success','message':'AnnotationProperty criada', **_delta(journal)})
     except Exception as e:
         traceback.print_exc(); return JsonResponse({'status':'error','message':str(e)},status=500)
 
 @csrf_exempt
+@_writes
 def create_individual_view(request):
-    global onto
+    onto, onto_path = _current()
     if onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
     if request.method != 'POST':
@@ -451,11 +764,11 @@ def create_individual_view(request):
         if not class_names:
             return JsonResponse({'status': 'error', 'message': 'Pelo menos uma classe deve ser especificada'}, status=400)
 
-        with onto:
+        with journaled(onto, onto_path, **_journal_options()) as journal, onto:
             # instantiate classes
             classes = []
             for cls_name in class_names:
-                ontology_class = onto.search_one(iri=f"*{cls_name}") or onto.search_one(label=cls_name)
+                ontology_class = get_entity_index(onto).find(cls_name, ThingClass)
                 if not ontology_class:
                     return JsonResponse({'status': 'error', 'message': f'Classe "{cls_name}" não encontrada'}, status=400)
                 classes.append(ontology_class)
@@ -467,7 +780,7 @@ def create_individual_view(request):
                 # verificar conflito: se já existir objeto com sanitized name, acrescentar sufixo
                 base = sanitized
                 suffix = 0
-                while onto.search_one(iri=f"*{sanitized}") is not None:
+                while get_entity_index(onto).has_local(sanitized):
                     suffix += 1
                     sanitized = f"{base}_{suffix}"
 
@@ -482,6 +795,7 @@ def create_individual_view(request):
                 # adicionar outras classes se necessário
                 if len(classes) > 1:
                     NewInd.is_a.extend(classes[1:])
+                get_entity_index(onto).add(NewInd)
 
                 # agora atribuir data properties como antes, mas resolvendo props por name/iri
                 # (use a sua lógica já existente para propriedades, mas referencie o objeto NewInd em vez de new_individual)
@@ -490,7 +804,7 @@ def create_individual_view(request):
 
             # data properties
             for prop_name, values in properties.items():
-                prop = onto.search_one(iri=f"*{prop_name}") or onto.search_one(label=prop_name)
+                prop = get_entity_index(onto).find(prop_name, DataPropertyClass)
                 if not prop or not isinstance(prop, DataPropertyClass):
                     continue
                 # Process values into Python native types instead of rdflib Literals
@@ -527,17 +841,17 @@ def create_individual_view(request):
 
             # object properties
             for prop_name, targets in obj_props.items():
-                prop = onto.search_one(iri=f"*{prop_name}") or onto.search_one(label=prop_name)
+                prop = get_entity_index(onto).find(prop_name, ObjectPropertyClass)
                 if not prop or not isinstance(prop, ObjectPropertyClass):
                     continue
                 for t in targets:
-                    target_ind = onto.search_one(iri=f"*{t}") or onto.search_one(label=t)
+                    target_ind = get_entity_index(onto).find(t, Thing)
                     if target_ind:
                         getattr(NewInd, prop.name).append(target_ind)
 
             # annotations
             for anno_name, values in annotations.items():
-                prop = onto.search_one(iri=f"*{anno_name}") or onto.search_one(label=anno_name)
+                prop = get_entity_index(onto).find(anno_name, AnnotationPropertyClass)
                 if not prop or not isinstance(prop, AnnotationPropertyClass):
                     continue
                 for v in values:
@@ -545,84 +859,83 @@ def create_individual_view(request):
 
             # description, same_as, different_from
             for extra in description.get('types', []):
-                cls = onto.search_one(iri=f"*{extra}") or onto.search_one(label=extra)
+                cls = get_entity_index(onto).find(extra, ThingClass)
                 if cls:
                     NewInd.is_a.append(cls)
             for same in same_as:
-                other = onto.search_one(iri=f"*{same}") or onto.search_one(label=same)
+                other = get_entity_index(onto).find(same, Thing)
                 if other:
                     NewInd.same_as.append(other)
             for diff in different_from:
-                other = onto.search_one(iri=f"*{diff}") or onto.search_one(label=diff)
+                other = get_entity_index(onto).find(diff, Thing)
                 if other:
                     NewInd.different_from.append(other)
 
-            onto.save(file=onto_path, format="rdfxml")
-
-        return JsonResponse({
-            'status': 'success',
-            'message': 'Indivíduo criado!',
-            'ontology': {'individuals': [serialize_individual(i) for i in onto.individuals()]}
-        })
+        return JsonResponse({'status': 'success', 'message': 'Indivíduo criado!', **_delta(journal)})
     except Exception as e:
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
-@csrf_exempt
+@_offloaded('ontology')
 def list_data_properties_view(request):
-    if onto is None:
+    if _session.current().onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
 
     try:
-        data_properties = [
-            serialize_property(prop) for prop in onto.data_properties()
-        ]
-        return JsonResponse({'status': 'success', 'data_properties': data_properties})
+        data_properties, hit = _cached_read('data_properties', [], lambda snap: [
+            serialize_property(prop) for prop in snap.onto.data_properties()
+        ])
+        return _cache_header(JsonResponse({'status': 'success', 'data_properties': data_properties}), hit)
 
     except Exception as e:
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
-@csrf_exempt
+def _object_properties(snap):
+    props = []
+    for prop in snap.onto.object_properties():
+        # domínio e range podem ser listas vazias
+        domains = [cls.name for cls in getattr(prop, "domain", [])]
+        ranges  = [cls.name for cls in getattr(prop, "range",  [])]
+        props.append({
+            'name':       prop.name,
+            'iri':        prop.iri,
+            'label':      prop.label.first() or None,
+            'domain':     domains,
+            'range':      ranges,
+            'is_functional': isinstance(prop, ObjectPropertyClass) and prop.is_functional,
+        })
+    return props
+
+@_offloaded('ontology')
 def list_object_properties_view(request):
     """
     GET: retorna todas as ObjectProperties definidas na ontologia,
          com domínio e range (se houver).
     """
-    global onto
-    if onto is None:
+    if _session.current().onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
 
     if request.method != 'GET':
         return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
 
     try:
-        props = []
-        for prop in onto.object_properties():
-            # domínio e range podem ser listas vazias
-            domains = [cls.name for cls in getattr(prop, "domain", [])]
-            ranges  = [cls.name for cls in getattr(prop, "range",  [])]
-            props.append({
-                'name':       prop.name,
-                'iri':        prop.iri,
-                'label':      prop.label.first() or None,
-                'domain':     domains,
-                'range':      ranges,
-                'is_functional': isinstance(prop, ObjectPropertyClass) and prop.is_functional,
-            })
-
-        return JsonResponse({
+        _refresh_inferred()
+        props, hit = _cached_read('object_properties', [], _object_properties)
+
+        return _cache_header(JsonResponse({
             'status':            'success',
             'object_properties': props
-        })
+        }), hit)
 
     except Exception as e:
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 @csrf_exempt
+@_writes
 def relationship_manager_view(request):
-    global onto
+    onto, onto_path = _current()
     if onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
 
@@ -640,7 +953,7 @@ def relationship_manager_view(request):
         if not subject_name or not object_property_name or not action:
             return JsonResponse({'status': 'error', 'message': 'Parâmetros obrigatórios ausentes'}, status=400)
 
-        with onto:
+        with journaled(onto, onto_path, **_journal_options()) as journal, onto:
             # Localiza indivíduos e propriedade
             subject = resolve_individual(onto, subject_name)
             if not subject:
@@ -649,7 +962,7 @@ def relationship_manager_view(request):
             if not subject:
                 return JsonResponse({'status': 'error', 'message': f'Indivíduo sujeito "{subject_name}" não encontrado'}, status=404)
 
-            obj_prop = onto.search_one(iri=f"*{object_property_name}") or onto.search_one(label=object_property_name)
+            obj_prop = get_entity_index(onto).find(object_property_name, ObjectPropertyClass)
             if not obj_prop or not isinstance(obj_prop, ObjectPropertyClass):
                 return JsonResponse({'status': 'error', 'message': f'Propriedade "{object_property_name}" não encontrada ou não é uma ObjectProperty'}, status=400)
 
@@ -686,13 +999,8 @@ def relationship_manager_view(request):
             else:
                 return JsonResponse({'status': 'error', 'message': 'Ação inválida. Use "add", "remove" ou "replace"'}, status=400)
 
-            # Salva alterações
-            onto.save(file=onto_path, format="rdfxml")
-
-        # Atualiza lista de indivíduos na resposta
-        updated_individuals = [serialize_individual(ind) for ind in onto.individuals()]
-
-        return JsonResponse({'status': 'success', 'message': 'Relacionamento atualizado com sucesso!', 'ontology': {'individuals': updated_individuals}})
+        # só o indivíduo alterado volta na resposta
+        return JsonResponse({'status': 'success', 'message': 'Relacionamento atualizado com sucesso!', **_delta(journal)})
 
     except Exception as e:
         traceback.print_exc()
@@ -700,11 +1008,9 @@ def relationship_manager_view(request):
 
 
 @csrf_exempt
+@_writes
 def create_object_property_view(request):
-    global onto, onto_path
-
-    if onto is None and onto_path:
-        onto = get_ontology(onto_path).load()
+    onto, onto_path = _load_pending()
 
     if onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
@@ -722,7 +1028,7 @@ def create_object_property_view(request):
         # Busca por classes de domínio
         domains = []
         for domain_name in domain_names:
-            cls = onto.search_one(iri=f"*{domain_name}") or onto.search_one(label=domain_name)
+            cls = get_entity_index(onto).find(domain_name, ThingClass)
             if not cls:
                 return JsonResponse({'status': 'error', 'message': f'Domínio "{domain_name}" não encontrado'}, status=400)
             domains.append(cls)
@@ -730,15 +1036,16 @@ def create_object_property_view(request):
         # Busca por classes de range
         ranges = []
         for range_name in range_names:
-            cls = onto.search_one(iri=f"*{range_name}") or onto.search_one(label=range_name)
+            cls = get_entity_index(onto).find(range_name, ThingClass)
             if not cls:
                 return JsonResponse({'status': 'error', 'message': f'Range "{range_name}" não encontrado'}, status=400)
             ranges.append(cls)
 
-        with onto:
+        with journaled(onto, onto_path, **_journal_options()) as journal, onto:
             # Criação da nova propriedade seguindo padrão Owlready2
             NewProperty = new_class(name, (ObjectProperty,))
             NewProperty.namespace = onto
+            get_entity_index(onto).add(NewProperty)
 
             # Define domínio
             if domains:
@@ -756,28 +1063,17 @@ def create_object_property_view(request):
             if 'symmetric' in [c.lower() for c in characteristics]:
                 NewProperty.is_a.append(SymmetricProperty)
 
-            # Salva a ontologia atualizada
-            onto.save(file=onto_path, format="rdfxml")
-
-        # Retorna a lista atualizada
-        object_properties = [serialize_property(p) for p in onto.object_properties()]
-        return JsonResponse({
-            'status': 'success',
-            'message': 'Propriedade criada com sucesso',
-            'object_properties': object_properties
-        })
+        return JsonResponse({'status': 'success', 'message': 'Propriedade criada com sucesso', **_delta(journal)})
 
     except Exception as e:
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 @csrf_exempt
+@_writes
 def create_data_property_view(request):
-    global onto, onto_path
-
     # Carrega ontologia se ainda não estiver em memória
-    if onto is None and onto_path:
-        onto = get_ontology(onto_path).load()
+    onto, onto_path = _load_pending()
 
     if onto is None:
         return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
@@ -819,15 +1115,16 @@ def create_data_property_view(request):
         # Busca por classes de domínio
         domains = []
         for domain_name in domain_names:
-            cls = onto.search_one(iri=f"*{domain_name}") or onto.search_one(label=domain_name)
+            cls = get_entity_index(onto).find(domain_name, ThingClass)
             if not cls:
                 return JsonResponse({'status': 'error', 'message': f'Domínio "{domain_name}" não encontrado'}, status=400)
             domains.append(cls)
 
-        with onto:
+        with journaled(onto, onto_path, **_journal_options()) as journal, onto:
             # Criação da nova propriedade usando types.new_class
             NewDataProp = types.new_class(name, (DataProperty,))
             NewDataProp.namespace = onto
+            get_entity_index(onto).add(NewDataProp)
 
             # Define domínio
             if domains:
@@ -840,41 +1137,15 @@ def create_data_property_view(request):
             if any(c.lower() == 'functional' for c in characteristics):
                 NewDataProp.is_a.append(FunctionalProperty)
 
-            # Salva a ontologia atualizada
-            onto.save(file=onto_path, format='rdfxml')
-
-        return JsonResponse({'status': 'success', 'message': 'Propriedade de dados criada com sucesso'})
+        return JsonResponse({'status': 'success', 'message': 'Propriedade de dados criada com sucesso', **_delta(journal)})
 
     except Exception as e:
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 
-import json, time, re, logging
-from owlready2 import get_ontology
-
-logger = logging.getLogger(__name__)
-
-onto = None  # Ontologia carregada antes
-
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-import os
-
-
 #################### DL QUERY #############################
 
-# ---------- Prefixos fixos ----------
-PREFIXES = """
-PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-PREFIX o3po: <http://html.inf.ufrgs.br/home/pos/nosantos/public_html/o3po.owl#>
-PREFIX o3po_merged: <http://www.semanticweb.org/nicoy/ontologies/2023/1/o3po_merged#>
-PREFIX o3po_inferred: <http://www.semanticweb.org/tturb/ontologies/2025/3/o3po_inferred#>
-PREFIX core: <https://spec.industrialontologies.org/ontology/core/Core/>
-PREFIX core1: <https://purl.industrialontologies.org/ontology/core/Core/>
-PREFIX obo: <http://purl.obolibrary.org/obo/>
-"""
-
 # ---------- Helpers ----------
 
 def local_name_from_iri(s: str) -> str:
@@ -906,58 +1177,72 @@ def to_sparql_term(iri_like: str) -> str:
         return s
     return s
 
-def expand_union(term: str, var="?focus", namespaces=("o3po", "o3po_merged", "o3po_inferred")) -> str:
-    local = local_name_from_iri(term)
-    unions = [f"{{ {var} {ns}:{local} }}" for ns in namespaces]
-    return " UNION ".join(unions)
-
-def resolve_entity_identifier(onto, identifier, id_type="auto"):
-    """Dummy resolver de identificador."""
-    if identifier.startswith("http://") or identifier.startswith("https://"):
-        return identifier
-    return f"http://www.semanticweb.org/nicoy/ontologies/2023/1/o3po_merged#{identifier}"
-
-# ---------- Query builder use_case_1 ----------
-def build_use_case_1_query(resolved_iri, measurement_class="o3po:ICV_annular_pressure"):
-    foco_union = expand_union(resolved_iri, var="?focus") if resolved_iri else "?focus ?any ?any2"
-    measurement_class_sparql = to_sparql_term(measurement_class)
-    return f"""
-    {PREFIXES}
-    SELECT DISTINCT ?file ?icv
-    WHERE {{
-      ?icv rdf:type o3po:ICV .
-      ?icv o3po:component_of ?focus .
-      {foco_union}
-      ?anular rdf:type {measurement_class_sparql} .
-      ?anular core1:qualityOf ?icv .
-      ?file core:isAbout ?anular .
-    }}
-    """
 
-import os
-import json
-import logging
-import unicodedata
-import re
-from pathlib import Path
+PREDEFINED_MEASUREMENT_CLASS = {
+    'use_case_1': 'o3po:ICV_annular_pressure',
+    'use_case_2': 'o3po:ICV',
+    'use_case_3': 'o3po:flow_rate',
+}
 
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.conf import settings
 
-from owlready2 import get_ontology
+def _ensure_predefined_ontology():
+    """Carrega a ontologia dos caminhos conhecidos se nenhuma foi enviada ainda."""
+    onto, onto_path = _current()
+    if onto is not None:
+        return onto
+    with _session.write():
+        return _load_predefined()
 
-logger = logging.getLogger(__name__)
 
-# mantém compatibilidade se já existir no módulo
-onto = globals().get('onto', None)
-onto_path = globals().get('onto_path', None)
+def _load_predefined():
+    onto, onto_path = _current()
+    if onto is not None:  # outro escritor carregou enquanto esperávamos
+        return onto
 
+    possible_paths = []
+    if onto_path:
+        possible_paths.append(onto_path)
 
-@csrf_exempt
+    possible_paths += [
+        r"D:\Área de Trabalho\o3po_inferred.owl",
+        "/mnt/data/o3po_inferred.owl",
+        os.path.join(getattr(settings, "MEDIA_ROOT", ""), "o3po_inferred.owl"),
+        os.path.join(getattr(settings, "MEDIA_ROOT", ""), "o3po_merged.owl"),
+        os.path.join(getattr(settings, "MEDIA_ROOT", ""), "o3po.owl"),
+    ]
+
+    norm_paths = []
+    for p in possible_paths:
+        if not p:
+            continue
+        if str(p).startswith("file://"):
+            norm_paths.append(str(p))
+        else:
+            norm_paths.append(os.path.abspath(str(p)))
+
+    # dedupe preserving order
+    seen = set()
+    norm_paths = [p for p in norm_paths if not (p in seen or seen.add(p))]
+
+    for p in norm_paths:
+        try:
+            local = url2pathname(urlparse(p).path) if p.startswith("file://") else p
+            if not os.path.exists(local):
+                continue
+            onto = _session.replace(load_ontology(local, store_dir=_store_dir()), local).onto
+            logger.info("Loaded ontology from %s", p)
+            return onto
+        except Exception as e:
+            logger.debug("Failed loading ontology from %s: %s", p, e, exc_info=True)
+
+    raise RuntimeError(f"Ontology not loaded. Tried paths: {norm_paths}")
+
+
+@_offloaded('ontology')
 def predefined_sparql_view(request, use_case):
     """
-    View que atende use_case_1, use_case_2 e use_case_3 via varredura combinatória.
+    View que atende use_case_1, use_case_2 e use_case_3 via junções sobre o índice
+    de adjacências da ontologia (services/graph_index.py).
     - GET/POST /api/predefined-sparql/<use_case>/
     - Parâmetros:
         identifier (obrigatório): nome local do recurso (well, fpso, etc.) ou IRI completo
@@ -968,116 +1253,53 @@ def predefined_sparql_view(request, use_case):
     Retorno: JSON {status, results, total} ou {status, error, debug}
     """
 
-    global onto, onto_path
+    # --------------- parse params ----------------
+    if request.method == 'GET':
+        params = request.GET
+        identifier = params.get('identifier')
+        measurement_class = params.get('measurement_class')
+        quality_pred = params.get('quality_predicate', 'core:qualityOf')
+        component_pred = params.get('component_predicate', 'o3po:component_of')
+        tag_pred = params.get('tag_predicate', None)
+    elif request.method == 'POST':
+        try:
+            payload = json.loads(request.body.decode('utf-8') or "{}")
+        except Exception:
+            return JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
+        identifier = payload.get('identifier')
+        measurement_class = payload.get('measurement_class')
+        quality_pred = payload.get('quality_predicate', 'core:qualityOf')
+        component_pred = payload.get('component_predicate', 'o3po:component_of')
+        tag_pred = payload.get('tag_predicate', None)
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+    if not identifier:
+        return JsonResponse({'status': 'error', 'message': '"identifier" obrigatório'}, status=400)
 
-    # rdflib import
-    try:
-        import rdflib
-        URIRef = rdflib.term.URIRef
-        RDF = rdflib.namespace.RDF
-        RDFS = rdflib.namespace.RDFS
-        Literal = rdflib.term.Literal
-    except Exception as e:
-        logger.exception("rdflib import failed: %s", e)
-        return JsonResponse({
-            'status': 'error',
-            'message': 'Biblioteca "rdflib" não disponível no ambiente. Instale: pip install rdflib'
-        }, status=500)
+    (payload, status), hit = _predefined_result(use_case, identifier, measurement_class,
+                                                quality_pred, component_pred, tag_pred)
+    return _cache_header(JsonResponse(payload, status=status), hit)
 
-    # ---------------- helpers ----------------
-    def ensure_ontology_loaded():
-        global onto, onto_path
-        if onto is not None:
-            return onto
 
-        possible_paths = []
-        if onto_path:
-            possible_paths.append(onto_path)
-
-        possible_paths += [
-            r"D:\Área de Trabalho\o3po_inferred.owl",
-            "/mnt/data/o3po_inferred.owl",
-            os.path.join(getattr(settings, "MEDIA_ROOT", ""), "o3po_inferred.owl"),
-            os.path.join(getattr(settings, "MEDIA_ROOT", ""), "o3po_merged.owl"),
-            os.path.join(getattr(settings, "MEDIA_ROOT", ""), "o3po.owl"),
-        ]
-
-        norm_paths = []
-        for p in possible_paths:
-            if not p:
-                continue
-            if str(p).startswith("file://"):
-                norm_paths.append(str(p))
-            else:
-                norm_paths.append(os.path.abspath(str(p)))
+def _predefined_result(use_case, identifier, *options):
+    """((payload, status), hit): predefined_query pelo cache de resultados (só respostas 200)."""
+    return _cached('predefined', [use_case, identifier, *options],
+                   lambda: predefined_query(use_case, identifier, *options),
+                   cacheable=lambda result: result[1] == 200)
 
-        # dedupe preserving order
-        seen = set()
-        norm_paths = [p for p in norm_paths if not (p in seen or seen.add(p))]
 
-        for p in norm_paths:
-            try:
-                if p.startswith("file://"):
-                    onto_tmp = get_ontology(p).load()
-                else:
-                    if not os.path.exists(p):
-                        continue
-                    uri = Path(p).resolve().as_uri()
-                    onto_tmp = get_ontology(uri).load()
-                onto = onto_tmp
-                onto_path = p
-                logger.info("Loaded ontology from %s", p)
-                return onto
-            except Exception as e:
-                logger.debug("Failed loading ontology from %s: %s", p, e, exc_info=True)
-
-        raise RuntimeError(f"Ontology not loaded. Tried paths: {norm_paths}")
-
-    def make_uri_candidates(local_name):
-        if not local_name:
-            return []
-
-        candidates = []
-        s = str(local_name).strip()
-        if s.startswith("http://") or s.startswith("https://") or s.startswith("file://"):
-            candidates.append(s)
-            return candidates
+def predefined_query(use_case, identifier, measurement_class=None, quality_pred='core:qualityOf',
+                     component_pred='o3po:component_of', tag_pred=None):
+    """
+    Junções do caso de uso sobre o índice do grafo (ver predefined_sparql_view).
+    Retorna (payload, status HTTP); também usada pelo painel do poço.
+    """
 
-        if ':' in s:
-            prefix, name = s.split(':', 1)
-            known = {
-                'o3po': 'http://html.inf.ufrgs.br/home/pos/nosantos/public_html/o3po.owl#',
-                'o3po_merged': 'http://www.semanticweb.org/nicoy/ontologies/2023/1/o3po_merged#',
-                'o3po_inferred': 'http://www.semanticweb.org/tturb/ontologies/2025/3/o3po_inferred#',
-                'core1': 'https://purl.industrialontologies.org/ontology/core/Core/',
-                'core': 'http://www.ontologydesignpatterns.org/cp/owl/core#',
-                'obo': 'http://purl.obolibrary.org/obo/'
-            }
-            if prefix in known:
-                # obo:RO_0000057 -> known['obo'] + 'RO_0000057'
-                candidates.append(known[prefix] + name)
-
-        commons = [
-            'http://html.inf.ufrgs.br/home/pos/nosantos/public_html/o3po.owl#',
-            'http://www.semanticweb.org/nicoy/ontologies/2023/1/o3po_merged#',
-            'http://www.semanticweb.org/tturb/ontologies/2025/3/o3po_inferred#',
-            'https://purl.industrialontologies.org/ontology/core/Core/',
-            'http://www.ontologydesignpatterns.org/cp/owl/core#',
-            'http://purl.obolibrary.org/obo/'
-        ]
-        for ns in commons:
-            candidates.append(ns + s)
-
-        candidates.append(s)
-        # dedupe preserve order
-        seen = set()
-        uniq = []
-        for c in candidates:
-            if c not in seen:
-                seen.add(c)
-                uniq.append(c)
-        return uniq
+    if measurement_class is None:
+        measurement_class = PREDEFINED_MEASUREMENT_CLASS.get(use_case, 'o3po:ICV_annular_pressure')
 
+    # ---------------- helpers ----------------
     def strip_prefixed_local(s):
         if not s:
             return s
@@ -1106,453 +1328,670 @@ def predefined_sparql_view(request, use_case):
                 seen.add(x); out.append(x)
         return out
 
-    # --------------- parse params ----------------
-    if request.method == 'GET':
-        params = request.GET
-        # choose default measurement_class depending on use_case
-        if use_case == 'use_case_2':
-            default_mc = 'o3po:ICV'
-        elif use_case == 'use_case_3':
-            default_mc = 'o3po:flow_rate'
-        else:
-            default_mc = 'o3po:ICV_annular_pressure'
-        identifier = params.get('identifier')
-        measurement_class = params.get('measurement_class', default_mc)
-        quality_pred = params.get('quality_predicate', 'core:qualityOf')
-        component_pred = params.get('component_predicate', 'o3po:component_of')
-        tag_pred = params.get('tag_predicate', None)
-    elif request.method == 'POST':
-        try:
-            payload = json.loads(request.body.decode('utf-8') or "{}")
-        except Exception:
-            return JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
-        if use_case == 'use_case_2':
-            default_mc = 'o3po:ICV'
-        elif use_case == 'use_case_3':
-            default_mc = 'o3po:flow_rate'
-        else:
-            default_mc = 'o3po:ICV_annular_pressure'
-        identifier = payload.get('identifier')
-        measurement_class = payload.get('measurement_class', default_mc)
-        quality_pred = payload.get('quality_predicate', 'core:qualityOf')
-        component_pred = payload.get('component_predicate', 'o3po:component_of')
-        tag_pred = payload.get('tag_predicate', None)
-    else:
-        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
-
-    if not identifier:
-        return JsonResponse({'status': 'error', 'message': '"identifier" obrigatório'}, status=400)
-
     # ---------- ensure ontology loaded ----------
     try:
-        ensure_ontology_loaded()
+        _ensure_predefined_ontology()
+        onto, onto_path = _refresh_inferred()
     except Exception as e:
         logger.exception("Ontology load failed: %s", e)
-        return JsonResponse({
+        return {
             'status': 'error',
             'message': 'Ontologia não carregada no processo. Veja debug.',
             'debug': {'error': str(e)}
-        }, status=500)
+        }, 500
 
-    # ---------- build candidates ----------
-    o3po_bases = [
-        "http://html.inf.ufrgs.br/home/pos/nosantos/public_html/o3po.owl#",
-        "http://www.semanticweb.org/nicoy/ontologies/2023/1/o3po_merged#",
-        "http://www.semanticweb.org/tturb/ontologies/2025/3/o3po_inferred#"
-    ]
-    core_bases = [
-        "https://spec.industrialontologies.org/ontology/core/Core/",
-        "https://purl.industrialontologies.org/ontology/core/Core/",
-        "http://www.ontologydesignpatterns.org/cp/owl/core#"
-    ]
-    obo_bases = [
-        "http://purl.obolibrary.org/obo/"
-    ]
+    # ---------- índice do grafo + termos ----------
+    # adjacências montadas uma vez por versão da ontologia (ver services/graph_index.py);
+    # os aliases de namespace (o3po/o3po_merged/o3po_inferred, core/core1) já vêm
+    # colapsados num único ID, então cada termo é uma única busca
+    g = get_graph_index(onto)
 
-    m_local = strip_prefixed_local(measurement_class)
-    comp_local = strip_prefixed_local(component_pred)
-    q_local = strip_prefixed_local(quality_pred)
-    tag_local = strip_prefixed_local(tag_pred) if tag_pred else "isAbout"
-
-    mc_candidates = []
-    if measurement_class and (measurement_class.startswith('http://') or measurement_class.startswith('https://') or (measurement_class.startswith('<') and measurement_class.endswith('>'))):
-        mc_val = measurement_class[1:-1] if measurement_class.startswith('<') else measurement_class
-        mc_candidates.append(mc_val)
-    for b in o3po_bases:
-        mc_candidates.append(b + m_local)
-
-    comp_candidates = []
-    if component_pred and (component_pred.startswith('http://') or component_pred.startswith('https://') or (component_pred.startswith('<') and component_pred.endswith('>'))):
-        cp = component_pred[1:-1] if component_pred.startswith('<') else component_pred
-        comp_candidates.append(cp)
-    for b in o3po_bases:
-        comp_candidates.append(b + comp_local)
-
-    qual_candidates = []
-    if quality_pred and (quality_pred.startswith('http://') or quality_pred.startswith('https://') or (quality_pred.startswith('<') and quality_pred.endswith('>'))):
-        qp = quality_pred[1:-1] if quality_pred.startswith('<') else quality_pred
-        qual_candidates.append(qp)
-    for b in core_bases:
-        qual_candidates.append(b + q_local)
-
-    # candidates for obo relation (RO_0000057)
-    obo_candidates = []
-    # if user passed obo:... in measurement_class or other fields it will be included by make_uri_candidates; but we add common obo relation explicitly
-    obo_candidates.append("http://purl.obolibrary.org/obo/RO_0000057")
-    obo_candidates = dedupe(obo_candidates)
-
-    tag_candidates = []
-    if tag_pred and (tag_pred.startswith('http://') or tag_pred.startswith('https://') or (tag_pred.startswith('<') and tag_pred.endswith('>'))):
-        tp = tag_pred[1:-1] if tag_pred.startswith('<') else tag_pred
-        tag_candidates.append(tp)
-    for b in core_bases:
-        tag_candidates.append(b + tag_local)
-
-    mc_candidates = dedupe(mc_candidates)
-    comp_candidates = dedupe(comp_candidates)
-    qual_candidates = dedupe(qual_candidates)
-    tag_candidates = dedupe(tag_candidates)
+    mc_term = g.id(measurement_class)
+    comp_term = g.id(component_pred)
+    qual_term = g.id(quality_pred)
+    tag_term = g.id(tag_pred or 'core:isAbout')
+    obo_term = g.id('obo:RO_0000057')
+
+    def term_debug(term, tid):
+        return g.terms.originals[tid] if tid is not None else [expand_term(term)]
 
     debug_candidates = {
-        'mc_candidates': mc_candidates,
-        'comp_candidates': comp_candidates,
-        'qual_candidates': qual_candidates,
-        'tag_candidates': tag_candidates,
-        'obo_candidates': obo_candidates
+        'mc_candidates': term_debug(measurement_class, mc_term),
+        'comp_candidates': term_debug(component_pred, comp_term),
+        'qual_candidates': term_debug(quality_pred, qual_term),
+        'tag_candidates': term_debug(tag_pred or 'core:isAbout', tag_term),
+        'obo_candidates': term_debug('obo:RO_0000057', obo_term)
     }
 
-    # ---------- graph + resolve identifier ----------
-    g = onto.world.as_rdflib_graph()
-    well_iri = None
-    platform_iri = None
+    # ---------- resolve identifier ----------
+    platform = None
 
     resolver = globals().get('resolve_individual')
     try:
         if resolver:
             ind = resolver(onto, identifier)
             if ind:
-                try:
-                    platform_iri = URIRef(str(getattr(ind, "iri", ind)))
-                except Exception:
-                    platform_iri = URIRef(str(ind))
+                platform = g.id(str(getattr(ind, "iri", ind)))
     except Exception:
-        platform_iri = None
+        platform = None
 
     # fallback: IRI presence
-    if platform_iri is None:
-        try:
-            cand = URIRef(identifier)
-            if (cand, None, None) in g:
-                platform_iri = cand
-        except Exception:
-            platform_iri = None
+    if platform is None:
+        tid = g.id(identifier)
+        if tid in g.subjects:
+            platform = tid
 
     # fallback: rdfs:label
-    if platform_iri is None:
-        try:
-            for s, o in g.subject_objects(RDFS.label):
-                if isinstance(o, Literal) and str(o) == identifier:
-                    platform_iri = s
-                    break
-        except Exception:
-            pass
+    if platform is None:
+        platform = g.labels.get(identifier)
 
     # fallback: local-name sanitize match
-    if platform_iri is None:
+    if platform is None:
         san = unicodedata.normalize("NFKD", identifier).encode("ASCII", "ignore").decode()
         san = re.sub(r'[^0-9A-Za-z_]+', '_', san).strip('_')
-        candidates_local = {identifier, strip_prefixed_local(identifier), san}
-        try:
-            for s in set(g.subjects()):
-                if local_name_from_iri_simple(s) in candidates_local:
-                    platform_iri = s
-                    break
-        except Exception:
-            pass
+        for cand in (identifier, strip_prefixed_local(identifier), san):
+            if cand in g.by_local:
+                platform = g.by_local[cand]
+                break
 
-    if platform_iri is None:
-        return JsonResponse({
+    if platform is None:
+        return {
             'status': 'error',
             'message': f'Não foi possível resolver identifier \"{identifier}\" para um recurso na ontologia (esperado FPSO ou outro recurso).',
             'debug': debug_candidates
-        }, status=404)
+        }, 404
+
+    platform_iri = g.iri(platform)
+    iri = g.iri
 
     # ---------- branch by use_case ----------
     found = []
 
     if use_case == 'use_case_1':
-        import itertools
         seen = set()
-        for comp_iri_str in comp_candidates:
-            try:
-                comp_iri = URIRef(comp_iri_str)
-            except Exception:
-                continue
-
-            # iterar ICVs tanto na direção direta (?icv comp platform) quanto inversa (platform comp ?icv)
-            icv_subjects = list(g.subjects(predicate=comp_iri, object=platform_iri))
-            icv_objects = list(g.objects(subject=platform_iri, predicate=comp_iri))
-            for icv in itertools.chain(icv_subjects, icv_objects):
-                # percorrer preds de qualidade (core/core1 etc) para achar 'anular' ligados ao icv
-                for qual_iri_str in qual_candidates:
-                    try:
-                        qual_iri = URIRef(qual_iri_str)
-                    except Exception:
-                        continue
-                    for anular in g.subjects(predicate=qual_iri, object=icv):
-                        # aqui: verificar o tipo DO 'anular' (era o bug — antes verificava o tipo do icv)
-                        for mc_iri_str in mc_candidates:
-                            try:
-                                mc_iri = URIRef(mc_iri_str)
-                            except Exception:
-                                continue
-                            if (anular, RDF.type, mc_iri) not in g:
-                                continue
-                            # se chegou aqui, 'anular' tem o tipo esperado — buscar tags que 'isAbout' esse anular
-                            for tag_iri_str in tag_candidates:
-                                try:
-                                    tag_iri = URIRef(tag_iri_str)
-                                except Exception:
-                                    continue
-                                for file_node in g.subjects(predicate=tag_iri, object=anular):
-                                    file_uri = str(file_node)
-                                    if file_uri not in seen:
-                                        seen.add(file_uri)
-                                        found.append({
-                                            'file': file_uri,
-                                            'file_name': local_name_from_iri_simple(file_uri),
-                                            'icv': str(icv),
-                                            'icv_name': local_name_from_iri_simple(icv)
-                                        })
+        # ICVs tanto na direção direta (?icv comp platform) quanto inversa (platform comp ?icv)
+        icvs = dedupe(list(g.subjects_of(comp_term, platform)) + list(g.objects(platform, comp_term)))
+        for icv in icvs:
+            # 'anular' ligados ao icv pelo predicado de qualidade, com o tipo esperado
+            for anular in g.subjects_of(qual_term, icv):
+                if not g.has_type(anular, mc_term):
+                    continue
+                # tags que 'isAbout' esse anular
+                for file_node in g.subjects_of(tag_term, anular):
+                    if file_node not in seen:
+                        seen.add(file_node)
+                        file_uri = iri(file_node)
+                        found.append({
+                            'file': file_uri,
+                            'file_name': local_name_from_iri_simple(file_uri),
+                            'icv': iri(icv),
+                            'icv_name': local_name_from_iri_simple(iri(icv))
+                        })
 
         if not found:
-            return JsonResponse({
+            return {
                 'status': 'error',
                 'message': 'Found 0 tags for analysis (use_case_1).',
                 'debug': {
-                    'resolved_entity': str(platform_iri),
+                    'resolved_entity': platform_iri,
                     **debug_candidates
                 }
-            }, status=200)
+            }, 200
 
-        return JsonResponse({'status': 'success', 'results': found, 'total': len(found)}, status=200)
+        return {'status': 'success', 'results': found, 'total': len(found)}, 200
 
 
     elif use_case == 'use_case_2':
-        # (existing behavior) - unchanged
         seen = set()
-        for mc_iri_str in mc_candidates:
-            try:
-                mc_iri = URIRef(mc_iri_str)
-            except Exception:
+        for icv_subj in g.instances.get(mc_term, ()):
+            # relação de componente com a plataforma, em qualquer direção
+            if not (g.has(icv_subj, comp_term, platform) or g.has(platform, comp_term, icv_subj)):
                 continue
-            # iterate all instances of mc_iri
-            for icv_subj, _, _ in g.triples((None, RDF.type, mc_iri)):
-                # check component relation for any comp_candidate
-                matched_comp = None
-                for comp_iri_str in comp_candidates:
-                    try:
-                        comp_iri = URIRef(comp_iri_str)
-                    except Exception:
-                        continue
-                    if (icv_subj, comp_iri, platform_iri) in g or (platform_iri, comp_iri, icv_subj) in g:
-                        matched_comp = comp_iri
-                        break
-                if not matched_comp:
+            for tag_subj in g.subjects_of(qual_term, icv_subj):
+                key = (tag_subj, icv_subj)
+                if key in seen:
                     continue
-                # for this icv_subj find subjects that have qual -> icv_subj
-                for qual_iri_str in qual_candidates:
-                    try:
-                        qual_iri = URIRef(qual_iri_str)
-                    except Exception:
-                        continue
-                    for tag_subj, _, _ in g.triples((None, qual_iri, icv_subj)):
-                        key = f"{tag_subj}|{icv_subj}|{qual_iri}"
-                        if key in seen:
-                            continue
-                        seen.add(key)
-                        tag_iri_s = str(tag_subj)
-                        icv_iri_s = str(icv_subj)
-                        tag_name = local_name_from_iri_simple(tag_subj)
-                        icv_name = local_name_from_iri_simple(icv_subj)
-                        item = {
-                            'tag_iri': tag_iri_s,
-                            'tag_name': tag_name,
-                            'icv_iri': icv_iri_s,
-                            'icv_name': icv_name,
-                            'component_predicate_used': str(matched_comp),
-                            'quality_predicate_used': str(qual_iri),
-                            'measurement_class_tried': str(mc_iri),
-                            'file': tag_iri_s,
-                            'file_name': tag_name,
-                            'icv': icv_iri_s,
-                            'icv_name_compat': icv_name
-                        }
-                        found.append(item)
+                seen.add(key)
+                tag_iri_s = iri(tag_subj)
+                icv_iri_s = iri(icv_subj)
+                tag_name = local_name_from_iri_simple(tag_iri_s)
+                icv_name = local_name_from_iri_simple(icv_iri_s)
+                found.append({
+                    'tag_iri': tag_iri_s,
+                    'tag_name': tag_name,
+                    'icv_iri': icv_iri_s,
+                    'icv_name': icv_name,
+                    'component_predicate_used': iri(comp_term),
+                    'quality_predicate_used': iri(qual_term),
+                    'measurement_class_tried': iri(mc_term),
+                    'file': tag_iri_s,
+                    'file_name': tag_name,
+                    'icv': icv_iri_s,
+                    'icv_name_compat': icv_name
+                })
 
         if not found:
-            return JsonResponse({
+            return {
                 'status': 'error',
                 'message': 'Found 0 tags for use_case_2.',
                 'debug': {
-                    'resolved_well': str(platform_iri),
+                    'resolved_well': platform_iri,
                     **debug_candidates
                 }
-            }, status=200)
+            }, 200
 
-        return JsonResponse({'status': 'success', 'results': found, 'total': len(found)}, status=200)
+        return {'status': 'success', 'results': found, 'total': len(found)}, 200
 
     elif use_case == 'use_case_3':
-        # Use case 3 (corrigido):
+        # Use case 3:
         #  - encontra poços conectados à plataforma (bidirecional)
         #  - identifica processos relacionados a cada poço (via RO_0000057 e qualquer sujeito que referencia o poço)
-        #  - identifica flows (rdf:type flow_rate) que se relacionam ao processo (ambas as direções)
+        #  - identifica flows (rdf:type flow_rate) ligados ao processo (ambas as direções)
         #  - identifica tags que apontam para o flow (isAbout variants)
         seen = set()
         found = []
 
-        # 1) localizar poços conectados (bidirecional) - usa connected_to candidates + comp_candidates
-        connected_candidates = [ns + 'connected_to' for ns in o3po_bases]
-        all_connected_candidates = dedupe(connected_candidates + comp_candidates)
-
-        wells_found = set()
-        for cc in all_connected_candidates:
-            try:
-                cc_iri = URIRef(cc)
-            except Exception:
-                continue
-            # well -> connected_to -> platform
-            for w in g.subjects(predicate=cc_iri, object=platform_iri):
-                wells_found.add(w)
-            # platform -> connected_to -> well
-            for w in g.objects(subject=platform_iri, predicate=cc_iri):
-                wells_found.add(w)
+        # 1) localizar poços conectados (bidirecional) - connected_to + component predicate
+        connected_terms = ['o3po:connected_to', component_pred]
+        wells_found = list(g.neighbours(platform, g.ids(connected_terms)))
 
         if not wells_found:
-            return JsonResponse({
+            return {
                 'status': 'error',
                 'message': 'Found 0 wells connected to platform (use_case_3).',
                 'debug': {
-                    'resolved_platform': str(platform_iri),
+                    'resolved_platform': platform_iri,
                     'wells_found_count': 0,
-                    'connected_candidates': all_connected_candidates,
+                    'connected_candidates': [expand_term(t) for t in connected_terms],
                     **debug_candidates
                 }
-            }, status=200)
-
-        # 2) construir candidatos de predicados para processCharacteristic (ambas as direções)
-        proc_char_local_names = ['processCharacteristicOf', 'hasProcessCharacteristic']
-        proc_char_candidates = []
-        for local in proc_char_local_names:
-            for base in core_bases:
-                proc_char_candidates.append(base + local)
-            proc_char_candidates.append('http://www.ontologydesignpatterns.org/cp/owl/core#' + local)
-            proc_char_candidates.append('http://purl.obolibrary.org/obo/' + local)
-            proc_char_candidates.append(local)
-        proc_char_candidates = dedupe(proc_char_candidates)
-
-        # tag predicates (isAbout variants)
-        tag_local_names = ['isAbout', 'about']
-        tag_preds = []
-        for local in tag_local_names:
-            for base in core_bases:
-                tag_preds.append(base + local)
-            tag_preds.append('http://www.ontologydesignpatterns.org/cp/owl/core#' + local)
-            tag_preds.append(local)
-        tag_preds = dedupe(tag_preds)
-
-        # 3) para cada well, identificar processos candidatos e montar mapa well -> processes
+            }, 200
+
+        # 2) predicados processCharacteristic (ambas as direções) e isAbout
+        proc_char_terms = ['core:processCharacteristicOf', 'core:hasProcessCharacteristic']
+        tag_terms = ['core:isAbout', 'core:about']
+        proc_chars = g.ids(proc_char_terms)
+        tag_preds = g.ids(tag_terms)
+
+        # 3) mapa well -> processos: via RO_0000057 e qualquer sujeito que referencia o well
         well_to_procs = {}
-        proc_candidates_set = set()
+        proc_candidates = []
         for well in wells_found:
-            procs_for_well = set()
-            # a) via obo relation (RO_0000057)
-            for obo_rel in obo_candidates:
-                try:
-                    obo_iri = URIRef(obo_rel)
-                except Exception:
-                    continue
-                for proc in g.subjects(predicate=obo_iri, object=well):
-                    procs_for_well.add(proc)
-                    proc_candidates_set.add(proc)
-            # b) qualquer sujeito que referencia o well (mais permissivo)
-            for s, p in g.subject_predicates(object=well):
-                procs_for_well.add(s)
-                proc_candidates_set.add(s)
-            well_to_procs[well] = procs_for_well
-
-        proc_candidates = list(proc_candidates_set)
-
-        # 4) para cada poço e seu(s) processo(s), procurar flows e tags
+            procs_for_well = list(g.subjects_of(obo_term, well)) + list(g.referrers.get(well, ()))
+            well_to_procs[well] = dedupe(procs_for_well)
+            proc_candidates.extend(well_to_procs[well])
+        proc_candidates = dedupe(proc_candidates)
+
+        # 4) para cada processo, flows vizinhos pelos predicados processCharacteristic,
+        #    filtrados pelo tipo (measurement_class), e as tags que apontam para cada flow
         for well, procs in well_to_procs.items():
-            well_name = local_name_from_iri_simple(well)
+            well_name = local_name_from_iri_simple(iri(well))
             for proc in procs:
-                # iterar por tipos candidatos de flow (mc_candidates já preparado)
-                for mc_iri_str in mc_candidates:
-                    try:
-                        mc_iri = URIRef(mc_iri_str)
-                    except Exception:
+                for flow_subj, used_proc_char in g.neighbours(proc, proc_chars).items():
+                    if not g.has_type(flow_subj, mc_term):
                         continue
-                    for flow_subj, _, _ in g.triples((None, RDF.type, mc_iri)):
-                        # verificar ligação proc <-> flow usando proc_char_candidates (ambas as direções)
-                        linked = False
-                        used_proc_char = None
-                        for pc in proc_char_candidates:
-                            try:
-                                pc_ref = URIRef(pc)
-                            except Exception:
+                    for isabout in tag_preds:
+                        for tag_subj in g.subjects_of(isabout, flow_subj):
+                            key = (tag_subj, flow_subj, proc)
+                            if key in seen:
                                 continue
-                            if (flow_subj, pc_ref, proc) in g or (proc, pc_ref, flow_subj) in g:
-                                linked = True
-                                used_proc_char = pc_ref
-                                break
-                        if not linked:
-                            continue
-                        # se ligados, procurar tags que apontam para este flow (isAbout variants)
-                        for isabout in tag_preds:
-                            try:
-                                isabout_ref = URIRef(isabout)
-                            except Exception:
-                                continue
-                            for tag_subj, _, _ in g.triples((None, isabout_ref, flow_subj)):
-                                key = f"{tag_subj}|{flow_subj}|{proc}"
-                                if key in seen:
-                                    continue
-                                seen.add(key)
-                                found.append({
-                                    'tag_iri': str(tag_subj),
-                                    'tag_name': local_name_from_iri_simple(tag_subj),
-                                    'flow_iri': str(flow_subj),
-                                    'flow_name': local_name_from_iri_simple(flow_subj),
-                                    'process_iri': str(proc),
-                                    'process_name': local_name_from_iri_simple(proc),
-                                    'well_iri': str(well),
-                                    'well_name': well_name,
-                                    'predicates_used': {
-                                        'processCharacteristic_candidate_used': str(used_proc_char) if used_proc_char else None,
-                                        'isAbout_used': str(isabout_ref)
-                                    },
-                                    'measurement_class_tried': str(mc_iri)
-                                })
+                            seen.add(key)
+                            found.append({
+                                'tag_iri': iri(tag_subj),
+                                'tag_name': local_name_from_iri_simple(iri(tag_subj)),
+                                'flow_iri': iri(flow_subj),
+                                'flow_name': local_name_from_iri_simple(iri(flow_subj)),
+                                'process_iri': iri(proc),
+                                'process_name': local_name_from_iri_simple(iri(proc)),
+                                'well_iri': iri(well),
+                                'well_name': well_name,
+                                'predicates_used': {
+                                    'processCharacteristic_candidate_used': iri(used_proc_char),
+                                    'isAbout_used': iri(isabout)
+                                },
+                                'measurement_class_tried': iri(mc_term)
+                            })
 
         if not found:
-            return JsonResponse({
+            return {
                 'status': 'error',
                 'message': 'Found 0 tags for use_case_3.',
                 'debug': {
-                    'resolved_platform': str(platform_iri),
+                    'resolved_platform': platform_iri,
                     'wells_found_count': len(wells_found),
-                    'wells_found': [str(x) for x in list(wells_found)[:20]],
+                    'wells_found': [iri(x) for x in wells_found[:20]],
                     'proc_candidates_count': len(proc_candidates),
-                    'proc_candidates_sample': [str(x) for x in proc_candidates[:10]],
-                    'mc_candidates': mc_candidates,
-                    'proc_char_candidates': proc_char_candidates,
-                    'tag_preds_tried': tag_preds,
+                    'proc_candidates_sample': [iri(x) for x in proc_candidates[:10]],
+                    'mc_candidates': debug_candidates['mc_candidates'],
+                    'proc_char_candidates': [expand_term(t) for t in proc_char_terms],
+                    'tag_preds_tried': [expand_term(t) for t in tag_terms],
                     **debug_candidates
                 }
-            }, status=200)
+            }, 200
+
+        return {'status': 'success', 'results': found, 'total': len(found)}, 200
+
+    else:
+        return {'status': 'error', 'message': f'Unknown use_case: {use_case}'}, 400
+
+
+#################### SPARQL #############################
+
+SPARQL_EXAMPLES = [
+    {'name': 'Classes', 'query': 'SELECT ?class WHERE { ?class a owl:Class } LIMIT 100'},
+    {'name': 'Indivíduos e tipos', 'query': 'SELECT ?ind ?type WHERE { ?ind a ?type . ?type a owl:Class } LIMIT 100'},
+    {'name': 'ICVs de um poço (parâmetro ??1)',
+     'query': 'SELECT ?icv WHERE { ?icv o3po:component_of ??1 }',
+     'params': ['o3po_merged:Poço_Produção_7ARGO21HESS']},
+    {'name': 'Tags e grandezas', 'query': 'SELECT ?tag ?quality WHERE { ?tag core:isAbout ?quality } LIMIT 100'},
+]
+
+
+def _sparql_settings():
+    return getattr(settings, "DL_QUERY_SETTINGS", {})
+
+
+@_offloaded('ontology')
+def sparql_query_view(request):
+    """
+    GET /api/sparql-query/               -> exemplos e prefixos
+    GET|POST /api/sparql-query/          -> executa `query` sobre a ontologia carregada
+    Parâmetros: query, params (lista posicional para ??1, ??2...; no GET, `param`
+    repetido), limit (até DL_QUERY_SETTINGS['SPARQL_RESULT_LIMIT']), cursor
+    (next_cursor da página anterior), format (json | ndjson | sparql-json, ou
+    pelo Accept) e engine (native | rdflib, para comparação). A consulta é
+    interrompida após DL_QUERY_SETTINGS['SPARQL_TIMEOUT'] s.
+    Ver services/sparql_engine.py e services/sparql_results.py.
+    """
+    cfg = _sparql_settings()
+    if request.method == 'GET':
+        params = request.GET
+        query_params = params.getlist('param')
+        if not params.get('query'):
+            return JsonResponse({'status': 'success', 'enabled': cfg.get('ENABLE_SPARQL', True),
+                                 'prefixes': PREFIXES, 'examples': SPARQL_EXAMPLES,
+                                 'result_limit': cfg.get('SPARQL_RESULT_LIMIT', 1000),
+                                 'formats': list(SPARQL_FORMATS)})
+    elif request.method == 'POST':
+        try:
+            params = json.loads(request.body.decode('utf-8') or "{}")
+        except Exception:
+            return JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
+        query_params = params.get('params') or []
+        if not isinstance(query_params, list):
+            return JsonResponse({'status': 'error', 'message': '"params" deve ser uma lista'}, status=400)
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+    if not cfg.get('ENABLE_SPARQL', True):
+        return JsonResponse({'status': 'error', 'message': 'Consultas SPARQL desabilitadas'}, status=403)
+    query = params.get('query')
+    if not query or not isinstance(query, str):
+        return JsonResponse({'status': 'error', 'message': '"query" obrigatório'}, status=400)
+    max_length = cfg.get('MAX_QUERY_LENGTH', 10000)
+    if len(query) > max_length:
+        return JsonResponse({'status': 'error', 'message': f'Consulta maior que {max_length} caracteres'}, status=400)
+    result_limit = cfg.get('SPARQL_RESULT_LIMIT', 1000)
+    try:
+        limit = int(params.get('limit') or result_limit)
+        if limit < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': '"limit" deve ser um inteiro positivo'}, status=400)
+    limit = min(limit, result_limit)
+    try:
+        fmt = accepted_sparql_format(params.get('format'), request.META.get('HTTP_ACCEPT', ''))
+    except SparqlError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    try:
+        _ensure_predefined_ontology()
+        onto, onto_path = _refresh_inferred()
+    except Exception as e:
+        logger.exception("Ontology load failed: %s", e)
+        return JsonResponse({'status': 'error', 'message': 'Ontologia não carregada no processo. Veja debug.',
+                             'debug': {'error': str(e)}}, status=500)
+    if onto is None:
+        return JsonResponse({'status': 'error', 'message': 'Nenhuma ontologia carregada'}, status=400)
 
-        return JsonResponse({'status': 'success', 'results': found, 'total': len(found)}, status=200)
+    # a consulta lê a versão publicada numa conexão isolada (edições publicadas no meio não aparecem);
+    # no streaming a leitura só é liberada quando a resposta termina
+    with contextlib.ExitStack() as reading:
+        snap = reading.enter_context(_session.isolated())
+        version = (_snapshot_version(snap),)
 
+        offset = 0
+        if params.get('cursor'):
+            try:
+                offset = read_cursor(params['cursor'], query, query_params, version)
+            except CursorError as e:
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=409 if e.expired else 400)
+        engine_name = params.get('engine') or None
+
+        def run():
+            deadline = time.monotonic() + cfg.get('SPARQL_TIMEOUT', 30)
+            prepared, engine, rows = get_sparql_engine().execute(snap.onto.world, query, params=query_params,
+                                                                 engine=engine_name, offset=offset,
+                                                                 deadline=deadline)
+            if cfg.get('ENABLE_QUERY_LOGGING', True):
+                logger.info("[SPARQL] %s %s offset=%d limit=%d formato=%s", prepared.fingerprint, engine, offset,
+                            limit, fmt)
+            return prepared, engine, SparqlPage(rows, limit)
+
+        def next_cursor(count):
+            return make_cursor(query, query_params, version, offset + count)
+
+        if fmt in ('ndjson', 'sparql-json'):
+            try:
+                prepared, engine, page = run()
+            except SparqlError as e:
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            stream = stream_ndjson if fmt == 'ndjson' else stream_sparql_json
+            return StreamingHttpResponse(_ReleasingStream(stream(prepared, engine, page, next_cursor),
+                                                          reading.pop_all()),
+                                         content_type=SPARQL_FORMATS[fmt])
+
+        def json_page():
+            try:
+                prepared, engine, page = run()
+                rows = list(page)
+            except SparqlTimeout as e:
+                return {'status': 'error', 'message': str(e), 'timeout': True}, 504
+            except SparqlError as e:
+                return {'status': 'error', 'message': str(e)}, 400
+            payload = {'status': 'success', 'form': prepared.form, 'engine': engine,
+                       'variables': prepared.variables, 'count': page.count, 'offset': offset,
+                       'elapsed_ms': page.elapsed_ms,
+                       'next_cursor': next_cursor(page.count) if page.more else None}
+            if prepared.form == 'ASK':
+                payload['boolean'] = bool(rows and rows[0][0]['value'])
+            else:
+                payload['results'] = [flat(prepared.variables, row) for row in rows]
+            return payload, 200
+
+        # páginas json em cache pela versão da ontologia; os formatos em streaming sempre executam
+        (payload, status), hit = _cached('sparql', [query, query_params, limit, offset, engine_name], json_page,
+                                         version=lambda: version[0], cacheable=lambda result: result[1] == 200)
+        return _cache_header(JsonResponse(payload, status=status), hit)
+
+
+#################### SÉRIES TEMPORAIS #############################
+
+def _timeseries_settings():
+    return getattr(settings, "TIMESERIES_SETTINGS", {})
+
+
+def _tag_name(raw):
+    """Nome da tag como no CSV (nome local, se vier a IRI); None se não for um nome de arquivo seguro."""
+    name = local_name_from_iri(str(raw or ''))
+    if not name or name in ('.', '..') or any(c in name for c in '/\\\0'):
+        return None
+    return name
+
+
+def _max_points(value, default=500):
+    """max_points da requisição, limitado por TIMESERIES_SETTINGS['MAX_POINTS']; ValueError se inválido."""
+    limit = _timeseries_settings().get('MAX_POINTS', 10000)
+    points = int(value) if value not in (None, '') else default
+    if points < 1:
+        raise ValueError
+    return min(points, limit)
+
+
+@_offloaded('timeseries')
+def timeseries_view(request):
+    """
+    GET /api/timeseries/?tag=<nome|IRI>&start=&end=&max_points=500&downsample=lttb
+    Série de uma tag (ver OntologyService.get_timeseries_for_tag).
+    """
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+    svc = loader.ONT_SERVICE
+    if svc is None:
+        return JsonResponse({'status': 'error', 'message': 'Serviço de ontologia não inicializado'}, status=503)
+    tag = _tag_name(request.GET.get('tag'))
+    if not tag:
+        return JsonResponse({'status': 'error', 'message': '"tag" obrigatório'}, status=400)
+    try:
+        max_points = _max_points(request.GET.get('max_points'))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': '"max_points" deve ser um inteiro positivo'}, status=400)
+    try:
+        data = svc.get_timeseries_for_tag(tag, start=request.GET.get('start'), end=request.GET.get('end'),
+                                          max_points=max_points,
+                                          downsample=request.GET.get('downsample', 'lttb'))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', **data})
+
+
+def _batch_params(request):
+    """(parâmetros, tags) de uma requisição GET/POST com várias tags, ou (None, JsonResponse de erro)."""
+    if request.method == 'GET':
+        params = request.GET
+        return params, [t for value in params.getlist('tags') + params.getlist('tag') for t in value.split(',')]
+    if request.method == 'POST':
+        try:
+            params = json.loads(request.body.decode('utf-8') or "{}")
+        except Exception:
+            return None, JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
+        tags = params.get('tags') or []
+        return params, tags.split(',') if isinstance(tags, str) else tags
+    return None, JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+
+def _batch_tags(svc, tags, well):
+    """
+    Nomes das tags pedidas mais as de pressão anular das ICVs do poço `well`:
+    (nomes, tag_info do poço, None) ou (None, None, JsonResponse de erro).
+    """
+    tag_info = None
+    if well:
+        try:
+            tag_info = svc.get_icv_annular_pressure_tags_for_well(local_name_from_iri(well))
+        except RuntimeError as e:
+            return None, None, JsonResponse({'status': 'error', 'message': str(e)}, status=503)
+        tags = list(tags) + [t['tag'] for t in tag_info]
+
+    names = [_tag_name(t.strip()) for t in tags if t and t.strip()]
+    if None in names:
+        return None, None, JsonResponse({'status': 'error', 'message': 'Nome de tag inválido'}, status=400)
+    if not names and not well:
+        return None, None, JsonResponse({'status': 'error', 'message': '"tags" ou "well" obrigatório'}, status=400)
+    limit = _timeseries_settings().get('MAX_BATCH_TAGS', 200)
+    if len(set(names)) > limit:
+        return None, None, JsonResponse({'status': 'error', 'message': f'Máximo de {limit} tags por requisição'},
+                                        status=400)
+    return names, tag_info, None
+
+
+@_offloaded('timeseries')
+def timeseries_batch_view(request):
+    """
+    GET/POST /api/timeseries/batch/
+    Parâmetros: tags (lista; no GET, separadas por vírgula) ou well (poço cujas
+    tags de pressão anular das ICVs são resolvidas pela ontologia), start, end,
+    max_points. Todas as séries voltam numa grade de tempo comum, lidas em
+    paralelo (TIMESERIES_SETTINGS['BATCH_WORKERS']).
+    """
+    params, tags = _batch_params(request)
+    if params is None:
+        return tags
+    svc = loader.ONT_SERVICE
+    if svc is None:
+        return JsonResponse({'status': 'error', 'message': 'Serviço de ontologia não inicializado'}, status=503)
+    try:
+        max_points = _max_points(params.get('max_points'))
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': '"max_points" deve ser um inteiro positivo'}, status=400)
+
+    well = params.get('well')
+    names, tag_info, error = _batch_tags(svc, tags, well)
+    if error is not None:
+        return error
+    try:
+        data = svc.get_timeseries_for_tags(names, start=params.get('start'), end=params.get('end'),
+                                           max_points=max_points,
+                                           workers=_timeseries_settings().get('BATCH_WORKERS', 8))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'well': well or None, 'tag_info': tag_info, **data})
+
+
+@_offloaded('timeseries')
+def timeseries_analytics_view(request):
+    """
+    GET/POST /api/timeseries/analytics/
+    Estatísticas por tag, matriz de correlação, taxa de variação e excedências
+    de limites das tags (tags e/ou well, como em /api/timeseries/batch/) numa
+    grade comum de até max_points intervalos (padrão
+    TIMESERIES_SETTINGS['ANALYTICS_POINTS']) sobre [start, end]. Limites: high
+    e low (todas as tags) ou, no POST, thresholds = {"<tag>": {"high", "low"}}.
+    Ver services/timeseries_analytics.py.
+    """
+    params, tags = _batch_params(request)
+    if params is None:
+        return tags
+    svc = loader.ONT_SERVICE
+    if svc is None:
+        return JsonResponse({'status': 'error', 'message': 'Serviço de ontologia não inicializado'}, status=503)
+    cfg = _timeseries_settings()
+    try:
+        max_points = _max_points(params.get('max_points'), default=cfg.get('ANALYTICS_POINTS', 2000))
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': '"max_points" deve ser um inteiro positivo'}, status=400)
+
+    well = params.get('well')
+    names, tag_info, error = _batch_tags(svc, tags, well)
+    if error is not None:
+        return error
+    thresholds = params.get('thresholds') if request.method == 'POST' else None
+    if thresholds is not None and not isinstance(thresholds, dict):
+        return JsonResponse({'status': 'error', 'message': '"thresholds" deve ser um objeto'}, status=400)
+    from .services.timeseries_analytics import build_analytics  # NumPy só no primeiro uso
+    thresholds = {**(thresholds or {}),
+                  **{k: params.get(k) for k in ('high', 'low') if params.get(k) not in (None, '')}}
+    try:
+        data = build_analytics(svc, names, start=params.get('start') or None, end=params.get('end') or None,
+                               max_points=max_points, thresholds=thresholds,
+                               workers=cfg.get('BATCH_WORKERS', 8),
+                               max_entries=cfg.get('ANALYTICS_CACHE_ENTRIES', 1024))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'well': well or None, 'tag_info': tag_info, **data})
+
+
+@_offloaded('timeseries')
+def well_dashboard_view(request, use_case):
+    """
+    GET/POST /api/well-dashboard/<use_case>/
+    Tags do caso de uso (mesmos parâmetros da predefined-sparql: identifier,
+    measurement_class, quality_predicate, component_predicate, tag_predicate)
+    e as séries de todas elas numa grade comum (start, end, max_points), numa
+    única resposta: {status, results, total, version, timeseries, cached}.
+    Ver services/well_dashboard.py.
+    """
+    if request.method == 'GET':
+        params = request.GET
+    elif request.method == 'POST':
+        try:
+            params = json.loads(request.body.decode('utf-8') or "{}")
+        except Exception:
+            return JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
     else:
-        return JsonResponse({'status': 'error', 'message': f'Unknown use_case: {use_case}'}, status=400)
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+    identifier = params.get('identifier')
+    if not identifier:
+        return JsonResponse({'status': 'error', 'message': '"identifier" obrigatório'}, status=400)
+    svc = loader.ONT_SERVICE
+    if svc is None:
+        return JsonResponse({'status': 'error', 'message': 'Serviço de ontologia não inicializado'}, status=503)
+    try:
+        max_points = _max_points(params.get('max_points'))
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': '"max_points" deve ser um inteiro positivo'}, status=400)
+
+    try:
+        _ensure_predefined_ontology()
+        onto, onto_path = _refresh_inferred()
+    except Exception as e:
+        logger.exception("Ontology load failed: %s", e)
+        return JsonResponse({'status': 'error', 'message': 'Ontologia não carregada no processo. Veja debug.',
+                             'debug': {'error': str(e)}}, status=500)
+    version = get_journal(onto, onto_path, **_journal_options()).version
+
+    query = (identifier, use_case, params.get('measurement_class'),
+             params.get('quality_predicate', 'core:qualityOf'),
+             params.get('component_predicate', 'o3po:component_of'),
+             params.get('tag_predicate'))
+    from .services.well_dashboard import build_dashboard
+    cfg = _timeseries_settings()
+    payload, status = build_dashboard(
+        svc, lambda: _predefined_result(use_case, identifier, *query[2:])[0], query,
+        _ontology_version(onto, onto_path),
+        start=params.get('start') or None, end=params.get('end') or None, max_points=max_points,
+        workers=cfg.get('BATCH_WORKERS', 8), max_entries=cfg.get('DASHBOARD_CACHE_ENTRIES', 256))
+    return JsonResponse({**payload, 'version': version}, status=status)
+
+
+def _sse(item):
+    if item is None:
+        # comentário SSE: mantém a conexão viva e detecta clientes que saíram
+        return ": ping\n\n"
+    event, data = item
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@_async_exempt
+async def timeseries_stream_view(request):
+    """
+    GET /api/timeseries/stream/?tags=<tag1,tag2>  (text/event-stream)
+    Linhas novas dos CSVs das tags à medida que o historiador as acrescenta
+    (eventos `ready`, `points` e `reset`; ver services/timeseries_stream.py).
+    Um único observador por tag é compartilhado por todos os clientes. Sob
+    ASGI os clientes esperam no loop, sem ocupar uma thread cada.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+    svc = loader.ONT_SERVICE
+    if svc is None:
+        return JsonResponse({'status': 'error', 'message': 'Serviço de ontologia não inicializado'}, status=503)
+    raw = [t for value in request.GET.getlist('tags') + request.GET.getlist('tag') for t in value.split(',')]
+    tags = list(dict.fromkeys(_tag_name(t.strip()) for t in raw if t.strip()))
+    if None in tags:
+        return JsonResponse({'status': 'error', 'message': 'Nome de tag inválido'}, status=400)
+    if not tags:
+        return JsonResponse({'status': 'error', 'message': '"tags" obrigatório'}, status=400)
+    cfg = _timeseries_settings()
+    if len(tags) > cfg.get('MAX_BATCH_TAGS', 200):
+        return JsonResponse({'status': 'error',
+                             'message': f'Máximo de {cfg.get("MAX_BATCH_TAGS", 200)} tags por requisição'}, status=400)
+    options = {'heartbeat': cfg.get('STREAM_HEARTBEAT', 15), 'interval': cfg.get('STREAM_POLL_INTERVAL', 1.0)}
+
+    if isinstance(request, ASGIRequest):
+        # o servidor ASGI só consome geradores assíncronos sem bufferizar a resposta inteira
+        events = svc.follow_timeseries_async(tags, _pool('timeseries').call, **options)
+
+        async def sse():
+            try:
+                yield "retry: 3000\n\n"
+                async for item in events:
+                    yield _sse(item)
+            finally:
+                await events.aclose()  # cancela as assinaturas quando o cliente desconecta
+    else:
+        events = svc.follow_timeseries(tags, **options)
+
+        def sse():
+            try:
+                yield "retry: 3000\n\n"
+                for item in events:
+                    yield _sse(item)
+            finally:
+                events.close()  # cancela as assinaturas quando o cliente desconecta
+
+    response = StreamingHttpResponse(sse(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
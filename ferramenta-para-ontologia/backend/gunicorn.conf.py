@@ -0,0 +1,33 @@
+# gunicorn.conf.py
+"""
+gunicorn -c gunicorn.conf.py setup.wsgi
+
+Modo pre-fork (ver core/services/prefork.py): a aplicação é carregada no
+processo mestre (preload_app), que abre as ontologias, roda o reasoning e
+monta os índices uma vez; os workers herdam esse estado por fork.
+"""
+import os
+
+# lido por setup/settings.py (PREFORK_SETTINGS) quando o mestre importa a aplicação
+os.environ.setdefault("ONTOLOGY_PREFORK", "1")
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = 120
+preload_app = True  # obrigatório: sem ele cada worker carrega a ontologia por conta própria
+
+
+def pre_fork(server, worker):
+    from core.services.prefork import get_prefork
+    prefork = get_prefork()
+    if prefork is not None:
+        prefork.detach()
+
+
+def post_fork(server, worker):
+    from core.services.prefork import get_prefork
+    prefork = get_prefork()
+    if prefork is not None:
+        prefork.attach()
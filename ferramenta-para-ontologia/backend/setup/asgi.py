@@ -5,12 +5,56 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+    uvicorn setup.asgi:application
+
+As views de leitura são assíncronas e o trabalho bloqueante roda em pools
+limitados (core/services/executors.py); um único worker atende muitos
+clientes de gráficos e consultas enquanto o reasoning roda em outro processo.
 """
 
+import asyncio
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'setup.settings')
 
-application = get_asgi_application()
+
+def cancel_on_disconnect(app):
+    """
+    O Django 4.2 não observa o cliente depois de ler o corpo: uma resposta em
+    streaming sem fim (SSE) continuaria após a desconexão. Aqui a requisição
+    é cancelada no http.disconnect, o que fecha o gerador da resposta.
+    """
+    async def wrapped(scope, receive, send):
+        if scope['type'] != 'http':
+            return await app(scope, receive, send)
+        body_read = asyncio.Event()
+
+        async def receive_body():
+            message = await receive()
+            if message['type'] != 'http.request' or not message.get('more_body', False):
+                body_read.set()
+            return message
+
+        async def watch():
+            await body_read.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            handler.cancel()
+
+        handler = asyncio.ensure_future(app(scope, receive_body, send))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not watcher.done() or watcher.cancelled():
+                raise  # cancelado pelo servidor, não pela desconexão
+        finally:
+            watcher.cancel()
+
+    return wrapped
+
+
+application = cancel_on_disconnect(get_asgi_application())
@@ -1,6 +1,5 @@
 from pathlib import Path
 import os
-import redis
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -38,6 +37,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.PreforkMiddleware',  # só ativo no modo pre-fork (gunicorn.conf.py)
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -138,6 +138,51 @@ CORS_ALLOW_HEADERS = [
 O3PO_OWL_PATH = r"D:\Área de Trabalho\OntologyManager\backend\data\o3po_merged.owl"
 TIMESERIES_CSV_DIR = r"D:\Área de Trabalho\OntologyManager\backend\data\timeseries"
 
+# Leitura de séries temporais (GET /api/timeseries/ e /api/timeseries/batch/)
+TIMESERIES_SETTINGS = {
+    'BATCH_WORKERS': 8,     # threads que abrem/convertem as séries de um lote em paralelo
+    'MAX_BATCH_TAGS': 200,
+    'MAX_POINTS': 10000,    # teto de max_points por série
+    'DASHBOARD_CACHE_ENTRIES': 256,  # painéis (/api/well-dashboard/) guardados em memória
+    'ANALYTICS_POINTS': 2000,        # intervalos padrão da grade de /api/timeseries/analytics/
+    'ANALYTICS_CACHE_ENTRIES': 1024, # resultados de /api/timeseries/analytics/ guardados em memória
+    'STREAM_POLL_INTERVAL': 1.0,     # s entre verificações do CSV de cada tag acompanhada (SSE)
+    'STREAM_HEARTBEAT': 15,          # s sem eventos até enviar um ping ao cliente
+    # colunas e rollups convertidos dos CSVs (o diretório do historiador é só lido);
+    # $TIMESERIES_STORE_DIR, se definido, tem precedência
+    'STORE_DIR': os.path.join(BASE_DIR, 'data', 'timeseries_store'),
+}
+
+# Quadstore persistente (Owlready2/SQLite): o RDF/XML é compilado uma vez,
+# indexado pelo SHA-256 do arquivo, e reaberto nos próximos starts
+ONTOLOGY_STORE_SETTINGS = {
+    'ENABLED': True,
+    'DIR': os.path.join(BASE_DIR, 'data', 'quadstore'),
+    # edições vão para o journal; o RDF/XML é reescrito após COMPACT_DELAY s sem novas edições
+    'COMPACT_DELAY': 10,
+    'JOURNAL_FSYNC': True,
+}
+
+# Modo pre-fork (gunicorn -c gunicorn.conf.py, que define ONTOLOGY_PREFORK=1): o processo mestre
+# carrega as ontologias, roda o reasoning e monta os índices uma vez; os workers herdam por fork
+# e as escritas são executadas por um único worker escritor (ver core/services/prefork.py)
+PREFORK_SETTINGS = {
+    'ENABLED': os.environ.get('ONTOLOGY_PREFORK') == '1',
+    'REASON': True,           # esperar o reasoning no mestre (se ENABLE_REASONING)
+    'REASON_TIMEOUT': 1800,   # s; depois disso os workers servem a versão asserida
+    'PRELOAD_SESSION': True,  # carregar também a ontologia das consultas predefinidas
+    'RELEASE_GRACE': 120,     # s até fechar o mundo substituído por uma versão nova do escritor
+}
+
+# Servidor ASGI (uvicorn setup.asgi:application): as views de leitura rodam em pools limitados de
+# threads por tipo de trabalho; com todas as threads ocupadas e QUEUE requisições esperando, as
+# seguintes recebem 503 com Retry-After (ver core/services/executors.py)
+EXECUTOR_SETTINGS = {
+    'ONTOLOGY': {'WORKERS': 8, 'QUEUE': 64},     # predefinidas, SPARQL, listagens, hierarquia
+    'TIMESERIES': {'WORKERS': 8, 'QUEUE': 64},   # séries, lotes, analytics, painel do poço
+    'RETRY_AFTER': 1,  # s
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -147,16 +192,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DL_QUERY_SETTINGS = {
     # Cache settings
     'CACHE_TTL': 300,  # 5 minutos
-    'ENABLE_CACHE': True,
+    'ENABLE_CACHE': True,  # resultados por versão da ontologia (core/services/result_cache.py)
+    'CACHE_ALIAS': 'default',  # Redis compartilhado entre os workers quando disponível
     
     # Reasoner settings
     'DEFAULT_REASONER': 'hermit',  # hermit, pellet, owlready
     'REASONER_TIMEOUT': 30,  # segundos
     'ENABLE_REASONING': True,
+    'REASONER_WORKERS': 1,  # processos do pool de reasoning em segundo plano
     
     # SPARQL settings
     'ENABLE_SPARQL': True,
-    'SPARQL_RESULT_LIMIT': 1000,
+    'SPARQL_RESULT_LIMIT': 1000,  # linhas por página de /api/sparql-query/
+    'SPARQL_TIMEOUT': 30,  # segundos até a consulta ser interrompida
     
     # Query settings
     'MAX_QUERY_LENGTH': 10000,
@@ -165,31 +213,18 @@ DL_QUERY_SETTINGS = {
 }
 
 # Configurações de cache (adicionar ao CACHES existente)
+# Redis se disponível, senão cache em memória. A escolha é feita no primeiro uso, com timeout
+# curto, e não no import dos settings (ver core/cache.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'BACKEND': 'core.cache.FailoverCache',
         'LOCATION': 'redis://127.0.0.1:6379/1',
-        'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-        },
         'KEY_PREFIX': 'dl_query',
         'TIMEOUT': DL_QUERY_SETTINGS['CACHE_TTL'],
+        'RETRY_INTERVAL': 30,  # s com o Redis fora do ar até testá-lo de novo
     }
 }
 
-# Se Redis não estiver disponível, usar cache em memória
-try:
-    import redis
-    redis.Redis(host='127.0.0.1', port=6379, db=1).ping()
-except:
-    CACHES = {
-        'default': {
-            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-            'LOCATION': 'dl-query-cache',
-            'TIMEOUT': DL_QUERY_SETTINGS['CACHE_TTL'],
-        }
-    }
-
 # Configurações de logging
 LOGGING = {
     'version': 1,
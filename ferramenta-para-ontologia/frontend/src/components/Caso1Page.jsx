@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { LineChart, Line, XAxis, YAxis, Tooltip, CartesianGrid, ResponsiveContainer } from 'recharts';
 import './productionloss.css'; 
+import { dashboardSeries } from '../dashboardSeries';
 
 const ProductionLossAnalysis = ({ apiBase = 'http://localhost:8000' }) => {
   const [wells, setWells] = useState([]);
@@ -121,7 +122,8 @@ useEffect(() => {
         tag_pred: tagPred,
       };
       
-      const res = await axios.post(`${apiBase}/api/predefined-sparql/use_case_1/`, payload);
+      // tags e séries de todas elas numa única requisição
+      const res = await axios.post(`${apiBase}/api/well-dashboard/use_case_1/`, payload);
       const data = res.data || {};
       
       let rows = [];
@@ -159,6 +161,10 @@ useEffect(() => {
         }
       });
       
+      const series = dashboardSeries(data.timeseries);
+      setTimeseriesData(Object.fromEntries(unique
+        .map(n => [n.id, series[n.fileName] || series[localNameFromIri(n.id)]])
+        .filter(([, points]) => points)));
       setTags(unique);
       setMessage(`Encontradas ${unique.length} tags para análise.`);
       
@@ -175,6 +181,11 @@ useEffect(() => {
   // Função para buscar série temporal de uma tag específica
   const fetchTimeseries = async (tagId) => {
     setSelectedTag(tagId);
+    if (timeseriesData[tagId]) {
+      // já veio junto com as tags (/api/well-dashboard/)
+      setMessage(`Série temporal carregada (${timeseriesData[tagId].length} pontos)`);
+      return;
+    }
     setTimeseriesLoading(true);
     setMessage(`Carregando série temporal para ${localNameFromIri(tagId)}...`);
 
@@ -191,12 +202,12 @@ useEffect(() => {
         chartData = data.data.map(d => ({ t: d.timestamp || d.time || d.t, v: d.value ?? d.val ?? d.v }));
       }
 
-      setTimeseriesData({ [tagId]: chartData });
+      setTimeseriesData(prev => ({ ...prev, [tagId]: chartData }));
       setMessage(`Série temporal carregada (${chartData.length} pontos)`);
     } catch (e) {
       console.error(e);
       setMessage('Não foi possível carregar a série temporal');
-      setTimeseriesData({ [tagId]: [] });
+      setTimeseriesData(prev => ({ ...prev, [tagId]: [] }));
     } finally {
       setTimeseriesLoading(false);
     }
@@ -209,6 +220,22 @@ useEffect(() => {
     }
   }, [selectedWell]);
 
+  // Acompanha ao vivo as tags do poço: o backend envia só as linhas novas dos CSVs (SSE)
+  useEffect(() => {
+    if (!tags.length || typeof EventSource === 'undefined') return undefined;
+    const byName = Object.fromEntries(tags.map(tag => [tag.fileName || localNameFromIri(tag.id), tag.id]));
+    const names = Object.keys(byName).map(encodeURIComponent).join(',');
+    const source = new EventSource(`${apiBase}/api/timeseries/stream/?tags=${names}`);
+    source.addEventListener('points', (e) => {
+      const data = JSON.parse(e.data);
+      const tagId = byName[data.tag];
+      if (!tagId) return;
+      const points = data.timestamps.map((t, i) => ({ t, v: data.values[i] })).filter(p => p.v !== null);
+      setTimeseriesData(prev => (prev[tagId] ? { ...prev, [tagId]: [...prev[tagId], ...points] } : prev));
+    });
+    return () => source.close();
+  }, [tags, apiBase]);
+
   // Preparar dados para o gráfico
   const selectedTagData = selectedTag && timeseriesData[selectedTag] ? timeseriesData[selectedTag] : [];
   const chartData = selectedTagData.map(item => ({
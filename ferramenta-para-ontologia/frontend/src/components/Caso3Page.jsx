@@ -3,6 +3,7 @@ import { useNavigate, useLocation } from 'react-router-dom';
 import axios from 'axios';
 import { LineChart, Line, XAxis, YAxis, Tooltip, CartesianGrid, ResponsiveContainer, BarChart, Bar } from 'recharts';
 import './productionloss.css';
+import { dashboardSeries } from '../dashboardSeries';
 
 const PlatformProductionAnalysis = ({ ontologyData, apiBase = 'http://localhost:8000' }) => {
   const navigate = useNavigate();
@@ -20,6 +21,7 @@ const PlatformProductionAnalysis = ({ ontologyData, apiBase = 'http://localhost:
   const [timeseriesLoading, setTimeseriesLoading] = useState(false);
   const [results, setResults] = useState([]);
   const [productionData, setProductionData] = useState([]);
+  const [seriesByTag, setSeriesByTag] = useState({});
   const [message, setMessage] = useState('');
   const [selectedTag, setSelectedTag] = useState(null);
 
@@ -125,6 +127,7 @@ const PlatformProductionAnalysis = ({ ontologyData, apiBase = 'http://localhost:
     setMessage('Fetching platform production data...');
     setResults([]);
     setProductionData([]);
+    setSeriesByTag({});
 
     try {
       const payload = {
@@ -135,7 +138,8 @@ const PlatformProductionAnalysis = ({ ontologyData, apiBase = 'http://localhost:
         tag_predicate: tagPred,
       };
 
-      const endpoint = `${apiBase.replace(/\/$/, '')}/api/predefined-sparql/use_case_3/`;
+      // tags e séries de todas elas numa única requisição
+      const endpoint = `${apiBase.replace(/\/$/, '')}/api/well-dashboard/use_case_3/`;
       const res = await axios.post(endpoint, payload, { timeout: 30000 });
       const data = res.data || {};
 
@@ -160,6 +164,7 @@ const PlatformProductionAnalysis = ({ ontologyData, apiBase = 'http://localhost:
         raw: r
       }));
 
+      setSeriesByTag(dashboardSeries(data.timeseries));
       setResults(mapped);
       setMessage(`Found ${mapped.length} production items.`);
 
@@ -175,6 +180,13 @@ const PlatformProductionAnalysis = ({ ontologyData, apiBase = 'http://localhost:
   // Fetch production timeseries for a specific tag
   const fetchProductionTimeseries = async (tagId) => {
     setSelectedTag(tagId);
+    const preloaded = seriesByTag[localNameFromIri(tagId)];
+    if (preloaded) {
+      // já veio junto com as tags (/api/well-dashboard/)
+      setProductionData(preloaded);
+      setMessage(`Production data loaded (${preloaded.length} points)`);
+      return;
+    }
     setTimeseriesLoading(true);
     setMessage(`Loading production data for ${localNameFromIri(tagId)}...`);
 
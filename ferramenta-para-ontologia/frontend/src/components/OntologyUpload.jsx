@@ -8,6 +8,7 @@ import 'ace-builds/src-noconflict/mode-sparql';
 import 'ace-builds/src-noconflict/theme-monokai';
 import { useTable, usePagination } from 'react-table';
 import Papa from 'papaparse';
+import { applyOntologyChanges, setClassChildren } from '../ontologyDelta';
 
 
 const OntologyUpload = () => {
@@ -312,9 +313,33 @@ const OntologyUpload = () => {
     }
   }, [searchTerm, ontologyData?.classes]);
     
-  const toggleNode = (nodeName) => {
+  const CLASS_PAGE_SIZE = 200;
+
+  // carrega (uma página de) filhos diretos de uma classe em /api/class-hierarchy/
+  const loadClassChildren = async (node, offset = 0) => {
+    try {
+      const response = await axios.get('http://localhost:8000/api/class-hierarchy/', {
+        params: { parent: node.iri || node.name, offset, limit: CLASS_PAGE_SIZE }
+      });
+      if (response.data.status === 'success') {
+        setOntologyData(prev => ({
+          ...prev,
+          classes: setClassChildren(prev.classes, node.iri, response.data.classes, offset > 0)
+        }));
+      }
+    } catch (error) {
+      setMessage(`Erro: ${error.response?.data?.message || error.message}`);
+    }
+  };
+
+  const toggleNode = (node) => {
     const newExpanded = new Set(expandedNodes);
-    newExpanded.has(nodeName) ? newExpanded.delete(nodeName) : newExpanded.add(nodeName);
+    if (newExpanded.has(node.name)) {
+      newExpanded.delete(node.name);
+    } else {
+      newExpanded.add(node.name);
+      if (!node.children) loadClassChildren(node);
+    }
     setExpandedNodes(newExpanded);
   };
 
@@ -355,10 +380,7 @@ const OntologyUpload = () => {
         });
 
       if (response.data.status === 'success') {
-        setOntologyData(prev => ({
-          ...prev,
-          individuals: response.data.ontology.individuals
-        }));
+        setOntologyData(prev => applyOntologyChanges(prev, response.data.changes, response.data.version));
         setShowCreateIndividualForm(false);
         setMessage(`${response.data.message}`);
       }
@@ -510,8 +532,9 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
 
 
   const renderNode = (currentNode, currentLevel = 0) => {
-    const hasChildren = (currentNode.children?.length || 0) > 0;
+    const hasChildren = (currentNode.children_count ?? currentNode.children?.length ?? 0) > 0;
     const isExpanded = expandedNodes.has(currentNode.name);
+    const loadedChildren = currentNode.children?.length || 0;
     const isMatch = currentNode.name.toLowerCase().includes(searchTerm.toLowerCase());
 
     return (
@@ -519,7 +542,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
         <div
           className={`node-content ${hasChildren ? 'has-children' : ''} ${isMatch ? 'search-match' : ''}`}
           style={{ marginLeft: `${currentLevel * 20}px` }}
-          onClick={() => hasChildren && toggleNode(currentNode.name)}
+          onClick={() => hasChildren && toggleNode(currentNode)}
         >
           <div className="node-icons">
             {hasChildren && (
@@ -540,6 +563,9 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
               currentNode.name
             )}
           </span>
+          {currentNode.descendants_count > 0 && (
+            <span className="node-count">({currentNode.descendants_count})</span>
+          )}
         </div>
         
         {hasChildren && isExpanded && (
@@ -547,6 +573,17 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
             {(searchTerm ? currentNode.filteredChildren : currentNode.children)?.map(childNode => (
               renderNode(childNode, currentLevel + 1)
             ))}
+            {!searchTerm && currentNode.children && loadedChildren < currentNode.children_count && (
+              <li className="tree-node">
+                <div
+                  className="node-content"
+                  style={{ marginLeft: `${(currentLevel + 1) * 20}px` }}
+                  onClick={() => loadClassChildren(currentNode, loadedChildren)}
+                >
+                  <span className="node-label">Carregar mais ({currentNode.children_count - loadedChildren})</span>
+                </div>
+              </li>
+            )}
           </ul>
         )}
       </li>
@@ -574,23 +611,15 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
       });
       
       setMessage(`${response.data.message}`);
-      setOntologyData(response.data.ontology);
+      setOntologyData({ ...response.data.ontology, version: response.data.version });
       setExpandedNodes(new Set());
     } catch (error) {
       setMessage(`Erro: ${error.response?.data?.message || error.message}`);
     }
   };
 
-  const flattenClasses = (nodes) => {
-    let flatList = [];
-    nodes.forEach(node => {
-      flatList.push({ name: node.name });
-      if (node.children && node.children.length > 0) {
-        flatList = flatList.concat(flattenClasses(node.children));
-      }
-    });
-    return flatList;
-  };
+  // nomes de todas as classes (a árvore é carregada sob demanda, então não dá para achatá-la)
+  const classNameOptions = () => (ontologyData?.class_names || []).map(name => ({ name }));
 
   const handleCreateClass = async () => {
     if (!newClassName) {
@@ -609,11 +638,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
       });
 
       if (response.data.status === 'success') {
-        setOntologyData(prev => ({
-          ...prev,
-          classes: response.data.ontology.classes,
-          classes_count: response.data.ontology.classes_count
-        }));
+        setOntologyData(prev => applyOntologyChanges(prev, response.data.changes, response.data.version));
         setShowCreateClassForm(false);
         setNewClassName('');
         setSelectedParents([]);
@@ -637,10 +662,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
         replace_with: replaceWith 
       });
       if (response.data.status === 'success') {
-        setOntologyData(prev => ({ 
-          ...prev, 
-          individuals: response.data.ontology.individuals 
-        }));
+        setOntologyData(prev => applyOntologyChanges(prev, response.data.changes, response.data.version));
       }
       setMessage(response.data.status === 'success' ? `${response.data.message}` : `${response.data.message}`);
     } catch (error) { 
@@ -705,10 +727,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
       const result = await response.json();
       if (result.status === 'success') {
         alert("Propriedade criada com sucesso!");
-        setOntologyData(prev => ({
-          ...prev,
-          object_properties: result.object_properties
-        }));
+        setOntologyData(prev => applyOntologyChanges(prev, result.changes, result.version));
         setShowObjectPropertyForm(false);
         setNewObjPropName('');
         setObjDomain(['']);
@@ -740,10 +759,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
         { headers: { 'Content-Type': 'application/json' } }
       );
       if (response.data.status === 'success') {
-        setOntologyData(prev => ({
-          ...prev,
-          data_properties: response.data.data_properties
-        }));
+        setOntologyData(prev => applyOntologyChanges(prev, response.data.changes, response.data.version));
         setShowDataPropForm(false);
         setNewDataPropName('');
         setDataDomain([]);
@@ -767,10 +783,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
         domain: annoDomain
       });
       if(res.data.status === 'success'){
-        setOntologyData(prev => ({ 
-          ...prev, 
-          annotation_properties: res.data.annotation_properties 
-        }));
+        setOntologyData(prev => applyOntologyChanges(prev, res.data.changes, res.data.version));
         setShowCreateAnnoPropForm(false);
         setNewAnnoPropName(''); 
         setAnnoDomain([]);
@@ -813,7 +826,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
           style={{ width: '100%', padding: '8px', borderRadius: '4px', border: '1px solid #ccc' }}
         >
           <option value="">Selecione uma classe</option>
-          {flattenClasses(ontologyData.classes).map(cls => (
+          {classNameOptions().map(cls => (
             <option key={cls.name} value={cls.name}>{cls.name}</option>
           ))}
         </select>
@@ -829,7 +842,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
           style={{ width: '100%', padding: '8px', borderRadius: '4px', border: '1px solid #ccc' }}
         >
           <option value="">Selecione uma classe</option>
-          {flattenClasses(ontologyData.classes).map(cls => (
+          {classNameOptions().map(cls => (
             <option key={cls.name} value={cls.name}>{cls.name}</option>
           ))}
         </select>
@@ -882,7 +895,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
   };
 
   const flattenedClassOptions = React.useMemo(() => {
-  return ontologyData?.classes ? flattenClasses(ontologyData.classes) : [];
+  return classNameOptions();
 }, [ontologyData]);
 
   return (
@@ -1014,7 +1027,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
                         }}
                         className="form-control"
                       >
-                        {flattenClasses(ontologyData.classes).map(cls => (
+                        {classNameOptions().map(cls => (
                           <option key={cls.name} value={cls.name}>{cls.name}</option>
                         ))}
                       </select>
@@ -1291,7 +1304,7 @@ const ClassMultiSelect = ({ options = [], selected = [], onChange, placeholder =
                       value={dataDomain} 
                       onChange={e => setDataDomain(Array.from(e.target.selectedOptions, opt => opt.value))}
                     >
-                      {flattenClasses(ontologyData.classes).map(c => (
+                      {classNameOptions().map(c => (
                         <option key={c.name} value={c.name}>{c.name}</option>
                       ))}
                     </select>
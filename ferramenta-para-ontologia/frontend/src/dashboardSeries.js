@@ -0,0 +1,13 @@
+// Séries devolvidas por /api/well-dashboard/<use_case>/ (grade de tempo comum a todas as tags)
+// convertidas para o formato dos gráficos: { <nome da tag>: [{ t, v }] }.
+export const dashboardSeries = (timeseries) => {
+  const out = {};
+  if (!timeseries || !Array.isArray(timeseries.timestamps)) return out;
+  Object.entries(timeseries.series || {}).forEach(([tag, values]) => {
+    if (!Array.isArray(values)) return;
+    out[tag] = timeseries.timestamps
+      .map((t, i) => ({ t, v: values[i] }))
+      .filter(point => point.v !== null && point.v !== undefined);
+  });
+  return out;
+};
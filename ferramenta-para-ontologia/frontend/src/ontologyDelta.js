@@ -0,0 +1,95 @@
+// Aplica no estado local as alterações devolvidas pelo backend
+// (respostas de mutação e GET /api/changes/?since=<versão>).
+// Cada entidade vem com o estado atual; 'removed' lista IRIs que deixaram de existir.
+
+const upsertByIri = (list = [], items = [], removed = []) => {
+  const byIri = new Map(items.map(item => [item.iri, item]));
+  const kept = list
+    .filter(item => !removed.includes(item.iri))
+    .map(item => byIri.get(item.iri) || item);
+  const known = new Set(kept.map(item => item.iri));
+  return kept.concat(items.filter(item => !known.has(item.iri)));
+};
+
+// Árvore de classes carregada sob demanda (GET /api/class-hierarchy/):
+// `children` fica indefinido até o nó ser expandido; `children_count` vem do backend.
+
+// remove o nó `name` de qualquer ponto da árvore; devolve [árvore, nó removido]
+const detachClass = (nodes = [], name) => {
+  let found = null;
+  const walk = list => list
+    .filter(node => {
+      if (node.name === name) {
+        found = found || node;
+        return false;
+      }
+      return true;
+    })
+    .map(node => (node.children ? { ...node, children: walk(node.children) } : node));
+  return [walk(nodes), found];
+};
+
+// coloca `node` sob `parent` (se o pai está na árvore); só conta como filho novo se ainda não era
+const attachClass = (nodes, parent, node, isNew) => {
+  let attached = false;
+  const walk = list => list.map(item => {
+    if (item.name === parent) {
+      attached = true;
+      const count = (item.children_count || 0) + (isNew ? 1 : 0);
+      return item.children
+        ? { ...item, children_count: count, children: [...item.children, node] }
+        : { ...item, children_count: count };
+    }
+    return item.children ? { ...item, children: walk(item.children) } : item;
+  });
+  const tree = walk(nodes);
+  return [tree, attached];
+};
+
+const mergeClasses = (tree = [], classes = [], names = []) => {
+  let added = 0;
+  classes.forEach(cls => {
+    const isNew = !names.includes(cls.name);
+    const [detached, previous] = detachClass(tree, cls.name);
+    const { parents, ...fields } = cls;
+    const node = { ...fields, children: previous ? previous.children : undefined };
+    let next = detached;
+    let attached = false;
+    (parents || []).forEach(parent => {
+      const [withNode, ok] = attachClass(next, parent, node, isNew);
+      next = withNode;
+      attached = attached || ok;
+    });
+    tree = attached || (parents || []).length ? next : [...detached, node];
+    if (isNew) {
+      added += 1;
+      names = [...names, cls.name];
+    }
+  });
+  return [tree, names, added];
+};
+
+// substitui (ou completa, com `append`) os filhos carregados do nó `iri`
+export const setClassChildren = (nodes = [], iri, children, append = false) => nodes.map(node => {
+  if (node.iri === iri) {
+    return { ...node, children: append ? [...(node.children || []), ...children] : children };
+  }
+  return node.children ? { ...node, children: setClassChildren(node.children, iri, children, append) } : node;
+});
+
+export const applyOntologyChanges = (prev, changes, version) => {
+  if (!prev || !changes) return prev;
+  const removed = changes.removed || [];
+  const [classes, classNames, added] = mergeClasses(prev.classes, changes.classes, prev.class_names || []);
+  return {
+    ...prev,
+    version: version ?? prev.version,
+    classes,
+    class_names: classNames,
+    classes_count: (prev.classes_count || 0) + added,
+    individuals: upsertByIri(prev.individuals, changes.individuals, removed),
+    object_properties: upsertByIri(prev.object_properties, changes.object_properties, removed),
+    data_properties: upsertByIri(prev.data_properties, changes.data_properties, removed),
+    annotation_properties: upsertByIri(prev.annotation_properties, changes.annotation_properties, removed),
+  };
+};